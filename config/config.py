@@ -9,8 +9,36 @@ BOT_TOKEN = os.getenv('BOT_TOKEN')
 if not BOT_TOKEN:
     raise ValueError("Не установлен токен бота. Создайте файл .env с переменной BOT_TOKEN")
 
+# Способ получения обновлений: polling (long polling) или webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+
+# Вебхук (BOT_MODE=webhook)
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # внешний адрес сервера, например https://bot.example.com
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_HEALTH_PATH = os.getenv('WEBHOOK_HEALTH_PATH', '/health')
+WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN')
+WEBHOOK_MAX_CONCURRENT_UPDATES = int(os.getenv('WEBHOOK_MAX_CONCURRENT_UPDATES', '32'))
+if BOT_MODE == 'webhook' and not WEBHOOK_URL:
+    raise ValueError("Для BOT_MODE=webhook установите переменную WEBHOOK_URL")
+
 # База данных
 DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///marketplace.db')
+DATABASE_POOL_SIZE = int(os.getenv('DATABASE_POOL_SIZE', '5'))
+DATABASE_MAX_OVERFLOW = int(os.getenv('DATABASE_MAX_OVERFLOW', '10'))
+# Соединения только для чтения к файлу SQLite (запись всегда идет через одно соединение)
+DATABASE_READ_POOL_SIZE = int(os.getenv('DATABASE_READ_POOL_SIZE', '4'))
+# Кэш соответствия Telegram ID и ID пользователя в базе данных
+USER_ID_CACHE_MAX_ENTRIES = int(os.getenv('USER_ID_CACHE_MAX_ENTRIES', '10000'))
+
+# PRAGMA для соединений SQLite
+SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT', '5000'))  # миллисекунды
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))  # байты
+SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', '-16000'))  # отрицательное значение - в КиБ
+SQLITE_TEMP_STORE = os.getenv('SQLITE_TEMP_STORE', 'MEMORY')
 
 # Настройки администратора
 ADMIN_ID = os.getenv('ADMIN_ID')
@@ -23,4 +51,9 @@ MARKETPLACES = {
 }
 
 # Адрес доставки
-DEFAULT_DELIVERY_ADDRESS = "Nowesad" 
\ No newline at end of file
+DEFAULT_DELIVERY_ADDRESS = "Nowesad"
+
+# Кэш результатов парсинга товаров
+PRODUCT_CACHE_TTL = int(os.getenv('PRODUCT_CACHE_TTL', '600'))  # секунды
+PRODUCT_CACHE_MAX_ENTRIES = int(os.getenv('PRODUCT_CACHE_MAX_ENTRIES', '1000'))
+PRODUCT_CACHE_MAX_BYTES = int(os.getenv('PRODUCT_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
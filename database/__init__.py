@@ -1,10 +1,10 @@
-from .database import get_session, init_db, get_user, create_user, update_user, get_cart_items, add_to_cart, remove_from_cart, create_order, get_orders, get_order, cancel_order, create_product_from_url
-from .models import Base, User, Product, CartItem, Order, OrderItem
+from .database import get_session, init_db, close_db, get_user, create_user, update_user, delete_user, get_cart_items, get_cart_summary, add_to_cart, remove_from_cart, create_order, get_orders, get_orders_page, count_orders, get_order, cancel_order, create_product_from_url
+from .models import Base, User, Product, CartItem, CartSummary, Order, OrderItem
 
 __all__ = [
-    'get_session', 'init_db', 'get_user', 'create_user', 'update_user',
-    'get_cart_items', 'add_to_cart', 'remove_from_cart',
-    'create_order', 'get_orders', 'get_order', 'cancel_order',
+    'get_session', 'init_db', 'close_db', 'get_user', 'create_user', 'update_user', 'delete_user',
+    'get_cart_items', 'get_cart_summary', 'add_to_cart', 'remove_from_cart',
+    'create_order', 'get_orders', 'get_orders_page', 'count_orders', 'get_order', 'cancel_order',
     'create_product_from_url',
-    'Base', 'User', 'Product', 'CartItem', 'Order', 'OrderItem'
+    'Base', 'User', 'Product', 'CartItem', 'CartSummary', 'Order', 'OrderItem'
 ] 
\ No newline at end of file
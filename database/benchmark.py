@@ -0,0 +1,348 @@
+"""
+Сравнение пропускной способности синхронного и асинхронного доступа к базе данных.
+
+Несколько пользователей одновременно добавляют товары в корзину, как при
+обработке сообщений ботом. Синхронный вариант повторяет прежнюю реализацию
+add_to_cart (sqlalchemy Session внутри обработчика), асинхронный использует
+database.database. Для каждого варианта выводится число операций в секунду
+и максимальная задержка цикла событий. Затем измеряется задержка чтения
+корзины во время записи: через соединение записи и через пул чтения.
+
+С параметром --check-queries вместо замера скорости проверяется, что число
+SQL-запросов в get_cart_items, create_order и get_order не зависит от
+количества товаров в корзине (скрипт завершается с кодом 1, если зависит).
+С параметром --checkout сравнивается время оформления заказа для корзин
+из 1, 10 и 100 товаров: прежний вариант через ORM по одной позиции и
+набор SQL-запросов (INSERT ... SELECT, SUM, один DELETE).
+
+Запуск:
+    python -m database.benchmark [--users 20] [--updates 50] [--readers 20]
+    python -m database.benchmark --check-queries
+    python -m database.benchmark --checkout
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import sessionmaker
+
+from database import database
+from database.engine import create_async_engines
+from database.models import Base, User, Product, CartItem, Order, OrderItem
+
+# База данных для замеров создается во временном каталоге
+BENCHMARK_DIR = tempfile.mkdtemp(prefix='marketplace_benchmark_')
+BENCHMARK_DATABASE_URL = f"sqlite:///{os.path.join(BENCHMARK_DIR, 'benchmark.db')}"
+
+
+def add_to_cart_sync(session_factory, user_id, product_id, quantity=1, size=None, color=None):
+    """Прежняя синхронная реализация add_to_cart."""
+    session = session_factory()
+    user = session.query(User).filter(User.user_id == user_id).first()
+    if not user:
+        session.close()
+        return False
+
+    cart_item = session.query(CartItem).filter(
+        CartItem.user_id == user.id,
+        CartItem.product_id == product_id,
+        CartItem.size == size,
+        CartItem.color == color
+    ).first()
+
+    if cart_item:
+        cart_item.quantity += quantity
+    else:
+        cart_item = CartItem(
+            user_id=user.id,
+            product_id=product_id,
+            quantity=quantity,
+            size=size,
+            color=color
+        )
+        session.add(cart_item)
+
+    session.commit()
+    session.close()
+    return True
+
+
+async def create_order_orm(user_id, delivery_address):
+    """Прежняя реализация create_order: позиции добавляются и удаляются по одной через ORM."""
+    session = database.get_session()
+    try:
+        user = await session.scalar(select(User).filter(User.user_id == user_id))
+        cart_items = (await session.scalars(select(CartItem).filter(CartItem.user_id == user.id))).all()
+
+        total_amount = 0
+        for item in cart_items:
+            product = await session.get(Product, item.product_id)
+            total_amount += product.price * item.quantity
+
+        order = Order(user_id=user.id, total_amount=total_amount, delivery_address=delivery_address, status="new")
+        session.add(order)
+        await session.flush()
+
+        for item in cart_items:
+            product = await session.get(Product, item.product_id)
+            session.add(OrderItem(
+                order_id=order.id,
+                product_id=item.product_id,
+                quantity=item.quantity,
+                price=product.price,
+                size=item.size,
+                color=item.color
+            ))
+
+        for item in cart_items:
+            await session.delete(item)
+
+        await session.commit()
+        return order.id
+    finally:
+        await session.close()
+
+
+def prepare_database(users, products):
+    """Создать таблицы, пользователей и товары."""
+    engine = create_engine(BENCHMARK_DATABASE_URL)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all(User(user_id=1000 + i, username=f"user{i}") for i in range(users))
+    session.add_all(Product(marketplace='wildberries', title=f"Товар {i}", price=100 + i) for i in range(products))
+    session.commit()
+    session.close()
+    return engine
+
+
+async def measure(name, users, updates, add_to_cart):
+    """Выполнить updates добавлений в корзину для каждого из users пользователей одновременно."""
+    max_lag = 0.0
+    running = True
+
+    async def ticker():
+        # Задержка цикла событий: насколько позже запланированного просыпается задача
+        nonlocal max_lag
+        while running:
+            started = time.perf_counter()
+            await asyncio.sleep(0.005)
+            max_lag = max(max_lag, time.perf_counter() - started - 0.005)
+
+    async def user_session(index):
+        for update in range(updates):
+            await add_to_cart(1000 + index, update % 5 + 1, 1, None, None)
+
+    ticker_task = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await asyncio.gather(*[user_session(index) for index in range(users)])
+    elapsed = time.perf_counter() - started
+    running = False
+    await ticker_task
+
+    operations = users * updates
+    print(f"{name:<12} {operations:>8} {elapsed:>10.2f} {operations / elapsed:>10.0f} {max_lag * 1000:>12.1f}")
+
+
+async def measure_reads(name, users, updates, readers):
+    """Задержка чтения корзины, пока users пользователей одновременно добавляют товары."""
+    latencies = []
+    errors = 0
+    writing = True
+
+    async def reader(index):
+        nonlocal errors
+        while writing:
+            started = time.perf_counter()
+            try:
+                await database.get_cart_items(1000 + index % users)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    async def user_session(index):
+        nonlocal errors
+        for update in range(updates):
+            try:
+                await database.add_to_cart(1000 + index, update % 5 + 1, 1, None, None)
+            except Exception:
+                errors += 1
+
+    reader_tasks = [asyncio.create_task(reader(index)) for index in range(readers)]
+    await asyncio.gather(*[user_session(index) for index in range(users)])
+    writing = False
+    await asyncio.gather(*reader_tasks)
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000
+    print(f"{name:<12} {len(latencies):>8} {p50:>10.1f} {p95:>10.1f} {errors:>8}")
+
+
+@contextmanager
+def count_statements(engines):
+    """Подсчитать SQL-запросы, выполненные через движки (executemany считается одним запросом)."""
+    counter = {'statements': 0}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter['statements'] += 1
+
+    engines = set(engines)
+    for engine in engines:
+        event.listen(engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        for engine in engines:
+            event.remove(engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
+
+
+async def count_queries_for_cart(engines, cart_size):
+    """Число запросов в get_cart_items, create_order и get_order для корзины из cart_size товаров."""
+    prepare_database(1, cart_size).dispose()
+    for product_id in range(1, cart_size + 1):
+        await database.add_to_cart(1000, product_id)
+
+    counts = {}
+    with count_statements(engines) as counter:
+        await database.get_cart_items(1000)
+    counts['get_cart_items'] = counter['statements']
+
+    with count_statements(engines) as counter:
+        order_id = await database.create_order(1000, "Адрес")
+    counts['create_order'] = counter['statements']
+
+    with count_statements(engines) as counter:
+        await database.get_order(order_id)
+    counts['get_order'] = counter['statements']
+    return counts
+
+
+async def measure_checkout(name, create_order, cart_size, repeats, engines):
+    """Среднее время оформления заказа и число запросов для корзины из cart_size товаров."""
+    elapsed = 0.0
+    statements = 0
+    for _ in range(repeats):
+        for product_id in range(1, cart_size + 1):
+            await database.add_to_cart(1000, product_id)
+
+        with count_statements(engines) as counter:
+            started = time.perf_counter()
+            order_id = await create_order(1000, "Адрес")
+            elapsed += time.perf_counter() - started
+        statements += counter['statements']
+
+        if order_id is None or await database.get_cart_items(1000):
+            raise RuntimeError(f"{name}: заказ не оформлен")
+
+    print(f"{name:<12} {cart_size:>8} {elapsed / repeats * 1000:>10.2f} {statements // repeats:>10}")
+
+
+async def checkout(cart_sizes=(1, 10, 100), repeats=20):
+    """Сравнить оформление заказа через ORM по одной позиции и набором SQL-запросов."""
+    print(f"{'Вариант':<12} {'Товаров':>8} {'Время, мс':>10} {'Запросов':>10}")
+    for cart_size in cart_sizes:
+        for name, create_order in (('orm', create_order_orm), ('set-based', database.create_order)):
+            prepare_database(1, cart_size).dispose()
+            engines = use_benchmark_database()
+            await measure_checkout(name, create_order, cart_size, repeats, engines)
+            await dispose_engines(engines)
+
+
+async def check_queries(cart_sizes=(1, 10, 50)):
+    """Проверить, что число запросов не растет вместе с размером корзины."""
+    engines = use_benchmark_database()
+
+    results = {size: await count_queries_for_cart(engines, size) for size in cart_sizes}
+    await dispose_engines(engines)
+
+    print(f"{'Функция':<16}" + ''.join(f"{f'{size} тов.':>10}" for size in cart_sizes))
+    failed = False
+    for name in results[cart_sizes[0]]:
+        counts = [results[size][name] for size in cart_sizes]
+        print(f"{name:<16}" + ''.join(f"{count:>10}" for count in counts))
+        if len(set(counts)) > 1:
+            failed = True
+
+    if failed:
+        print("Число запросов зависит от размера корзины")
+    return not failed
+
+
+def use_benchmark_database():
+    """
+    Переключить функции database.database на базу для замеров.
+
+    Returns:
+        tuple: (движок записи, движок чтения)
+    """
+    write_engine, read_engine = create_async_engines(BENCHMARK_DATABASE_URL)
+    database.session_factory.configure(bind=write_engine)
+    database.read_session_factory.configure(bind=read_engine)
+    return write_engine, read_engine
+
+
+async def dispose_engines(engines):
+    for engine in set(engines):
+        await engine.dispose()
+
+
+async def run(users, updates, readers):
+    print(f"{'Вариант':<12} {'Операций':>8} {'Время, с':>10} {'Опер./с':>10} {'Задержка, мс':>12}")
+
+    engine = prepare_database(users, 5)
+    session_factory = sessionmaker(bind=engine)
+
+    async def add_to_cart_blocking(*args):
+        # Так вызывались синхронные функции из асинхронных обработчиков
+        return add_to_cart_sync(session_factory, *args)
+
+    await measure('sync', users, updates, add_to_cart_blocking)
+    engine.dispose()
+
+    prepare_database(users, 5).dispose()
+    write_engine, read_engine = use_benchmark_database()
+    await measure('async', users, updates, database.add_to_cart)
+
+    # Чтение во время записи: через соединение записи (как до появления пула чтения) и через пул чтения
+    print()
+    print(f"{'Чтение':<12} {'Запросов':>8} {'p50, мс':>10} {'p95, мс':>10} {'Ошибок':>8}")
+    prepare_database(users, 5).dispose()
+    database.read_session_factory.configure(bind=write_engine)
+    await measure_reads('writer', users, updates, readers)
+
+    prepare_database(users, 5).dispose()
+    database.read_session_factory.configure(bind=read_engine)
+    await measure_reads('read pool', users, updates, readers)
+    await dispose_engines((write_engine, read_engine))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20, help="Количество одновременных пользователей")
+    parser.add_argument('--updates', type=int, default=50, help="Количество добавлений в корзину на пользователя")
+    parser.add_argument('--readers', type=int, default=20, help="Количество одновременных чтений корзины во время записи")
+    parser.add_argument('--checkout', action='store_true',
+                        help="Сравнить время оформления заказа для корзин из 1, 10 и 100 товаров")
+    parser.add_argument('--check-queries', action='store_true',
+                        help="Проверить, что число запросов не зависит от размера корзины")
+    args = parser.parse_args()
+
+    if args.check_queries:
+        return 0 if asyncio.run(check_queries()) else 1
+
+    if args.checkout:
+        asyncio.run(checkout())
+        return 0
+
+    asyncio.run(run(args.users, args.updates, args.readers))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
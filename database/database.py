@@ -1,182 +1,331 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, scoped_session
-from config.config import DATABASE_URL, DEFAULT_DELIVERY_ADDRESS
-from database.models import Base, User, Product, CartItem, Order, OrderItem
+from datetime import datetime
 
-# Создаем движок базы данных
-engine = create_engine(DATABASE_URL)
+from sqlalchemy import select, insert, delete, func, literal, tuple_, DateTime
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from config.config import DATABASE_URL, DEFAULT_DELIVERY_ADDRESS, USER_ID_CACHE_MAX_ENTRIES
+from database.engine import create_async_engines
+from database.user_id_cache import UserIdCache
+from database.read_models import (
+    UserRow, ProductRow, CartItemRow, OrderRow, OrderItemRow,
+    USER_COLUMNS, PRODUCT_COLUMNS, ORDER_COLUMNS, ORDER_PRODUCT_COLUMNS
+)
+from database.models import Base, User, Product, CartItem, CartSummary, Order, OrderItem
 
-# Создаем фабрику сессий
-session_factory = sessionmaker(bind=engine)
-Session = scoped_session(session_factory)
+# Движок записи и движок чтения (для файла SQLite - отдельный пул соединений только для чтения)
+engine, read_engine = create_async_engines(DATABASE_URL)
+
+# Вставка с обновлением при конфликте (INSERT ... ON CONFLICT DO UPDATE) по диалектам
+UPSERT_INSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+# Соответствие Telegram ID и ID пользователя в базе данных
+user_id_cache = UserIdCache(max_entries=USER_ID_CACHE_MAX_ENTRIES)
+
+# Создаем фабрику сессий; объекты остаются доступными после commit
+session_factory = async_sessionmaker(engine, expire_on_commit=False)
+read_session_factory = async_sessionmaker(read_engine, expire_on_commit=False)
 
 def get_session():
-    """Получить сессию базы данных."""
-    return Session()
+    """Получить асинхронную сессию базы данных."""
+    return session_factory()
+
+def get_read_session():
+    """Получить сессию для функций, которые только читают данные."""
+    return read_session_factory()
+
+async def resolve_user_id(session, user_id):
+    """
+    Получить ID пользователя в базе данных по Telegram ID.
+    
+    Returns:
+        int или None, если пользователь не найден
+    """
+    db_user_id = user_id_cache.get(user_id)
+    if db_user_id is None:
+        db_user_id = await session.scalar(select(User.id).filter(User.user_id == user_id))
+        if db_user_id is not None:
+            user_id_cache.set(user_id, db_user_id)
+    return db_user_id
+
+async def init_db():
+    """Инициализировать базу данных и применить недостающие миграции схемы."""
+    # Импорт здесь, чтобы python -m database.migrations не загружал модуль дважды
+    from database.migrations import run_migrations
 
-def init_db():
-    """Инициализировать базу данных."""
-    Base.metadata.create_all(engine)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        await connection.run_sync(run_migrations)
+
+async def close_db():
+    """Закрыть соединения с базой данных."""
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
 
 # Методы для работы с пользователями
-def get_user(user_id):
-    """Получить пользователя по Telegram ID."""
-    session = get_session()
-    user = session.query(User).filter(User.user_id == user_id).first()
-    session.close()
+async def get_user(user_id):
+    """
+    Получить пользователя по Telegram ID.
+    
+    Returns:
+        UserRow или None, если пользователь не найден
+    """
+    async with get_read_session() as session:
+        row = (await session.execute(select(*USER_COLUMNS).filter(User.user_id == user_id))).first()
+    if not row:
+        return None
+    user = UserRow(*row)
+    user_id_cache.set(user.user_id, user.id)
     return user
 
-def create_user(user_id, username=None, first_name=None, last_name=None):
+async def create_user(user_id, username=None, first_name=None, last_name=None):
     """Создать нового пользователя."""
-    session = get_session()
-    user = User(
-        user_id=user_id,
-        username=username,
-        first_name=first_name,
-        last_name=last_name
-    )
-    session.add(user)
-    session.commit()
-    user_id = user.id
-    session.close()
-    return user_id
+    async with get_session() as session:
+        user = User(
+            user_id=user_id,
+            username=username,
+            first_name=first_name,
+            last_name=last_name
+        )
+        session.add(user)
+        await session.commit()
+        db_user_id = user.id
+    user_id_cache.set(user_id, db_user_id)
+    return db_user_id
 
-def update_user(user_id, **kwargs):
+async def delete_user(user_id):
+    """Удалить пользователя вместе с его корзиной и заказами."""
+    async with get_session() as session:
+        user = await session.scalar(select(User).filter(User.user_id == user_id))
+        if not user:
+            return False
+        
+        await session.delete(user)
+        await session.commit()
+    user_id_cache.invalidate(user_id)
+    return True
+
+async def update_user(user_id, **kwargs):
     """Обновить данные пользователя."""
-    session = get_session()
-    user = session.query(User).filter(User.user_id == user_id).first()
-    if user:
-        for key, value in kwargs.items():
-            if hasattr(user, key):
-                setattr(user, key, value)
-        session.commit()
-    session.close()
+    async with get_session() as session:
+        user = await session.scalar(select(User).filter(User.user_id == user_id))
+        if user:
+            for key, value in kwargs.items():
+                if hasattr(user, key):
+                    setattr(user, key, value)
+            await session.commit()
+            if 'user_id' in kwargs:
+                user_id_cache.invalidate(user_id)
     return user
 
 # Методы для работы с корзиной
-def get_cart_items(user_id):
-    """Получить все товары в корзине пользователя."""
-    session = get_session()
-    user = session.query(User).filter(User.user_id == user_id).first()
-    if not user:
-        session.close()
-        return []
+async def get_cart_items(user_id):
+    """
+    Получить все товары в корзине пользователя.
     
-    cart_items = session.query(CartItem).filter(CartItem.user_id == user.id).all()
-    result = []
-    for item in cart_items:
-        product = session.query(Product).filter(Product.id == item.product_id).first()
-        if product:
-            result.append({
-                'id': item.id,
-                'product': product,
-                'quantity': item.quantity,
-                'size': item.size,
-                'color': item.color
-            })
+    Returns:
+        list: Позиции корзины (CartItemRow)
+    """
+    async with get_read_session() as session:
+        db_user_id = await resolve_user_id(session, user_id)
+        if not db_user_id:
+            return []
+        
+        # Товары корзины загружаются вместе с продуктами одним запросом
+        rows = (await session.execute(
+            select(CartItem.id, CartItem.quantity, CartItem.size, CartItem.color, *PRODUCT_COLUMNS)
+            .join(Product, Product.id == CartItem.product_id)
+            .filter(CartItem.user_id == db_user_id)
+            .order_by(CartItem.id)
+        )).all()
     
-    session.close()
-    return result
+    return [
+        CartItemRow(
+            id=row[0],
+            product=ProductRow(*row[4:]),
+            quantity=row[1],
+            size=row[2],
+            color=row[3]
+        )
+        for row in rows
+    ]
 
-def add_to_cart(user_id, product_id, quantity=1, size=None, color=None):
-    """Добавить товар в корзину пользователя."""
-    session = get_session()
-    user = session.query(User).filter(User.user_id == user_id).first()
-    if not user:
-        session.close()
-        return False
+async def get_cart_summary(user_id):
+    """
+    Получить сводку корзины пользователя одним чтением по первичному ключу.
     
-    # Проверяем, есть ли уже такой товар в корзине
-    cart_item = session.query(CartItem).filter(
-        CartItem.user_id == user.id,
-        CartItem.product_id == product_id,
-        CartItem.size == size,
-        CartItem.color == color
-    ).first()
+    Returns:
+        dict: {'items_count': количество позиций, 'total_quantity': количество
+        товаров, 'total_amount': сумма}
+    """
+    async with get_read_session() as session:
+        db_user_id = await resolve_user_id(session, user_id)
+        summary = await session.get(CartSummary, db_user_id) if db_user_id else None
     
-    if cart_item:
-        # Если товар уже есть, увеличиваем количество
-        cart_item.quantity += quantity
-    else:
-        # Если товара нет, создаем новую запись
-        cart_item = CartItem(
-            user_id=user.id,
-            product_id=product_id,
-            quantity=quantity,
-            size=size,
-            color=color
+    if not summary:
+        return {'items_count': 0, 'total_quantity': 0, 'total_amount': 0.0}
+    return {
+        'items_count': summary.items_count,
+        'total_quantity': summary.total_quantity,
+        'total_amount': summary.total_amount
+    }
+
+def select_cart_totals(user_id_column, *filters):
+    """Запрос итогов корзины: (user_id, количество позиций, количество товаров, сумма, время)."""
+    return (
+        select(
+            user_id_column.label('user_id'),
+            func.count(CartItem.id).label('items_count'),
+            func.coalesce(func.sum(CartItem.quantity), 0).label('total_quantity'),
+            func.coalesce(func.sum(Product.price * CartItem.quantity), 0.0).label('total_amount'),
+            literal(datetime.now(), DateTime).label('updated_at')
         )
-        session.add(cart_item)
-    
-    session.commit()
-    session.close()
+        .select_from(CartItem)
+        .join(Product, Product.id == CartItem.product_id)
+        .filter(*filters)
+    )
+
+async def save_cart_summaries(session, totals):
+    """Записать итоги корзин из запроса select_cart_totals в cart_summaries."""
+    columns = ['user_id', 'items_count', 'total_quantity', 'total_amount', 'updated_at']
+    dialect_insert = UPSERT_INSERTS.get(engine.dialect.name)
+    if dialect_insert is not None:
+        statement = dialect_insert(CartSummary).from_select(columns, totals)
+        statement = statement.on_conflict_do_update(
+            index_elements=[CartSummary.user_id],
+            set_={column: statement.excluded[column] for column in columns[1:]}
+        )
+        await session.execute(statement)
+    else:
+        totals = totals.subquery()
+        await session.execute(delete(CartSummary).filter(CartSummary.user_id.in_(select(totals.c.user_id))))
+        await session.execute(insert(CartSummary).from_select(columns, select(totals)))
+
+async def refresh_cart_summary(session, db_user_id):
+    """Пересчитать сводку корзины пользователя в текущей транзакции."""
+    # Без GROUP BY запрос возвращает строку и для пустой корзины
+    await save_cart_summaries(session, select_cart_totals(literal(db_user_id), CartItem.user_id == db_user_id))
+
+async def refresh_product_cart_summaries(session, product_id):
+    """Пересчитать сводки корзин, в которых лежит товар (после изменения его цены)."""
+    users_with_product = select(CartItem.user_id).filter(CartItem.product_id == product_id)
+    await save_cart_summaries(
+        session,
+        select_cart_totals(CartItem.user_id, CartItem.user_id.in_(users_with_product)).group_by(CartItem.user_id)
+    )
+
+async def add_to_cart(user_id, product_id, quantity=1, size=None, color=None):
+    """Добавить товар в корзину пользователя."""
+    async with get_session() as session:
+        db_user_id = await resolve_user_id(session, user_id)
+        if not db_user_id:
+            return False
+        
+        # Проверяем, есть ли уже такой товар в корзине
+        cart_item = await session.scalar(select(CartItem).filter(
+            CartItem.user_id == db_user_id,
+            CartItem.product_id == product_id,
+            CartItem.size == size,
+            CartItem.color == color
+        ))
+        
+        if cart_item:
+            # Если товар уже есть, увеличиваем количество
+            cart_item.quantity += quantity
+        else:
+            # Если товара нет, создаем новую запись
+            cart_item = CartItem(
+                user_id=db_user_id,
+                product_id=product_id,
+                quantity=quantity,
+                size=size,
+                color=color
+            )
+            session.add(cart_item)
+        
+        await session.flush()
+        await refresh_cart_summary(session, db_user_id)
+        await session.commit()
     return True
 
-def remove_from_cart(user_id, cart_item_id):
+async def remove_from_cart(user_id, cart_item_id):
     """Удалить товар из корзины пользователя."""
-    session = get_session()
-    user = session.query(User).filter(User.user_id == user_id).first()
-    if not user:
-        session.close()
-        return False
-    
-    cart_item = session.query(CartItem).filter(
-        CartItem.id == cart_item_id,
-        CartItem.user_id == user.id
-    ).first()
-    
-    if cart_item:
-        session.delete(cart_item)
-        session.commit()
-        session.close()
-        return True
-    else:
-        session.close()
-        return False
+    async with get_session() as session:
+        db_user_id = await resolve_user_id(session, user_id)
+        if not db_user_id:
+            return False
+        
+        cart_item = await session.scalar(select(CartItem).filter(
+            CartItem.id == cart_item_id,
+            CartItem.user_id == db_user_id
+        ))
+        if not cart_item:
+            return False
+        
+        await session.delete(cart_item)
+        await session.flush()
+        await refresh_cart_summary(session, db_user_id)
+        await session.commit()
+    return True
 
-def clear_cart(user_id):
+async def clear_cart(user_id):
     """Удалить все товары из корзины пользователя."""
     session = get_session()
-    user = session.query(User).filter(User.user_id == user_id).first()
-    if not user:
-        session.close()
-        return False
-    
     try:
+        db_user_id = await resolve_user_id(session, user_id)
+        if not db_user_id:
+            return False
+        
         # Получаем все товары в корзине пользователя
-        cart_items = session.query(CartItem).filter(CartItem.user_id == user.id).all()
+        cart_items = (await session.scalars(select(CartItem).filter(CartItem.user_id == db_user_id))).all()
         
         # Если корзина пуста, возвращаем успех
         if not cart_items:
-            session.close()
             return True
         
         # Удаляем все товары из корзины
         for item in cart_items:
-            session.delete(item)
+            await session.delete(item)
         
-        session.commit()
+        await session.flush()
+        await refresh_cart_summary(session, db_user_id)
+        await session.commit()
         return True
     except Exception as e:
         print(f"Ошибка при очистке корзины: {e}")
-        session.rollback()
+        await session.rollback()
         return False
     finally:
-        session.close()
+        await session.close()
 
 # Методы для работы с заказами
-def create_order(user_id, delivery_address, delivery_time=None, payment_method=None):
-    """Создать новый заказ из товаров в корзине."""
+async def create_order(user_id, delivery_address, delivery_time=None, payment_method=None):
+    """
+    Создать новый заказ из товаров в корзине.
+    
+    Заказ оформляется набором SQL-запросов без загрузки корзины в Python:
+    сумма считается через SUM, позиции копируются из корзины одним
+    INSERT ... SELECT, корзина очищается одним DELETE. Все запросы
+    выполняются в одной короткой транзакции.
+    """
     session = get_session()
     
     try:
-        user = session.query(User).filter(User.user_id == user_id).first()
-        if not user:
+        db_user_id = await resolve_user_id(session, user_id)
+        if not db_user_id:
             return None
         
-        # Получаем товары из корзины
-        cart_items = session.query(CartItem).filter(CartItem.user_id == user.id).all()
-        if not cart_items:
+        # Количество позиций и сумма заказа считаются в базе данных
+        items_count, total_amount = (await session.execute(
+            select(func.count(), func.sum(Product.price * CartItem.quantity))
+            .select_from(CartItem)
+            .join(Product, Product.id == CartItem.product_id)
+            .filter(CartItem.user_id == db_user_id)
+        )).one()
+        if not items_count:
             return None
         
         # Если адрес доставки не указан, используем значение по умолчанию
@@ -184,13 +333,8 @@ def create_order(user_id, delivery_address, delivery_time=None, payment_method=N
             delivery_address = DEFAULT_DELIVERY_ADDRESS
         
         # Создаем заказ
-        total_amount = 0
-        for item in cart_items:
-            product = session.query(Product).filter(Product.id == item.product_id).first()
-            total_amount += product.price * item.quantity
-        
         order = Order(
-            user_id=user.id,
+            user_id=db_user_id,
             total_amount=total_amount,
             delivery_address=delivery_address,
             delivery_time=delivery_time,
@@ -198,26 +342,28 @@ def create_order(user_id, delivery_address, delivery_time=None, payment_method=N
             status="new"
         )
         session.add(order)
-        session.flush()  # Чтобы получить id заказа
+        await session.flush()  # Чтобы получить id заказа
         
-        # Добавляем товары в заказ
-        for item in cart_items:
-            product = session.query(Product).filter(Product.id == item.product_id).first()
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=item.product_id,
-                quantity=item.quantity,
-                price=product.price,
-                size=item.size,
-                color=item.color
+        # Копируем товары корзины в заказ одним INSERT ... SELECT
+        await session.execute(
+            insert(OrderItem).from_select(
+                ['order_id', 'product_id', 'quantity', 'price', 'title', 'size', 'color'],
+                select(
+                    literal(order.id), CartItem.product_id, CartItem.quantity,
+                    Product.price, Product.title, CartItem.size, CartItem.color
+                )
+                .select_from(CartItem)
+                .join(Product, Product.id == CartItem.product_id)
+                .filter(CartItem.user_id == db_user_id)
+                .order_by(CartItem.id)
             )
-            session.add(order_item)
+        )
         
         # Очищаем корзину пользователя
-        for item in cart_items:
-            session.delete(item)
+        await session.execute(delete(CartItem).filter(CartItem.user_id == db_user_id))
+        await refresh_cart_summary(session, db_user_id)
         
-        session.commit()
+        await session.commit()
         
         # Сохраняем ID заказа перед закрытием сессии
         order_id = order.id
@@ -226,103 +372,218 @@ def create_order(user_id, delivery_address, delivery_time=None, payment_method=N
     
     except Exception as e:
         print(f"Ошибка при создании заказа: {e}")
-        session.rollback()
+        await session.rollback()
         return None
     
     finally:
-        session.close()
+        await session.close()
 
-def get_orders(user_id):
-    """Получить все заказы пользователя."""
-    session = get_session()
-    user = session.query(User).filter(User.user_id == user_id).first()
-    if not user:
-        session.close()
-        return []
-    
-    orders = session.query(Order).filter(Order.user_id == user.id).all()
+async def get_orders(user_id):
+    """
+    Получить все заказы пользователя.
     
-    # Закрываем сессию после получения всех необходимых данных
-    session.close()
+    Returns:
+        list: Заказы (OrderRow)
+    """
+    async with get_read_session() as session:
+        db_user_id = await resolve_user_id(session, user_id)
+        if not db_user_id:
+            return []
+        
+        rows = (await session.execute(select(*ORDER_COLUMNS).filter(Order.user_id == db_user_id))).all()
     
-    return orders
+    return [OrderRow(*row) for row in rows]
 
-def get_order(order_id):
-    """Получить информацию о заказе по ID."""
-    session = get_session()
-    order = session.query(Order).filter(Order.id == order_id).first()
-    if not order:
-        session.close()
-        return None
+async def get_orders_page(user_id, limit=5, after=None, before=None):
+    """
+    Получить страницу заказов пользователя, начиная с новых.
     
-    items = session.query(OrderItem).filter(OrderItem.order_id == order.id).all()
-    order_items = []
-    for item in items:
-        product = session.query(Product).filter(Product.id == item.product_id).first()
-        order_items.append({
-            'product': product,
-            'quantity': item.quantity,
-            'price': item.price,
-            'size': item.size,
-            'color': item.color
-        })
+    Используется постраничная выборка по ключу (created_at, id): вместо
+    OFFSET запрос продолжает выборку от заказа на границе соседней
+    страницы и читает из индекса только limit + 1 строку.
     
-    result = {
-        'id': order.id,
-        'user_id': order.user_id,
-        'total_amount': order.total_amount,
-        'delivery_address': order.delivery_address,
-        'delivery_time': order.delivery_time,
-        'payment_method': order.payment_method,
-        'status': order.status,
-        'created_at': order.created_at,
-        'items': order_items
-    }
+    Args:
+        user_id: ID пользователя в Telegram
+        limit: Количество заказов на странице
+        after: Курсор (created_at, id) последнего заказа предыдущей страницы -
+            вернуть более старые заказы
+        before: Курсор (created_at, id) первого заказа следующей страницы -
+            вернуть более новые заказы
     
-    session.close()
-    return result
+    Returns:
+        dict: {'orders': [OrderRow, ...], 'has_prev': bool, 'has_next': bool}
+    """
+    async with get_read_session() as session:
+        db_user_id = await resolve_user_id(session, user_id)
+        if not db_user_id:
+            return {'orders': [], 'has_prev': False, 'has_next': False}
+        
+        key = tuple_(Order.created_at, Order.id)
+        query = select(*ORDER_COLUMNS).filter(Order.user_id == db_user_id)
+        if before is not None:
+            # Предыдущая страница: ближайшие более новые заказы в обратном порядке
+            query = query.filter(key > tuple_(*before)).order_by(Order.created_at, Order.id)
+        else:
+            if after is not None:
+                query = query.filter(key < tuple_(*after))
+            query = query.order_by(Order.created_at.desc(), Order.id.desc())
+        
+        # Лишняя строка показывает, есть ли заказы дальше в направлении выборки
+        orders = [OrderRow(*row) for row in (await session.execute(query.limit(limit + 1))).all()]
+    
+    has_more = len(orders) > limit
+    orders = orders[:limit]
+    if before is not None:
+        orders.reverse()
+        return {'orders': orders, 'has_prev': has_more, 'has_next': True}
+    return {'orders': orders, 'has_prev': after is not None, 'has_next': has_more}
 
-def cancel_order(user_id, order_id):
-    """Отменить заказ пользователя."""
-    session = get_session()
-    user = session.query(User).filter(User.user_id == user_id).first()
-    if not user:
-        session.close()
-        return False
+async def count_orders(user_id):
+    """Получить количество заказов пользователя."""
+    async with get_read_session() as session:
+        db_user_id = await resolve_user_id(session, user_id)
+        if not db_user_id:
+            return 0
+        
+        return await session.scalar(select(func.count()).select_from(Order).filter(Order.user_id == db_user_id))
+
+async def get_order(order_id):
+    """
+    Получить информацию о заказе по ID.
     
-    order = session.query(Order).filter(
-        Order.id == order_id,
-        Order.user_id == user.id
-    ).first()
+    Returns:
+        dict: Поля заказа и 'items' - позиции заказа (OrderItemRow)
+    """
+    async with get_read_session() as session:
+        order = (await session.execute(
+            select(
+                Order.id, Order.user_id, Order.total_amount, Order.delivery_address, Order.delivery_time,
+                Order.payment_method, Order.status, Order.created_at
+            ).filter(Order.id == order_id)
+        )).first()
+        if not order:
+            return None
+        
+        # Товары заказа загружаются вместе с продуктами одним запросом
+        rows = (await session.execute(
+            select(OrderItem.quantity, OrderItem.price, OrderItem.size, OrderItem.color, *ORDER_PRODUCT_COLUMNS)
+            .join(Product, Product.id == OrderItem.product_id)
+            .filter(OrderItem.order_id == order_id)
+            .order_by(OrderItem.id)
+        )).all()
     
-    if order and order.status in ["new", "paid"]:
+    result = dict(order._mapping)
+    result['items'] = [
+        OrderItemRow(
+            product=ProductRow(*row[4:]),
+            quantity=row[0],
+            price=row[1],
+            size=row[2],
+            color=row[3]
+        )
+        for row in rows
+    ]
+    return result
+
+async def cancel_order(user_id, order_id):
+    """Отменить заказ пользователя."""
+    async with get_session() as session:
+        db_user_id = await resolve_user_id(session, user_id)
+        if not db_user_id:
+            return False
+        
+        order = await session.scalar(select(Order).filter(
+            Order.id == order_id,
+            Order.user_id == db_user_id
+        ))
+        if not order or order.status not in ["new", "paid"]:
+            return False
+        
         order.status = "cancelled"
-        session.commit()
-        session.close()
-        return True
-    else:
-        session.close()
-        return False
+        await session.commit()
+    return True
 
 # Методы для работы с товарами
-def create_product_from_url(url, marketplace, title, price, description=None, image_url=None):
-    """Создать новый товар из URL."""
+async def create_product_from_url(url, marketplace, title, price, description=None, image_url=None, external_id=None):
+    """
+    Создать товар из URL или обновить его в каталоге.
+    
+    Товар с известным external_id хранится в единственном экземпляре:
+    повторная ссылка на него обновляет название, цену и описание, а корзины
+    и заказы ссылаются на одну и ту же запись.
+    
+    Returns:
+        int: ID товара
+    """
+    if external_id is not None:
+        return await upsert_product(url, marketplace, external_id, title, price, description, image_url)
+    
+    async with get_session() as session:
+        product = Product(
+            marketplace=marketplace,
+            title=title,
+            description=description,
+            price=price,
+            image_url=image_url,
+            url=url
+        )
+        session.add(product)
+        await session.commit()
+        return product.id
+
+async def upsert_product(url, marketplace, external_id, title, price, description=None, image_url=None):
+    """Добавить товар в каталог или обновить существующий по (marketplace, external_id)."""
+    values = {
+        'marketplace': marketplace,
+        'external_id': external_id,
+        'title': title,
+        'description': description,
+        'price': price,
+        'image_url': image_url,
+        'url': url
+    }
     session = get_session()
-    product = Product(
-        marketplace=marketplace,
-        title=title,
-        description=description,
-        price=price,
-        image_url=image_url,
-        url=url
-    )
-    session.add(product)
-    session.commit()
-    product_id = product.id
-    session.close()
-    return product_id
+    try:
+        dialect_insert = UPSERT_INSERTS.get(engine.dialect.name)
+        if dialect_insert is not None:
+            statement = dialect_insert(Product).values(**values)
+            statement = statement.on_conflict_do_update(
+                index_elements=[Product.marketplace, Product.external_id],
+                set_={
+                    'title': statement.excluded.title,
+                    'price': statement.excluded.price,
+                    'url': statement.excluded.url,
+                    # Если новые данные неполные, сохраняем прежние описание и изображение
+                    'description': func.coalesce(statement.excluded.description, Product.description),
+                    'image_url': func.coalesce(statement.excluded.image_url, Product.image_url),
+                    'updated_at': datetime.now()
+                }
+            ).returning(Product.id)
+            product_id = await session.scalar(statement)
+            # Цена товара могла измениться - обновляем итоги корзин с этим товаром
+            await refresh_product_cart_summaries(session, product_id)
+        else:
+            product = await session.scalar(select(Product).filter(
+                Product.marketplace == marketplace,
+                Product.external_id == external_id
+            ))
+            if product:
+                for key, value in values.items():
+                    if value is not None:
+                        setattr(product, key, value)
+            else:
+                product = Product(**values)
+                session.add(product)
+            await session.flush()
+            product_id = product.id
+            await refresh_product_cart_summaries(session, product_id)
+        
+        await session.commit()
+        return product_id
+    finally:
+        await session.close()
 
-def get_order_details(user_id, order_id):
+async def get_order_details(user_id, order_id):
     """
     Получить детали заказа.
     
@@ -351,34 +612,38 @@ def get_order_details(user_id, order_id):
             ]
         }
     """
-    from sqlalchemy.orm import joinedload
-    
     # Создаем сессию
-    session = get_session()
+    session = get_read_session()
     
     try:
         # Сначала находим пользователя по Telegram ID
-        user = session.query(User).filter(User.user_id == user_id).first()
-        if not user:
+        db_user_id = await resolve_user_id(session, user_id)
+        if not db_user_id:
             print(f"Пользователь с Telegram ID {user_id} не найден")
             return None
         
         # Получаем заказ по ID заказа и ID пользователя в базе данных
-        order = session.query(Order).filter(
+        order = (await session.execute(select(*ORDER_COLUMNS).filter(
             Order.id == order_id,
-            Order.user_id == user.id  # Используем user.id, а не user_id из функции
-        ).first()
+            Order.user_id == db_user_id  # Используем db_user_id, а не user_id из функции
+        ))).first()
         
         if not order:
-            print(f"Заказ #{order_id} не найден для пользователя {user_id} (DB user.id: {user.id})")
+            print(f"Заказ #{order_id} не найден для пользователя {user_id} (DB db_user_id: {db_user_id})")
             return None
+        order = OrderRow(*order)
         
-        # Получаем товары в заказе
-        order_items = session.query(OrderItem).options(
-            joinedload(OrderItem.product)
-        ).filter(
-            OrderItem.order_id == order.id
-        ).all()
+        # Получаем товары в заказе: название и цена - на момент заказа, а не текущие из каталога
+        order_items = (await session.execute(
+            select(
+                OrderItem.quantity, OrderItem.size, OrderItem.color,
+                func.coalesce(OrderItem.title, Product.title).label('title'), OrderItem.price,
+                Product.marketplace, Product.url
+            )
+            .join(Product, Product.id == OrderItem.product_id)
+            .filter(OrderItem.order_id == order.id)
+            .order_by(OrderItem.id)
+        )).all()
         
         # Формируем словарь с информацией о заказе
         order_data = {
@@ -391,15 +656,13 @@ def get_order_details(user_id, order_id):
         
         # Добавляем информацию о товарах
         for item in order_items:
-            product = item.product
-            
             # Добавляем товар в список
             order_data['items'].append({
                 'product': {
-                    'title': product.title,
-                    'price': product.price,
-                    'marketplace': product.marketplace,
-                    'url': product.url
+                    'title': item.title,
+                    'price': item.price,
+                    'marketplace': item.marketplace,
+                    'url': item.url
                 },
                 'quantity': item.quantity,
                 'size': item.size,
@@ -413,9 +676,9 @@ def get_order_details(user_id, order_id):
         return None
     
     finally:
-        session.close()
+        await session.close()
 
-def update_order_status(order_id, status):
+async def update_order_status(order_id, status):
     """
     Обновляет статус заказа.
     
@@ -430,21 +693,21 @@ def update_order_status(order_id, status):
     
     try:
         # Получаем заказ по ID
-        order = session.query(Order).filter(Order.id == order_id).first()
+        order = await session.scalar(select(Order).filter(Order.id == order_id))
         
         if not order:
             return False
         
         # Обновляем статус
         order.status = status
-        session.commit()
+        await session.commit()
         
         return True
     
     except Exception as e:
         print(f"Ошибка при обновлении статуса заказа: {e}")
-        session.rollback()
+        await session.rollback()
         return False
     
     finally:
-        session.close() 
\ No newline at end of file
+        await session.close() 
\ No newline at end of file
@@ -0,0 +1,119 @@
+"""
+Создание движков базы данных.
+
+Все движки процесса создаются здесь с общими настройками. Для файлов
+SQLite каждое соединение получает производственный набор PRAGMA:
+журнал WAL (чтение не блокируется записью), synchronous=NORMAL,
+busy_timeout (ожидание блокировки вместо ошибки "database is locked"),
+mmap_size, cache_size и temp_store.
+
+SQLite допускает только одного писателя, поэтому запись идет через
+движок с единственным соединением, а чтение - через отдельный пул
+соединений только для чтения. Для других СУБД чтение и запись
+используют один общий пул.
+"""
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from config.config import (
+    DATABASE_POOL_SIZE, DATABASE_MAX_OVERFLOW, DATABASE_READ_POOL_SIZE,
+    SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_BUSY_TIMEOUT,
+    SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE, SQLITE_TEMP_STORE
+)
+
+# Асинхронные драйверы для синхронных URL базы данных
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+
+def get_async_database_url(url):
+    """Получить URL базы данных с асинхронным драйвером (aiosqlite, asyncpg)."""
+    scheme, separator, rest = url.partition('://')
+    return ASYNC_DRIVERS.get(scheme, scheme) + separator + rest
+
+
+def is_sqlite_url(url):
+    return url.startswith('sqlite')
+
+
+def is_sqlite_file_url(url):
+    """Проверить, что URL указывает на файл SQLite, а не на базу в памяти."""
+    if not is_sqlite_url(url):
+        return False
+    path = url.partition('://')[2].lstrip('/')
+    return bool(path) and ':memory:' not in path and 'mode=memory' not in path
+
+
+def get_sqlite_pragmas(readonly=False):
+    """PRAGMA, выполняемые для каждого нового соединения SQLite."""
+    pragmas = [
+        ('busy_timeout', SQLITE_BUSY_TIMEOUT),
+        ('synchronous', SQLITE_SYNCHRONOUS),
+        ('mmap_size', SQLITE_MMAP_SIZE),
+        ('cache_size', SQLITE_CACHE_SIZE),
+        ('temp_store', SQLITE_TEMP_STORE),
+    ]
+    if readonly:
+        # Соединения пула чтения не могут случайно начать запись
+        pragmas.append(('query_only', 'ON'))
+    else:
+        # Режим журнала хранится в файле базы, его достаточно задать писателю
+        pragmas.insert(0, ('journal_mode', SQLITE_JOURNAL_MODE))
+    return pragmas
+
+
+def set_sqlite_pragmas(engine, readonly=False):
+    """Выполнять PRAGMA при открытии каждого соединения движка."""
+    pragmas = get_sqlite_pragmas(readonly)
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def get_engine_options(url, readonly=False):
+    """Параметры пула соединений для URL базы данных."""
+    if is_sqlite_url(url):
+        # Писатель держит одно постоянное соединение: одновременные транзакции
+        # записи на разных соединениях SQLite ждали бы друг друга или
+        # завершались ошибкой "database is locked"
+        pool_size = DATABASE_READ_POOL_SIZE if readonly else 1
+        return {'poolclass': AsyncAdaptedQueuePool, 'pool_size': pool_size, 'max_overflow': 0}
+    return {'pool_size': DATABASE_POOL_SIZE, 'max_overflow': DATABASE_MAX_OVERFLOW, 'pool_pre_ping': True}
+
+
+def create_async_engines(url):
+    """
+    Создать асинхронные движки для записи и для чтения.
+
+    Returns:
+        tuple: (движок записи, движок чтения). Если отдельный пул чтения не
+        нужен (не SQLite или база в памяти), оба элемента - один движок.
+    """
+    async_url = get_async_database_url(url)
+    write_engine = create_async_engine(async_url, **get_engine_options(url))
+    if not is_sqlite_url(url):
+        return write_engine, write_engine
+
+    set_sqlite_pragmas(write_engine.sync_engine)
+    if not is_sqlite_file_url(url):
+        # Каждое соединение с базой в памяти видит собственную пустую базу
+        return write_engine, write_engine
+
+    read_engine = create_async_engine(async_url, **get_engine_options(url, readonly=True))
+    set_sqlite_pragmas(read_engine.sync_engine, readonly=True)
+    return write_engine, read_engine
+
+
+def create_sync_engine(url):
+    """Создать синхронный движок (для скриптов обслуживания) с теми же PRAGMA."""
+    engine = create_engine(url)
+    if is_sqlite_url(url):
+        set_sqlite_pragmas(engine)
+    return engine
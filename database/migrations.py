@@ -0,0 +1,169 @@
+"""
+Версионные миграции схемы базы данных.
+
+Base.metadata.create_all создает только отсутствующие таблицы и не меняет
+уже существующие, поэтому изменения схемы (например, новые индексы) в
+файлах marketplace.db, созданных прежними версиями бота, применяются
+миграциями. Номер последней примененной миграции хранится в таблице
+schema_version, каждая миграция выполняется один раз и в той же
+транзакции, что и запись о ней.
+
+Новая миграция добавляется в конец списка MIGRATIONS со следующим номером.
+Миграция содержит собственный DDL и не читает описание таблиц из моделей:
+модели в database/models.py описывают итоговую схему и могут меняться,
+а уже примененные миграции должны оставаться прежними. В новой базе
+create_all уже создает все таблицы и индексы, поэтому миграции проверяют
+их наличие (IF NOT EXISTS) и только записывают номер версии.
+
+Запуск вручную:
+    python -m database.migrations
+"""
+from datetime import datetime
+
+from sqlalchemy import Table, Column, Integer, String, DateTime, MetaData, select, func, insert, inspect, text
+
+from config.config import DATABASE_URL
+from database.engine import create_sync_engine
+from database.models import Base
+
+# Таблица версий хранится отдельно от моделей бота
+version_metadata = MetaData()
+
+schema_version = Table(
+    'schema_version',
+    version_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String(255), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+def execute(connection, *statements):
+    """Выполнить SQL-запросы миграции."""
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+def add_column(connection, table_name, column_name, column_ddl):
+    """Добавить столбец в таблицу, если его еще нет (SQLite не поддерживает ADD COLUMN IF NOT EXISTS)."""
+    existing = {column['name'] for column in inspect(connection).get_columns(table_name)}
+    if column_name not in existing:
+        execute(connection, f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_ddl}")
+
+
+def add_products_catalog_index(connection):
+    execute(
+        connection,
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_products_marketplace_external_id "
+        "ON products (marketplace, external_id)"
+    )
+
+
+def add_cart_items_indexes(connection):
+    execute(
+        connection,
+        "CREATE INDEX IF NOT EXISTS ix_cart_items_user_product ON cart_items (user_id, product_id, size, color)",
+        "CREATE INDEX IF NOT EXISTS ix_cart_items_product_id ON cart_items (product_id)"
+    )
+
+
+def add_orders_indexes(connection):
+    execute(
+        connection,
+        "CREATE INDEX IF NOT EXISTS ix_orders_user_created ON orders (user_id, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_order_items_order_id ON order_items (order_id)",
+        "CREATE INDEX IF NOT EXISTS ix_order_items_product_id ON order_items (product_id)"
+    )
+
+
+def add_cart_summaries(connection):
+    """Создать таблицу сводок корзин и заполнить ее по текущим корзинам."""
+    execute(
+        connection,
+        "CREATE TABLE IF NOT EXISTS cart_summaries ("
+        "user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE, "
+        "items_count INTEGER NOT NULL, "
+        "total_quantity INTEGER NOT NULL, "
+        "total_amount FLOAT NOT NULL, "
+        "updated_at TIMESTAMP, "
+        "PRIMARY KEY (user_id))",
+        "DELETE FROM cart_summaries"
+    )
+    connection.execute(
+        text(
+            "INSERT INTO cart_summaries (user_id, items_count, total_quantity, total_amount, updated_at) "
+            "SELECT cart_items.user_id, COUNT(cart_items.id), COALESCE(SUM(cart_items.quantity), 0), "
+            "SUM(products.price * cart_items.quantity), :updated_at "
+            "FROM cart_items JOIN products ON products.id = cart_items.product_id "
+            "GROUP BY cart_items.user_id"
+        ),
+        {'updated_at': datetime.now()}
+    )
+
+
+def add_order_items_title(connection):
+    """Добавить в позиции заказов название товара и заполнить его из каталога."""
+    add_column(connection, 'order_items', 'title', 'VARCHAR(255)')
+    execute(
+        connection,
+        "UPDATE order_items SET title = "
+        "(SELECT products.title FROM products WHERE products.id = order_items.product_id) "
+        "WHERE title IS NULL"
+    )
+
+
+# Миграции в порядке применения: (версия, описание, функция)
+MIGRATIONS = [
+    (1, "Уникальный индекс каталога товаров (marketplace, external_id)", add_products_catalog_index),
+    (2, "Индексы корзины (user_id, product_id, size, color) и (product_id)", add_cart_items_indexes),
+    (3, "Индексы истории заказов (user_id, created_at, id) и позиций заказа", add_orders_indexes),
+    (4, "Сводки корзин пользователей (cart_summaries)", add_cart_summaries),
+    (5, "Название товара в позициях заказов (order_items.title)", add_order_items_title),
+]
+
+
+def get_schema_version(connection):
+    """Получить номер последней примененной миграции (0, если миграций не было)."""
+    version_metadata.create_all(connection)
+    return connection.execute(select(func.coalesce(func.max(schema_version.c.version), 0))).scalar()
+
+
+def run_migrations(connection):
+    """
+    Применить к базе данных недостающие миграции.
+
+    Args:
+        connection: Синхронное соединение SQLAlchemy внутри транзакции
+            (для асинхронного движка вызывается через run_sync)
+
+    Returns:
+        int: Номер версии схемы после применения миграций
+    """
+    current_version = get_schema_version(connection)
+
+    for version, description, migrate in MIGRATIONS:
+        if version <= current_version:
+            continue
+        migrate(connection)
+        connection.execute(insert(schema_version).values(
+            version=version,
+            description=description,
+            applied_at=datetime.now()
+        ))
+        current_version = version
+        print(f"Применена миграция {version}: {description}")
+
+    return current_version
+
+
+def main():
+    engine = create_sync_engine(DATABASE_URL)
+    with engine.begin() as connection:
+        Base.metadata.create_all(connection)
+        version = run_migrations(connection)
+    engine.dispose()
+    print(f"Версия схемы базы данных: {version}")
+
+
+if __name__ == '__main__':
+    main()
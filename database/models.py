@@ -1,12 +1,9 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text, create_engine
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from datetime import datetime
 
-from config.config import DATABASE_URL
-
 Base = declarative_base()
-engine = create_engine(DATABASE_URL)
 
 class User(Base):
     """Модель пользователя."""
@@ -24,6 +21,7 @@ class User(Base):
     # Отношения
     orders = relationship("Order", back_populates="user", cascade="all, delete-orphan")
     cart_items = relationship("CartItem", back_populates="user", cascade="all, delete-orphan")
+    cart_summary = relationship("CartSummary", back_populates="user", uselist=False, cascade="all, delete-orphan")
     
     def __repr__(self):
         return f"<User(id={self.id}, user_id={self.user_id}, username={self.username})>"
@@ -37,7 +35,8 @@ class Product(Base):
     marketplace = Column(String(50), nullable=False)  # ozon, wildberries, yandex_market
     external_id = Column(String(100))
     title = Column(String(255), nullable=False)
-    description = Column(Text)
+    # Описание может быть большим и загружается только при обращении к нему
+    description = deferred(Column(Text))
     price = Column(Float, nullable=False)
     currency = Column(String(10), default="RUB")
     image_url = Column(String(500))
@@ -49,6 +48,11 @@ class Product(Base):
     cart_items = relationship("CartItem", back_populates="product", cascade="all, delete-orphan")
     order_items = relationship("OrderItem", back_populates="product", cascade="all, delete-orphan")
     
+    # Каталог товаров: один товар маркетплейса - одна запись
+    __table_args__ = (
+        Index('ix_products_marketplace_external_id', 'marketplace', 'external_id', unique=True),
+    )
+    
     def __repr__(self):
         return f"<Product(id={self.id}, title={self.title}, price={self.price})>"
 
@@ -70,10 +74,41 @@ class CartItem(Base):
     user = relationship("User", back_populates="cart_items")
     product = relationship("Product", back_populates="cart_items")
     
+    __table_args__ = (
+        # Поиск позиции корзины в add_to_cart и вывод корзины пользователя
+        Index('ix_cart_items_user_product', 'user_id', 'product_id', 'size', 'color'),
+        # Каскадное удаление позиций при удалении товара
+        Index('ix_cart_items_product_id', 'product_id'),
+    )
+    
     def __repr__(self):
         return f"<CartItem(id={self.id}, user_id={self.user_id}, product_id={self.product_id}, quantity={self.quantity})>"
 
 
+class CartSummary(Base):
+    """
+    Сводка корзины пользователя.
+    
+    Хранит количество позиций, общее количество товаров и сумму корзины,
+    чтобы заголовки и итоги показывались чтением одной строки по
+    первичному ключу. Пересчитывается в той же транзакции, что и
+    изменение корзины.
+    """
+    __tablename__ = 'cart_summaries'
+
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    items_count = Column(Integer, nullable=False, default=0)
+    total_quantity = Column(Integer, nullable=False, default=0)
+    total_amount = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    # Отношения
+    user = relationship("User", back_populates="cart_summary")
+    
+    def __repr__(self):
+        return f"<CartSummary(user_id={self.user_id}, items_count={self.items_count}, total_amount={self.total_amount})>"
+
+
 class Order(Base):
     """Модель заказа."""
     __tablename__ = 'orders'
@@ -92,6 +127,11 @@ class Order(Base):
     user = relationship("User", back_populates="orders")
     items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
     
+    __table_args__ = (
+        # История заказов пользователя, отсортированная по дате создания
+        Index('ix_orders_user_created', 'user_id', 'created_at', 'id'),
+    )
+    
     def __repr__(self):
         return f"<Order(id={self.id}, user_id={self.user_id}, status={self.status})>"
 
@@ -105,6 +145,8 @@ class OrderItem(Base):
     product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
     quantity = Column(Integer, default=1)
     price = Column(Float, nullable=False)
+    # Название товара на момент заказа (карточка каталога обновляется при повторной вставке ссылки)
+    title = Column(String(255))
     size = Column(String(20))
     color = Column(String(30))
 
@@ -112,10 +154,11 @@ class OrderItem(Base):
     order = relationship("Order", back_populates="items")
     product = relationship("Product", back_populates="order_items")
     
+    __table_args__ = (
+        Index('ix_order_items_order_id', 'order_id'),
+        Index('ix_order_items_product_id', 'product_id'),
+    )
+    
     def __repr__(self):
         return f"<OrderItem(id={self.id}, order_id={self.order_id}, product_id={self.product_id}, quantity={self.quantity})>"
 
-
-def init_db():
-    """Инициализация базы данных."""
-    Base.metadata.create_all(engine) 
\ No newline at end of file
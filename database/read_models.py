@@ -0,0 +1,74 @@
+"""
+Модели чтения для обработчиков.
+
+Функции чтения database.database выбирают только нужные столбцы и
+возвращают неизменяемые именованные кортежи вместо ORM-объектов: такие
+объекты не попадают в identity map сессии, занимают меньше памяти и не
+могут случайно выполнить ленивую загрузку после закрытия сессии.
+Описание товара (description) в них не входит.
+"""
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from sqlalchemy import func
+
+from database.models import User, Product, Order, OrderItem
+
+
+class UserRow(NamedTuple):
+    """Пользователь."""
+    id: int
+    user_id: int
+    username: Optional[str]
+    first_name: Optional[str]
+    last_name: Optional[str]
+    phone: Optional[str]
+
+
+class ProductRow(NamedTuple):
+    """Товар без описания."""
+    id: int
+    marketplace: str
+    title: str
+    price: float
+    url: Optional[str]
+
+
+class CartItemRow(NamedTuple):
+    """Позиция корзины с товаром."""
+    id: int
+    product: ProductRow
+    quantity: int
+    size: Optional[str]
+    color: Optional[str]
+
+
+class OrderRow(NamedTuple):
+    """Заказ без позиций."""
+    id: int
+    status: str
+    total_amount: float
+    payment_method: Optional[str]
+    delivery_address: str
+    created_at: datetime
+
+
+class OrderItemRow(NamedTuple):
+    """Позиция заказа с товаром."""
+    product: ProductRow
+    quantity: int
+    price: float
+    size: Optional[str]
+    color: Optional[str]
+
+
+# Столбцы, из которых собираются модели чтения (в порядке полей)
+USER_COLUMNS = (User.id, User.user_id, User.username, User.first_name, User.last_name, User.phone)
+PRODUCT_COLUMNS = (Product.id, Product.marketplace, Product.title, Product.price, Product.url)
+ORDER_COLUMNS = (
+    Order.id, Order.status, Order.total_amount, Order.payment_method, Order.delivery_address, Order.created_at
+)
+# Товар позиции заказа: название и цена на момент заказа
+ORDER_PRODUCT_COLUMNS = (
+    Product.id, Product.marketplace, func.coalesce(OrderItem.title, Product.title), OrderItem.price, Product.url
+)
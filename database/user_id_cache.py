@@ -0,0 +1,74 @@
+"""
+Кэш соответствия Telegram ID пользователя и его ID в базе данных.
+
+Почти каждая функция работы с корзиной и заказами сначала находит запись
+пользователя по Telegram ID, хотя это соответствие не меняется. Кэш
+хранит его в памяти процесса, и повторные обращения обходятся без
+отдельного запроса к базе. Сохраняются только найденные пользователи:
+отсутствие записи не кэшируется, потому что пользователь может быть
+создан позже.
+"""
+from collections import OrderedDict
+
+
+class UserIdCache:
+    """Ограниченный по размеру кэш Telegram ID -> users.id с вытеснением давно неиспользуемых записей (LRU)."""
+
+    def __init__(self, max_entries=10000):
+        """
+        Args:
+            max_entries: Максимальное количество записей
+        """
+        self.max_entries = max_entries
+
+        # Структура: {telegram_id: users.id}
+        self._entries = OrderedDict()
+
+        # Счетчики
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, telegram_id):
+        """
+        Получить ID пользователя в базе данных.
+
+        Returns:
+            int или None, если записи нет в кэше
+        """
+        db_id = self._entries.get(telegram_id)
+        if db_id is None:
+            self.misses += 1
+            return None
+
+        # Отмечаем запись как недавно использованную
+        self._entries.move_to_end(telegram_id)
+        self.hits += 1
+        return db_id
+
+    def set(self, telegram_id, db_id):
+        """Сохранить ID пользователя в базе данных."""
+        self._entries[telegram_id] = db_id
+        self._entries.move_to_end(telegram_id)
+
+        # Вытесняем самые старые записи при превышении лимита
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, telegram_id):
+        """Удалить запись из кэша."""
+        self._entries.pop(telegram_id, None)
+
+    def clear(self):
+        """Очистить кэш."""
+        self._entries.clear()
+
+    def stats(self):
+        """Получить статистику кэша."""
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
@@ -19,6 +19,8 @@ def register_all_handlers(dp: Dispatcher):
         dp: Экземпляр диспетчера бота
     """
     # Порядок регистрации имеет значение!
+    # Обработчики кнопок регистрируются в маршрутизаторе handlers/router.py,
+    # который сохраняет этот порядок при выборе обработчика
     
     # Сначала регистрируем общие обработчики
     register_common_handlers(dp)
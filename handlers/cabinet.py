@@ -1,13 +1,19 @@
+from datetime import datetime
+
 from aiogram import types
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters.state import State, StatesGroup
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
-from database.database import get_user, get_orders, get_order
+from database.database import get_user, get_orders_page, count_orders, get_order
 from keyboards.keyboards import get_cabinet_menu, get_main_menu, get_back_menu, get_user_orders_menu, get_payment_methods
 from keyboards.fallback import save_navigation_state, reset_navigation_history
+from handlers.router import get_callback_router
 from config.config import DEFAULT_DELIVERY_ADDRESS
 
+# Количество заказов на странице истории
+ORDERS_PER_PAGE = 5
+
 # Создаем класс состояний для пагинации
 class OrderHistoryStates(StatesGroup):
     viewing_history = State()
@@ -52,7 +58,7 @@ async def process_profile(callback_query: types.CallbackQuery):
     user_id = callback_query.from_user.id
     await save_navigation_state(user_id, 'profile')
     
-    user = get_user(user_id)
+    user = await get_user(user_id)
     
     if user:
         profile_text = (
@@ -77,19 +83,35 @@ async def process_order_history(callback_query: types.CallbackQuery, state: FSMC
     user_id = callback_query.from_user.id
     await save_navigation_state(user_id, 'order_history')
     
-    # Извлекаем номер страницы из callback_data, если он есть
-    page = 1
-    if '_' in callback_query.data:
-        try:
-            # Формат: order_history_page_X
-            parts = callback_query.data.split('_')
-            if len(parts) >= 4 and parts[0] == 'order' and parts[1] == 'history' and parts[2] == 'page':
-                page = int(parts[3])
-        except (ValueError, IndexError):
-            page = 1
-    
+    await show_order_history_page(callback_query, state, page=1)
+
+def get_order_key(order):
+    """Курсор постраничной выборки заказов: (created_at, id) в виде, пригодном для хранения в состоянии."""
+    return [order.created_at.isoformat(), order.id]
+
+def parse_order_key(order_key):
+    created_at, order_id = order_key
+    return datetime.fromisoformat(created_at), order_id
+
+async def show_order_history_page(callback_query: types.CallbackQuery, state: FSMContext, page, after=None, before=None):
+    """
+    Показать страницу истории заказов.
+    
+    Args:
+        page: Номер страницы (для заголовка)
+        after: Курсор последнего заказа предыдущей страницы
+        before: Курсор первого заказа следующей страницы
+    """
     user_id = callback_query.from_user.id
-    orders = get_orders(user_id)
+    
+    # Загружаем из базы только заказы текущей страницы
+    orders_page = await get_orders_page(user_id, ORDERS_PER_PAGE, after=after, before=before)
+    orders = orders_page['orders']
+    
+    # Соседняя страница оказалась пустой (заказы были удалены) - начинаем с первой страницы
+    if not orders and (after is not None or before is not None):
+        await show_order_history_page(callback_query, state, page=1)
+        return
     
     if not orders:
         await callback_query.message.edit_text(
@@ -100,29 +122,17 @@ async def process_order_history(callback_query: types.CallbackQuery, state: FSMC
         )
         return
     
-    # Количество заказов на странице
-    items_per_page = 5
-    
     # Вычисляем общее количество страниц
-    total_pages = (len(orders) + items_per_page - 1) // items_per_page
-    
-    # Проверяем валидность номера страницы
-    if page < 1:
+    total_orders = await count_orders(user_id)
+    total_pages = (total_orders + ORDERS_PER_PAGE - 1) // ORDERS_PER_PAGE
+    if not orders_page['has_prev']:
         page = 1
-    elif page > total_pages:
-        page = total_pages
-    
-    # Определяем диапазон заказов для текущей страницы
-    start_idx = (page - 1) * items_per_page
-    end_idx = min(start_idx + items_per_page, len(orders))
-    
-    # Получаем заказы для текущей страницы
-    current_page_orders = orders[start_idx:end_idx]
+    page = min(page, total_pages)
     
     # Формируем текст истории заказов
     history_text = f"📋 <b>История заказов</b> (страница {page}/{total_pages})\n\n"
     
-    for order in current_page_orders:
+    for order in orders:
         try:
             order_id = order.id
             order_date = order.created_at.strftime('%d.%m.%Y %H:%M')
@@ -162,10 +172,12 @@ async def process_order_history(callback_query: types.CallbackQuery, state: FSMC
             print(f"Ошибка при обработке заказа: {e}")
             # Пропускаем этот заказ в случае ошибки
     
-    # Сохраняем информацию о пагинации в состоянии
+    # Сохраняем информацию о пагинации в состоянии: номер страницы и границы страницы
     await state.update_data(
         total_pages=total_pages,
-        current_page=page
+        current_page=page,
+        first_order_key=get_order_key(orders[0]),
+        last_order_key=get_order_key(orders[-1])
     )
     
     # Устанавливаем состояние просмотра истории
@@ -174,23 +186,23 @@ async def process_order_history(callback_query: types.CallbackQuery, state: FSMC
     # Создаем клавиатуру только с кнопками навигации
     keyboard = InlineKeyboardMarkup(row_width=2)
     
-    # Добавляем кнопки пагинации, если всего страниц больше одной
-    if total_pages > 1:
-        nav_buttons = []
-        
-        # Кнопка "Предыдущая страница"
-        if page > 1:
-            nav_buttons.append(
-                InlineKeyboardButton("◀️ Назад", callback_data="prev_page")
-            )
-        
-        # Кнопка "Следующая страница"
-        if page < total_pages:
-            nav_buttons.append(
-                InlineKeyboardButton("Вперед ▶️", callback_data="next_page")
-            )
-        
-        # Добавляем кнопки навигации в клавиатуру
+    # Добавляем кнопки пагинации, если есть соседние страницы
+    nav_buttons = []
+    
+    # Кнопка "Предыдущая страница"
+    if orders_page['has_prev']:
+        nav_buttons.append(
+            InlineKeyboardButton("◀️ Назад", callback_data="prev_page")
+        )
+    
+    # Кнопка "Следующая страница"
+    if orders_page['has_next']:
+        nav_buttons.append(
+            InlineKeyboardButton("Вперед ▶️", callback_data="next_page")
+        )
+    
+    # Добавляем кнопки навигации в клавиатуру
+    if nav_buttons:
         keyboard.row(*nav_buttons)
     
     # Добавляем кнопки "Назад" и "Главное меню"
@@ -207,23 +219,25 @@ async def process_order_history(callback_query: types.CallbackQuery, state: FSMC
 
 async def process_order_history_navigation(callback_query: types.CallbackQuery, state: FSMContext):
     """Обработчик навигации по страницам истории заказов."""
+    await callback_query.answer()
+    
     # Получаем информацию о пагинации из состояния
     data = await state.get_data()
     current_page = data.get('current_page', 1)
-    total_pages = data.get('total_pages', 1)
+    first_order_key = data.get('first_order_key')
+    last_order_key = data.get('last_order_key')
     
-    # Определяем направление навигации
-    if callback_query.data == 'prev_page':
-        page = max(1, current_page - 1)
-    elif callback_query.data == 'next_page':
-        page = min(total_pages, current_page + 1)
+    # Определяем направление навигации и продолжаем выборку от границы текущей страницы
+    if callback_query.data == 'prev_page' and first_order_key:
+        await show_order_history_page(
+            callback_query, state, current_page - 1, before=parse_order_key(first_order_key)
+        )
+    elif callback_query.data == 'next_page' and last_order_key:
+        await show_order_history_page(
+            callback_query, state, current_page + 1, after=parse_order_key(last_order_key)
+        )
     else:
-        await callback_query.answer("Неизвестная команда навигации")
-        return
-    
-    # Вызываем обработчик истории заказов с новым номером страницы
-    callback_query.data = f"order_history_page_{page}"
-    await process_order_history(callback_query, state)
+        await show_order_history_page(callback_query, state, page=1)
 
 async def process_settings(callback_query: types.CallbackQuery):
     """Обработчик для просмотра настроек (заглушка)."""
@@ -245,15 +259,15 @@ async def process_settings(callback_query: types.CallbackQuery):
         parse_mode='HTML'
     )
 
-async def process_pay_order_from_history(callback_query: types.CallbackQuery, state: FSMContext):
+async def process_pay_order_from_history(callback_query: types.CallbackQuery, state: FSMContext, payload: str):
     """Обработчик для кнопки 'Оплатить заказ' из истории заказов."""
     await callback_query.answer()
     
-    # Получаем ID заказа из callback_data
-    order_id = int(callback_query.data.split('_')[-1])
+    # ID заказа - часть callback_data после префикса
+    order_id = int(payload)
     
     # Получаем информацию о заказе для установки адреса доставки
-    order_info = get_order(order_id)
+    order_info = await get_order(order_id)
     
     if order_info:
         # Сохраняем ID заказа и адрес доставки в состояние
@@ -281,21 +295,16 @@ async def process_pay_order_from_history(callback_query: types.CallbackQuery, st
 
 def register_cabinet_handlers(dp):
     """Регистрация обработчиков для раздела 'Мой кабинет'."""
-    dp.register_callback_query_handler(process_cabinet, lambda c: c.data == "cabinet")
-    dp.register_callback_query_handler(
-        process_order_history, 
-        lambda c: c.data == "order_history" or c.data.startswith("order_history_page_")
-    )
-    dp.register_callback_query_handler(
+    router = get_callback_router(dp)
+    router.register(process_cabinet, "cabinet")
+    router.register(process_order_history, "order_history")
+    router.register(
         process_order_history_navigation,
-        lambda c: c.data in ['prev_page', 'next_page'],
+        'prev_page', 'next_page',
         state=OrderHistoryStates.viewing_history
     )
-    dp.register_callback_query_handler(process_profile, lambda c: c.data == "profile")
-    dp.register_callback_query_handler(process_settings, lambda c: c.data == "settings")
+    router.register(process_profile, "profile")
+    router.register(process_settings, "settings")
     
     # Обработчик для оплаты заказа из истории
-    dp.register_callback_query_handler(
-        process_pay_order_from_history, 
-        lambda c: c.data.startswith("pay_order_")
-    ) 
\ No newline at end of file
+    router.register(process_pay_order_from_history, prefix="pay_order_") 
\ No newline at end of file
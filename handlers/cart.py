@@ -2,10 +2,11 @@ from aiogram import types
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters.state import State, StatesGroup
 
-from database.database import get_cart_items, get_orders, remove_from_cart, create_order, cancel_order, clear_cart
+from database.database import get_cart_items, get_cart_summary, remove_from_cart, create_order, cancel_order, clear_cart
 from config.config import DEFAULT_DELIVERY_ADDRESS
 from keyboards.keyboards import get_cart_menu, get_back_menu, get_payment_methods, get_orders_to_delete, get_confirmation_keyboard, get_main_menu, get_payment_info_keyboard, get_user_orders_menu
 from keyboards.fallback import save_navigation_state, reset_navigation_history
+from handlers.router import get_callback_router
 
 class PaymentStates(StatesGroup):
     """Состояния для оплаты заказов."""
@@ -26,8 +27,19 @@ async def process_cart(callback_query: types.CallbackQuery):
         
         await save_navigation_state(user_id, 'cart')
         
+        # Итоги корзины читаются из сводки одной строкой, без загрузки товаров
+        summary = await get_cart_summary(user_id)
+        if summary['items_count']:
+            summary_text = (
+                f"Товаров в корзине: {summary['total_quantity']} "
+                f"на сумму {summary['total_amount']} ₽\n\n"
+            )
+        else:
+            summary_text = "Ваша корзина пуста.\n\n"
+        
         await callback_query.message.edit_text(
             "🛒 <b>Моя корзина</b>\n\n"
+            f"{summary_text}"
             "В этом разделе вы можете управлять товарами в вашей корзине, "
             "оформлять и оплачивать заказы.",
             reply_markup=get_cart_menu(),
@@ -51,7 +63,9 @@ async def process_my_orders(callback_query: types.CallbackQuery):
     user_id = callback_query.from_user.id
     await save_navigation_state(user_id, 'my_orders')
     
-    cart_items = get_cart_items(user_id)
+    # Пустую корзину определяем по сводке, не загружая товары
+    summary = await get_cart_summary(user_id)
+    cart_items = await get_cart_items(user_id) if summary['items_count'] else []
     
     if not cart_items:
         cart_text = "🛒 <b>Моя корзина</b>\n\nВаша корзина пуста."
@@ -64,20 +78,19 @@ async def process_my_orders(callback_query: types.CallbackQuery):
     
     # Формируем текст о товарах в корзине
     cart_text = "🛒 <b>Товары в корзине</b>\n\n"
-    total_amount = 0
+    total_amount = summary['total_amount']
     
     # Подготовим данные для клавиатуры
     orders_for_keyboard = []
     
     for i, item in enumerate(cart_items, 1):
-        product = item['product']
-        quantity = item['quantity']
-        size = item['size'] or "Не указан"
-        color = item['color'] or "Не указан"
+        product = item.product
+        quantity = item.quantity
+        size = item.size or "Не указан"
+        color = item.color or "Не указан"
         
         # Расчет цены с учетом количества
         item_price = product.price * quantity
-        total_amount += item_price
         
         # Получаем информацию о маркетплейсе
         marketplace_name = {
@@ -96,7 +109,7 @@ async def process_my_orders(callback_query: types.CallbackQuery):
         
         # Добавляем товар для клавиатуры
         orders_for_keyboard.append({
-            'id': item['id'],
+            'id': item.id,
             'total_amount': item_price,
             'status': 'new'  # Все товары в корзине имеют статус 'new'
         })
@@ -121,7 +134,7 @@ async def process_delete_order(callback_query: types.CallbackQuery):
     user_id = callback_query.from_user.id
     await save_navigation_state(user_id, 'delete_order')
     
-    cart_items = get_cart_items(user_id)
+    cart_items = await get_cart_items(user_id)
     
     if not cart_items:
         await callback_query.message.edit_text(
@@ -134,12 +147,12 @@ async def process_delete_order(callback_query: types.CallbackQuery):
     # Преобразуем товары в формат для клавиатуры
     orders_for_keyboard = []
     for item in cart_items:
-        product = item['product']
-        quantity = item['quantity']
+        product = item.product
+        quantity = item.quantity
         price = product.price * quantity
         
         orders_for_keyboard.append({
-            'id': item['id'],  # ID записи в корзине
+            'id': item.id,  # ID записи в корзине
             'total_amount': price
         })
     
@@ -150,12 +163,12 @@ async def process_delete_order(callback_query: types.CallbackQuery):
         parse_mode='HTML'
     )
 
-async def process_remove_order(callback_query: types.CallbackQuery):
+async def process_remove_order(callback_query: types.CallbackQuery, payload: str):
     """Обработчик для подтверждения удаления товара из корзины."""
     await callback_query.answer()
     
-    # Извлекаем ID товара из callback_data
-    cart_item_id = int(callback_query.data.split('_')[-1])
+    # ID товара - часть callback_data после префикса
+    cart_item_id = int(payload)
     
     await callback_query.message.edit_text(
         "🗑️ <b>Подтверждение удаления</b>\n\n"
@@ -164,15 +177,15 @@ async def process_remove_order(callback_query: types.CallbackQuery):
         parse_mode='HTML'
     )
 
-async def process_confirm_remove_cart_item(callback_query: types.CallbackQuery):
+async def process_confirm_remove_cart_item(callback_query: types.CallbackQuery, payload: str):
     """Обработчик для подтверждения удаления товара из корзины."""
     await callback_query.answer()
     
-    # Извлекаем ID товара из callback_data
-    cart_item_id = int(callback_query.data.split('_')[-1])
+    # ID товара - часть callback_data после префикса
+    cart_item_id = int(payload)
     
     user_id = callback_query.from_user.id
-    success = remove_from_cart(user_id, cart_item_id)
+    success = await remove_from_cart(user_id, cart_item_id)
     
     if success:
         await callback_query.message.edit_text(
@@ -196,7 +209,9 @@ async def process_pay_orders(callback_query: types.CallbackQuery, state: FSMCont
     user_id = callback_query.from_user.id
     await save_navigation_state(user_id, 'payment')
     
-    cart_items = get_cart_items(user_id)
+    # Пустую корзину определяем по сводке, не загружая товары
+    summary = await get_cart_summary(user_id)
+    cart_items = await get_cart_items(user_id) if summary['items_count'] else []
     
     if not cart_items:
         await callback_query.message.edit_text(
@@ -206,19 +221,18 @@ async def process_pay_orders(callback_query: types.CallbackQuery, state: FSMCont
         )
         return
     
-    # Рассчитываем общую стоимость всех товаров в корзине
-    total_amount = 0
+    # Общая стоимость всех товаров в корзине берется из сводки
+    total_amount = summary['total_amount']
     items_text = ""
     
     for i, item in enumerate(cart_items, 1):
-        product = item['product']
-        quantity = item['quantity']
-        size = item['size'] or "Не указан"
-        color = item['color'] or "Не указан"
+        product = item.product
+        quantity = item.quantity
+        size = item.size or "Не указан"
+        color = item.color or "Не указан"
         
         # Расчет цены с учетом количества
         item_price = product.price * quantity
-        total_amount += item_price
         
         # Получаем информацию о маркетплейсе
         marketplace_name = {
@@ -236,8 +250,8 @@ async def process_pay_orders(callback_query: types.CallbackQuery, state: FSMCont
         )
     
     # Сохраняем данные о заказе в состояние
+    # Позиции корзины не сохраняются: заказ создается из корзины в базе данных
     await state.update_data(
-        cart_items=cart_items,
         total_amount=total_amount,
         delivery_address=DEFAULT_DELIVERY_ADDRESS,  # Гарантируем, что адрес всегда установлен
         is_combined_order=True  # Флаг, указывающий, что это объединенный заказ
@@ -275,7 +289,7 @@ async def process_payment_method(callback_query: types.CallbackQuery, state: FSM
     
     # Создаем заказ
     user_id = callback_query.from_user.id
-    order_id = create_order(
+    order_id = await create_order(
         user_id=user_id,
         delivery_address=delivery_address,
         payment_method=payment_method
@@ -329,12 +343,12 @@ async def process_payment_method(callback_query: types.CallbackQuery, state: FSM
     # Завершаем состояние
     await state.finish()
 
-async def process_paid_order(callback_query: types.CallbackQuery):
+async def process_paid_order(callback_query: types.CallbackQuery, payload: str):
     """Обработчик для кнопки 'Оплатил'."""
     await callback_query.answer()
     
-    # Получаем ID заказа из callback_data
-    order_id = int(callback_query.data.split('_')[-1])
+    # ID заказа - часть callback_data после префикса
+    order_id = int(payload)
     
     # Получаем данные пользователя
     user_id = callback_query.from_user.id
@@ -342,7 +356,7 @@ async def process_paid_order(callback_query: types.CallbackQuery):
     
     # Получаем данные заказа - используем user_id из Telegram, а не из БД
     from database.database import get_order_details, update_order_status
-    order_data = get_order_details(user_id, order_id)
+    order_data = await get_order_details(user_id, order_id)
     
     if not order_data:
         print(f"Ошибка: Не удалось найти информацию о заказе {order_id} для пользователя {user_id}")
@@ -355,7 +369,7 @@ async def process_paid_order(callback_query: types.CallbackQuery):
         return
     
     # Обновляем статус заказа на "paid"
-    success = update_order_status(order_id, "paid")
+    success = await update_order_status(order_id, "paid")
     if not success:
         print(f"Ошибка: Не удалось обновить статус заказа {order_id}")
         
@@ -422,7 +436,7 @@ async def process_confirm_remove_all_cart_items(callback_query: types.CallbackQu
         await callback_query.answer()
         
         user_id = callback_query.from_user.id
-        success = clear_cart(user_id)
+        success = await clear_cart(user_id)
         
         if success:
             await callback_query.message.edit_text(
@@ -449,30 +463,19 @@ async def process_confirm_remove_all_cart_items(callback_query: types.CallbackQu
 
 def register_cart_handlers(dp):
     """Регистрация обработчиков раздела 'Моя корзина'."""
-    dp.register_callback_query_handler(process_cart, lambda c: c.data == "cart")
-    dp.register_callback_query_handler(process_my_orders, lambda c: c.data == "my_orders")
-    dp.register_callback_query_handler(process_delete_order, lambda c: c.data == "delete_order")
-    dp.register_callback_query_handler(
-        process_remove_order,
-        lambda c: c.data.startswith("remove_order_")
-    )
-    dp.register_callback_query_handler(
-        process_confirm_remove_cart_item,
-        lambda c: c.data.startswith("confirm_remove_cart_item_")
-    )
-    dp.register_callback_query_handler(process_pay_orders, lambda c: c.data == "pay_orders")
-    dp.register_callback_query_handler(
+    router = get_callback_router(dp)
+    router.register(process_cart, "cart")
+    router.register(process_my_orders, "my_orders")
+    router.register(process_delete_order, "delete_order")
+    router.register(process_remove_order, prefix="remove_order_")
+    router.register(process_confirm_remove_cart_item, prefix="confirm_remove_cart_item_")
+    router.register(process_pay_orders, "pay_orders")
+    router.register(
         process_payment_method,
-        lambda c: c.data in ["pay_mir", "pay_visa_mc"],
+        "pay_mir", "pay_visa_mc",
         state=PaymentStates.waiting_for_payment_method
     )
-    dp.register_callback_query_handler(
-        process_paid_order,
-        lambda c: c.data.startswith("paid_order_")
-    )
-    dp.register_callback_query_handler(process_cancel_action, lambda c: c.data == "cancel_action")
-    dp.register_callback_query_handler(process_remove_all_orders, lambda c: c.data == "remove_all_orders")
-    dp.register_callback_query_handler(
-        process_confirm_remove_all_cart_items,
-        lambda c: c.data == "confirm_remove_all_cart_items_0"
-    ) 
\ No newline at end of file
+    router.register(process_paid_order, prefix="paid_order_")
+    router.register(process_cancel_action, "cancel_action")
+    router.register(process_remove_all_orders, "remove_all_orders")
+    router.register(process_confirm_remove_all_cart_items, "confirm_remove_all_cart_items_0") 
\ No newline at end of file
@@ -24,11 +24,11 @@ async def cmd_start(message: types.Message, state: FSMContext):
     last_name = message.from_user.last_name
     
     # Проверяем, существует ли пользователь
-    user = get_user(user_id)
+    user = await get_user(user_id)
     
     if not user:
         # Пользователь не существует, создаем и запрашиваем имя
-        create_user(user_id, username, first_name, last_name)
+        await create_user(user_id, username, first_name, last_name)
         
         await message.answer(
             f"Добро пожаловать в бот-маркетплейс! 👋\n\n"
@@ -78,7 +78,7 @@ async def process_name(message: types.Message, state: FSMContext):
     name = message.text
     
     # Обновляем имя пользователя
-    update_user(user_id, first_name=name)
+    await update_user(user_id, first_name=name)
     
     # Завершаем состояние регистрации
     await state.finish()
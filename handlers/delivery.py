@@ -4,6 +4,7 @@ from aiogram.dispatcher import FSMContext
 from config.config import DEFAULT_DELIVERY_ADDRESS
 from keyboards.keyboards import get_delivery_menu, get_back_menu, get_main_menu
 from keyboards.fallback import save_navigation_state, reset_navigation_history
+from handlers.router import get_callback_router
 
 async def process_delivery(callback_query: types.CallbackQuery):
     """Обработчик для перехода в раздел 'Доставка'."""
@@ -58,5 +59,6 @@ async def process_show_address(callback_query: types.CallbackQuery):
 
 def register_delivery_handlers(dp):
     """Регистрация обработчиков раздела 'Доставка'."""
-    dp.register_callback_query_handler(process_delivery, lambda c: c.data == "delivery")
-    dp.register_callback_query_handler(process_show_address, lambda c: c.data == "show_address") 
\ No newline at end of file
+    router = get_callback_router(dp)
+    router.register(process_delivery, "delivery")
+    router.register(process_show_address, "show_address") 
\ No newline at end of file
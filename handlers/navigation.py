@@ -2,7 +2,8 @@ from aiogram import types
 from aiogram.dispatcher import FSMContext
 
 from keyboards.keyboards import get_main_menu
-from keyboards.fallback import register_fallback_handlers
+from keyboards.fallback import register_fallback_handlers, reset_navigation_history
+from handlers.router import get_callback_router
 
 async def process_main_menu(callback_query: types.CallbackQuery, state: FSMContext):
     """Обработчик для возврата в главное меню."""
@@ -15,10 +16,7 @@ async def process_main_menu(callback_query: types.CallbackQuery, state: FSMConte
             await state.finish()
         
         # Сбрасываем историю навигации
-        from keyboards.fallback import user_navigation_history
-        user_id = callback_query.from_user.id
-        if user_id in user_navigation_history:
-            user_navigation_history[user_id] = []
+        reset_navigation_history(callback_query.from_user.id)
         
         await callback_query.message.edit_text(
             "Выберите, что хотите сделать:\n"
@@ -47,11 +45,7 @@ async def process_main_menu(callback_query: types.CallbackQuery, state: FSMConte
 def register_navigation_handlers(dp):
     """Регистрация обработчиков навигации."""
     # Обработчик для кнопки главного меню
-    dp.register_callback_query_handler(
-        process_main_menu,
-        lambda c: c.data == "main_menu",
-        state="*"
-    )
+    get_callback_router(dp).register(process_main_menu, "main_menu", state="*")
     
     # Регистрируем обработчики из модуля fallback
     register_fallback_handlers(dp)
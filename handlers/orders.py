@@ -2,19 +2,26 @@ from aiogram import types
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters.state import State, StatesGroup
 import re
+import copy
 import asyncio
+import logging
 
 from database.database import create_product_from_url, add_to_cart, get_user
-from utils.marketplace_parser import parse_product_from_url, is_valid_marketplace_url
+from utils.marketplace_parser import is_valid_marketplace_url, get_external_id
+from utils.parse_queue import parse_queue, ERROR_TIMEOUT
+from handlers.router import get_callback_router
 from keyboards.keyboards import (
     get_main_menu, get_back_menu, get_quantity_keyboard, get_size_keyboard, 
     get_color_keyboard, get_skip_size_keyboard, get_skip_color_keyboard,
     get_notes_keyboard
 )
 
+logger = logging.getLogger(__name__)
+
 class OrderStates(StatesGroup):
     """Состояния для оформления заказа."""
     waiting_for_url = State()
+    waiting_for_product = State()
     waiting_for_quantity = State()
     waiting_for_size = State()
     waiting_for_color = State()
@@ -74,177 +81,275 @@ async def process_product_url(message: types.Message, state: FSMContext):
         # Отправляем сообщение о процессе парсинга
         wait_message = await message.answer("⏳ Получаем информацию о товаре...")
         
+        # Ожидаемый товар определяется по сообщению об ожидании. Состояние сохраняется
+        # до постановки задачи: задача, выполненная из кэша, может завершиться сразу
+        await state.update_data(product_url=url, product_wait_message_id=wait_message.message_id)
+        await OrderStates.waiting_for_product.set()
+        
+        # Ставим задачу в очередь парсинга; когда она будет выполнена,
+        # сообщение об ожидании изменит finish_product_job
+        await parse_queue.enqueue(
+            url,
+            chat_id=message.chat.id,
+            user_id=message.from_user.id,
+            message_id=wait_message.message_id
+        )
+    except Exception as e:
+        # Обработка других исключений
+        print(f"Ошибка при обработке URL товара: {str(e)}")
+        await message.answer(
+            "❌ Произошла ошибка при обработке URL товара. "
+            "Пожалуйста, попробуйте позже или используйте другую ссылку.",
+            reply_markup=get_main_menu()
+        )
+        await state.finish()
+
+async def replace_wait_message(bot, subscriber, text, **kwargs):
+    """Заменить текст сообщения об ожидании (или отправить новое сообщение, если изменить не удалось)."""
+    try:
+        await bot.edit_message_text(
+            text,
+            chat_id=subscriber.chat_id,
+            message_id=subscriber.message_id,
+            **kwargs
+        )
+    except Exception as e:
+        logger.warning("Не удалось изменить сообщение об ожидании: %s", e)
+        await bot.send_message(subscriber.chat_id, text, **kwargs)
+
+async def delete_wait_message(bot, subscriber):
+    """Удалить сообщение об ожидании."""
+    try:
+        await bot.delete_message(subscriber.chat_id, subscriber.message_id)
+    except Exception as e:
+        logger.warning("Не удалось удалить сообщение об ожидании: %s", e)
+
+async def finish_product_job(dp, job, subscriber):
+    """
+    Показать пользователю результат задачи парсинга.
+    
+    Вызывается очередью парсинга для каждого пользователя, приславшего ссылку
+    на товар, и продолжает оформление заказа с выбора количества.
+    """
+    bot = dp.bot
+    state = dp.current_state(chat=subscriber.chat_id, user=subscriber.user_id)
+    current_state = await state.get_state()
+    data = await state.get_data()
+    
+    # Проверяем, что пользователь все еще ждет именно этот товар. Если состояние
+    # потеряно при перезапуске бота, результат все равно показываем
+    waiting = (
+        current_state == OrderStates.waiting_for_product.state
+        and data.get('product_wait_message_id') == subscriber.message_id
+    )
+    if not waiting and not (subscriber.recovered and current_state is None):
+        await delete_wait_message(bot, subscriber)
+        return
+    
+    try:
+        await show_product_job_result(bot, state, job, subscriber)
+    except Exception as e:
+        # Без ответа пользователь остался бы в ожидании товара
+        logger.exception("Ошибка при отправке результата парсинга пользователю %s: %s", subscriber.user_id, e)
         try:
-            # Получаем информацию о товаре по URL с таймаутом
-            product_info = parse_product_from_url(url)
-            
-            # Удаляем сообщение о ожидании
-            await wait_message.delete()
-            
-            if not product_info:
-                await message.answer(
-                    "❌ Не удалось получить информацию о товаре. "
-                    "Пожалуйста, проверьте ссылку и попробуйте снова.",
-                    reply_markup=get_main_menu()
-                )
-                # Сбрасываем состояние
-                await state.finish()
-                return
-            
-            # Проверяем наличие ошибки (добавлено для обработки капчи и других ошибок)
-            if product_info.get('error', False) or product_info.get('price', 0.0) == 0.0:
-                # Формируем тип ошибки в зависимости от наличия описания капчи
-                if "капча" in product_info.get('description', '').lower() or "captcha" in product_info.get('description', '').lower():
-                    error_text = "❌ Товар не найден. Пожалуйста, попробуйте еще раз...."
-                else:
-                    error_text = f"❌ Не удалось получить корректную информацию о товаре. {product_info.get('description', 'Пожалуйста, проверьте ссылку и попробуйте снова.')}"
-                    
-                await message.answer(
-                    error_text,
-                    reply_markup=get_main_menu()
-                )
-                # Сбрасываем состояние, чтобы бот не ждал повторного ввода URL
-                await state.finish()
-                return
-        except asyncio.TimeoutError:
-            # В случае таймаута при парсинге
-            await wait_message.delete()
-            await message.answer(
-                "⌛ Превышено время ожидания при получении информации о товаре. "
-                "Пожалуйста, попробуйте позже или используйте другую ссылку.",
-                reply_markup=get_main_menu()
-            )
-            await state.finish()
-            return
-        except Exception as e:
-            # Обработка других исключений
-            print(f"Ошибка при парсинге товара: {str(e)}")
-            await wait_message.delete()
-            await message.answer(
+            await replace_wait_message(
+                bot,
+                subscriber,
                 "❌ Произошла ошибка при обработке товара. "
                 "Пожалуйста, попробуйте позже или используйте другую ссылку.",
                 reply_markup=get_main_menu()
             )
-            await state.finish()
-            return
-        
-        # Сохраняем информацию о товаре в состояние
-        await state.update_data(
-            product_url=url,
-            product_info=product_info
+        except Exception as e:
+            logger.error("Не удалось сообщить пользователю %s об ошибке: %s", subscriber.user_id, e)
+        await state.finish()
+
+async def show_product_job_result(bot, state, job, subscriber):
+    """Показать информацию о товаре из задачи парсинга и перейти к выбору количества."""
+    url = subscriber.url
+    product_info = copy.deepcopy(job.result)
+    if product_info and 'url' in product_info:
+        product_info['url'] = url
+    
+    if job.error == ERROR_TIMEOUT:
+        # В случае таймаута при парсинге
+        await replace_wait_message(
+            bot,
+            subscriber,
+            "⌛ Превышено время ожидания при получении информации о товаре. "
+            "Пожалуйста, попробуйте позже или используйте другую ссылку.",
+            reply_markup=get_main_menu()
         )
-        
-        # Создаем товар в базе данных
-        product_id = create_product_from_url(
-            url=url,
-            marketplace=product_info['marketplace'],
-            title=product_info['title'],
-            price=product_info['price'],
-            description=product_info.get('description'),
-            image_url=product_info.get('image_url')
+        await state.finish()
+        return
+    
+    if job.error is not None:
+        # Обработка других исключений
+        await replace_wait_message(
+            bot,
+            subscriber,
+            "❌ Произошла ошибка при обработке товара. "
+            "Пожалуйста, попробуйте позже или используйте другую ссылку.",
+            reply_markup=get_main_menu()
         )
-        
-        # Сохраняем ID товара в состояние
-        await state.update_data(product_id=product_id)
-        
-        # Формируем текст о товаре
-        marketplace_name = {
-            'wildberries': 'Wildberries',
-            'ozon': 'Ozon',
-            'yandex_market': 'Яндекс.Маркет'
-        }.get(product_info['marketplace'], product_info['marketplace'])
-        
-        product_text = (
-            f"✅ <b>Товар найден</b>\n\n"
-            f"<b>{product_info['title']}</b>\n"
-            f"Маркетплейс: {marketplace_name}\n"
-            f"Цена: {product_info['price']} ₽\n\n"
+        await state.finish()
+        return
+    
+    if not product_info:
+        await replace_wait_message(
+            bot,
+            subscriber,
+            "❌ Не удалось получить информацию о товаре. "
+            "Пожалуйста, проверьте ссылку и попробуйте снова.",
+            reply_markup=get_main_menu()
         )
-        
-        # Добавляем информацию о доступных размерах, если есть
-        if 'available_sizes' in product_info and product_info['available_sizes']:
-            size_text = "📏 <b>Доступные размеры:</b>\n"
-            for size in product_info['available_sizes'][:5]:  # Ограничиваем количество отображаемых размеров
-                if isinstance(size, dict):
-                    size_name = size.get('name', '')
-                    orig_name = size.get('origName', '')
-                    size_display = f"{size_name}" if not orig_name else f"{size_name} ({orig_name})"
-                    size_text += f"- {size_display}\n"
-                    
-                    # Добавляем информацию о цветах, если есть
-                    if 'colors' in size and size['colors']:
-                        size_text += "  Доступные цвета:\n"
-                        for color in size['colors'][:3]:  # Ограничиваем количество отображаемых цветов
-                            size_text += f"  • {color}\n"
-        
-            # Если размеров больше 5, добавляем информацию об этом
-            if len(product_info['available_sizes']) > 5:
-                size_text += f"...и еще {len(product_info['available_sizes']) - 5} размеров\n"
+        # Сбрасываем состояние
+        await state.finish()
+        return
+    
+    # Проверяем наличие ошибки (добавлено для обработки капчи и других ошибок)
+    if product_info.get('error', False) or product_info.get('price', 0.0) == 0.0:
+        # Формируем тип ошибки в зависимости от наличия описания капчи
+        if "капча" in product_info.get('description', '').lower() or "captcha" in product_info.get('description', '').lower():
+            error_text = "❌ Товар не найден. Пожалуйста, попробуйте еще раз...."
+        else:
+            error_text = f"❌ Не удалось получить корректную информацию о товаре. {product_info.get('description', 'Пожалуйста, проверьте ссылку и попробуйте снова.')}"
             
-            product_text += size_text + "\n"
+        await replace_wait_message(
+            bot,
+            subscriber,
+            error_text,
+            reply_markup=get_main_menu()
+        )
+        # Сбрасываем состояние, чтобы бот не ждал повторного ввода URL
+        await state.finish()
+        return
+    
+    # Сохраняем информацию о товаре в состояние
+    await state.update_data(
+        product_url=url,
+        product_info=product_info
+    )
+    
+    # Добавляем товар в каталог или обновляем уже сохраненный
+    product_id = await create_product_from_url(
+        url=url,
+        marketplace=product_info['marketplace'],
+        title=product_info['title'],
+        price=product_info['price'],
+        description=product_info.get('description'),
+        image_url=product_info.get('image_url'),
+        external_id=get_external_id(url)
+    )
+    
+    # Сохраняем ID товара в состояние
+    await state.update_data(product_id=product_id)
+    
+    # Формируем текст о товаре
+    marketplace_name = {
+        'wildberries': 'Wildberries',
+        'ozon': 'Ozon',
+        'yandex_market': 'Яндекс.Маркет'
+    }.get(product_info['marketplace'], product_info['marketplace'])
+    
+    product_text = (
+        f"✅ <b>Товар найден</b>\n\n"
+        f"<b>{product_info['title']}</b>\n"
+        f"Маркетплейс: {marketplace_name}\n"
+        f"Цена: {product_info['price']} ₽\n\n"
+    )
+    
+    # Добавляем информацию о доступных размерах, если есть
+    if 'available_sizes' in product_info and product_info['available_sizes']:
+        size_text = "📏 <b>Доступные размеры:</b>\n"
+        for size in product_info['available_sizes'][:5]:  # Ограничиваем количество отображаемых размеров
+            if isinstance(size, dict):
+                size_name = size.get('name', '')
+                orig_name = size.get('origName', '')
+                size_display = f"{size_name}" if not orig_name else f"{size_name} ({orig_name})"
+                size_text += f"- {size_display}\n"
+                
+                # Добавляем информацию о цветах, если есть
+                if 'colors' in size and size['colors']:
+                    size_text += "  Доступные цвета:\n"
+                    for color in size['colors'][:3]:  # Ограничиваем количество отображаемых цветов
+                        size_text += f"  • {color}\n"
+    
+        # Если размеров больше 5, добавляем информацию об этом
+        if len(product_info['available_sizes']) > 5:
+            size_text += f"...и еще {len(product_info['available_sizes']) - 5} размеров\n"
         
-        # Проверяем маркетплейс товара
-        if product_info.get('marketplace') == 'wildberries':
-            # Для Wildberries не отправляем изображения
-            await message.answer(
-                product_text,
+        product_text += size_text + "\n"
+    
+    # Проверяем маркетплейс товара
+    if product_info.get('marketplace') == 'wildberries':
+        # Для Wildberries не отправляем изображения
+        await replace_wait_message(
+            bot,
+            subscriber,
+            product_text,
+            parse_mode='HTML'
+        )
+    # Для других маркетплейсов сохраняем прежнюю логику
+    elif product_info.get('image_url'):
+        try:
+            # Добавляем отладочное сообщение перед отправкой изображения
+            print(f"Пытаемся отправить изображение: {product_info['image_url']}")
+            print(f"Тип URL изображения: {type(product_info['image_url'])}")
+            print(f"Длина URL изображения: {len(product_info['image_url']) if product_info['image_url'] else 0}")
+            
+            # Отправляем изображение с текстом вместо сообщения об ожидании
+            await delete_wait_message(bot, subscriber)
+            await bot.send_photo(
+                subscriber.chat_id,
+                photo=product_info['image_url'],
+                caption=product_text,
                 parse_mode='HTML'
             )
-        # Для других маркетплейсов сохраняем прежнюю логику
-        elif product_info.get('image_url'):
-            try:
-                # Добавляем отладочное сообщение перед отправкой изображения
-                print(f"Пытаемся отправить изображение: {product_info['image_url']}")
-                print(f"Тип URL изображения: {type(product_info['image_url'])}")
-                print(f"Длина URL изображения: {len(product_info['image_url']) if product_info['image_url'] else 0}")
-                
-                # Отправляем изображение с текстом
-                await message.answer_photo(
-                    photo=product_info['image_url'],
-                    caption=product_text,
-                    parse_mode='HTML'
-                )
-            except Exception as e:
-                # Если не удалось отправить изображение, отправляем только текст
-                print(f"Ошибка при отправке изображения: {e}")
-                print(f"Детали ошибки: {str(e)}, тип ошибки: {type(e)}")
-                
-                await message.answer(
-                    product_text,
-                    parse_mode='HTML'
-                )
-        else:
-            # Если у товара нет изображения, отправляем только текст
-            await message.answer(
+        except Exception as e:
+            # Если не удалось отправить изображение, отправляем только текст
+            print(f"Ошибка при отправке изображения: {e}")
+            print(f"Детали ошибки: {str(e)}, тип ошибки: {type(e)}")
+            
+            await bot.send_message(
+                subscriber.chat_id,
                 product_text,
                 parse_mode='HTML'
             )
-        
-        # Отдельное сообщение для запроса количества товара с клавиатурой
-        await message.answer(
-            "<b>Укажите количество товара:</b>",
-            reply_markup=get_quantity_keyboard(),
+    else:
+        # Если у товара нет изображения, отправляем только текст
+        await replace_wait_message(
+            bot,
+            subscriber,
+            product_text,
             parse_mode='HTML'
         )
-        
-        # Переходим к следующему этапу - указанию количества
-        await OrderStates.waiting_for_quantity.set()
-    except Exception as e:
-        # Обработка других исключений
-        print(f"Ошибка при обработке URL товара: {str(e)}")
-        await message.answer(
-            "❌ Произошла ошибка при обработке URL товара. "
-            "Пожалуйста, попробуйте позже или используйте другую ссылку.",
-            reply_markup=get_main_menu()
-        )
-        await state.finish()
+    
+    # Отдельное сообщение для запроса количества товара с клавиатурой
+    await bot.send_message(
+        subscriber.chat_id,
+        "<b>Укажите количество товара:</b>",
+        reply_markup=get_quantity_keyboard(),
+        parse_mode='HTML'
+    )
+    
+    # Переходим к следующему этапу - указанию количества
+    await state.set_state(OrderStates.waiting_for_quantity)
 
-async def process_quantity_selection(callback_query: types.CallbackQuery, state: FSMContext):
+async def process_message_while_waiting(message: types.Message, state: FSMContext):
+    """Обработчик сообщений, пока информация о товаре загружается."""
+    # Новая ссылка заменяет ожидаемый товар
+    if re.search(r'https?://\S+', message.text or ''):
+        await process_product_url(message, state)
+        return
+    
+    await message.answer("⏳ Получаем информацию о товаре, пожалуйста, подождите...")
+
+async def process_quantity_selection(callback_query: types.CallbackQuery, state: FSMContext, payload: str):
     """Обработчик для выбора количества товара через inline-клавиатуру."""
     await callback_query.answer()
     
-    # Получаем выбранное количество из callback_data
-    quantity_str = callback_query.data.replace('quantity_', '')
+    # Выбранное количество - часть callback_data после префикса
+    quantity_str = payload
     
     if quantity_str == 'manual':
         # Пользователь выбрал ручной ввод, запрашиваем количество
@@ -343,12 +448,12 @@ async def process_product_quantity(message: types.Message, state: FSMContext):
     # Переходим к следующему этапу - указанию размера
     await OrderStates.waiting_for_size.set()
 
-async def process_size_selection(callback_query: types.CallbackQuery, state: FSMContext):
+async def process_size_selection(callback_query: types.CallbackQuery, state: FSMContext, payload: str):
     """Обработчик для выбора размера товара через inline-клавиатуру."""
     await callback_query.answer()
     
-    # Получаем выбранный размер из callback_data
-    size_str = callback_query.data.replace('size_', '')
+    # Выбранный размер - часть callback_data после префикса
+    size_str = payload
     
     if size_str == 'none':
         # Пользователь выбрал "Не требуется" или "Пропустить"
@@ -422,12 +527,12 @@ async def process_size_selection(callback_query: types.CallbackQuery, state: FSM
     # Переходим к следующему этапу - указанию цвета/примечаний
     await OrderStates.waiting_for_color.set()
 
-async def process_color_selection(callback_query: types.CallbackQuery, state: FSMContext):
+async def process_color_selection(callback_query: types.CallbackQuery, state: FSMContext, payload: str):
     """Обработчик для выбора цвета товара или ввода примечаний через inline-клавиатуру."""
     await callback_query.answer()
     
-    # Получаем выбранное действие из callback_data
-    action_str = callback_query.data.replace('color_', '')
+    # Выбранное действие - часть callback_data после префикса
+    action_str = payload
     
     if action_str == 'none':
         # Пользователь выбрал "Не требуется" или "Пропустить"
@@ -457,7 +562,7 @@ async def add_product_to_cart(message, state, user_id, notes=None):
         size = data.get('size')
         
         # Добавляем товар в корзину
-        success = add_to_cart(user_id, product_id, quantity, size, notes)
+        success = await add_to_cart(user_id, product_id, quantity, size, notes)
         
         if success:
             # Формируем текст о добавлении товара в корзину
@@ -709,33 +814,22 @@ async def process_product_notes(message: types.Message, state: FSMContext):
 
 def register_order_handlers(dp):
     """Регистрация обработчиков для раздела 'Оформить заказ'."""
-    dp.register_callback_query_handler(process_new_order, lambda c: c.data == "new_order")
+    # Результаты парсинга из очереди продолжают оформление заказа
+    parse_queue.on_complete = lambda job, subscriber: finish_product_job(dp, job, subscriber)
+    
+    router = get_callback_router(dp)
+    router.register(process_new_order, "new_order")
     dp.register_message_handler(process_product_url, state=OrderStates.waiting_for_url)
+    dp.register_message_handler(process_message_while_waiting, state=OrderStates.waiting_for_product)
     dp.register_message_handler(process_product_quantity, state=OrderStates.waiting_for_quantity)
     
     # Обработчики для inline-кнопок
-    dp.register_callback_query_handler(
-        process_quantity_selection, 
-        lambda c: c.data.startswith("quantity_"), 
-        state=OrderStates.waiting_for_quantity
-    )
-    dp.register_callback_query_handler(
-        process_size_selection, 
-        lambda c: c.data.startswith("size_"), 
-        state=OrderStates.waiting_for_size
-    )
-    dp.register_callback_query_handler(
-        process_color_selection, 
-        lambda c: c.data.startswith("color_"), 
-        state=OrderStates.waiting_for_color
-    )
+    router.register(process_quantity_selection, prefix="quantity_", state=OrderStates.waiting_for_quantity)
+    router.register(process_size_selection, prefix="size_", state=OrderStates.waiting_for_size)
+    router.register(process_color_selection, prefix="color_", state=OrderStates.waiting_for_color)
     
     dp.register_message_handler(process_product_size, state=OrderStates.waiting_for_size)
     dp.register_message_handler(process_product_notes, state=OrderStates.waiting_for_color)
     
     # Обработчик возврата в главное меню из любого состояния OrderStates
-    dp.register_callback_query_handler(
-        process_back_to_main_menu,
-        lambda c: c.data in ["back", "main_menu"],
-        state=OrderStates.all_states
-    ) 
\ No newline at end of file
+    router.register(process_back_to_main_menu, "back", "main_menu", state=OrderStates.all_states) 
\ No newline at end of file
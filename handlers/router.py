@@ -0,0 +1,179 @@
+"""
+Маршрутизация нажатий inline-кнопок (callback_query).
+
+Раньше каждый обработчик кнопки регистрировался в диспетчере со своим
+lambda-фильтром, и aiogram для каждого нажатия проверял фильтры по очереди,
+пока один из них не подойдет. CallbackRouter регистрируется в диспетчере
+одним обработчиком и хранит маршруты в словарях: по точному значению
+callback_data и по префиксу. Подходящие маршруты находятся поиском в
+словарях, а не перебором всех обработчиков.
+
+Семантика прежней регистрации сохраняется: из подходящих по данным
+маршрутов выбирается первый зарегистрированный, у которого подходит
+состояние FSM (state=None - только без состояния, '*' - в любом). Для
+маршрутов по префиксу часть данных после префикса передается обработчику
+в аргументе payload, если он его принимает.
+"""
+import inspect
+
+from aiogram.dispatcher.filters.builtin import StateFilter
+from aiogram.dispatcher.filters.state import State, StatesGroup
+
+# Ключ, под которым маршрутизатор хранится в данных диспетчера
+ROUTER_KEY = 'callback_router'
+
+# Любое состояние
+ANY_STATE = '*'
+
+
+def resolve_states(state):
+    """Привести состояние из регистрации обработчика к множеству имен (как StateFilter в aiogram)."""
+    if not isinstance(state, (list, set, tuple, frozenset)):
+        state = [state]
+
+    states = set()
+    for item in state:
+        if isinstance(item, State):
+            states.add(item.state)
+        elif inspect.isclass(item) and issubclass(item, StatesGroup):
+            states.update(item.all_states_names)
+        else:
+            states.add(item)
+    return frozenset(states)
+
+
+class CallbackRoute:
+    """Обработчик нажатия кнопки с условиями вызова."""
+
+    __slots__ = ('handler', 'states', 'order', 'prefix', 'accepts_state', 'accepts_payload')
+
+    def __init__(self, handler, states, order, prefix=None):
+        self.handler = handler
+        self.states = states
+        self.order = order
+        self.prefix = prefix
+
+        # Обработчик получает только те аргументы, которые принимает
+        parameters = inspect.signature(handler).parameters
+        self.accepts_state = 'state' in parameters
+        self.accepts_payload = 'payload' in parameters
+
+    def matches_state(self, state):
+        return ANY_STATE in self.states or state in self.states
+
+
+class CallbackRouter:
+    """Маршрутизатор нажатий кнопок с индексом по точному значению и префиксу callback_data."""
+
+    def __init__(self):
+        # Структура: {callback_data: [CallbackRoute, ...]} в порядке регистрации
+        self._exact = {}
+        # Структура: {префикс: [CallbackRoute, ...]} в порядке регистрации
+        self._prefixes = {}
+        # Длины зарегистрированных префиксов (от длинных к коротким)
+        self._prefix_lengths = []
+        self._count = 0
+        self.dp = None
+
+    def register(self, handler, *values, prefix=None, state=None):
+        """
+        Зарегистрировать обработчик.
+
+        Args:
+            handler: Обработчик (callback_query[, state][, payload])
+            *values: Точные значения callback_data
+            prefix: Префикс callback_data (вместо точных значений)
+            state: Состояние FSM, в котором вызывается обработчик
+                (None - без состояния, '*' - в любом, State, StatesGroup или их список)
+        """
+        if bool(values) == bool(prefix):
+            raise ValueError("Нужно указать либо точные значения callback_data, либо префикс")
+
+        route = CallbackRoute(handler, resolve_states(state), self._count, prefix)
+        self._count += 1
+
+        if prefix:
+            if prefix not in self._prefixes:
+                self._prefixes[prefix] = []
+                self._prefix_lengths = sorted({len(p) for p in self._prefixes}, reverse=True)
+            self._prefixes[prefix].append(route)
+        else:
+            for value in values:
+                self._exact.setdefault(value, []).append(route)
+        return route
+
+    def resolve(self, data):
+        """Получить маршруты, подходящие по callback_data, в порядке регистрации."""
+        routes = self._exact.get(data, [])
+        for length in self._prefix_lengths:
+            prefix_routes = self._prefixes.get(data[:length])
+            if prefix_routes:
+                routes = routes + prefix_routes
+        if len(routes) > 1:
+            routes = sorted(routes, key=lambda route: route.order)
+        return routes
+
+    def match(self, data, state):
+        """Получить первый маршрут, подходящий по callback_data и состоянию, или None."""
+        for route in self.resolve(data):
+            if route.matches_state(state):
+                return route
+        return None
+
+    def setup(self, dp):
+        """Зарегистрировать маршрутизатор в диспетчере одним обработчиком callback_query."""
+        self.dp = dp
+        dp.register_callback_query_handler(self._handle, self._check, state=ANY_STATE)
+
+    async def _check(self, callback_query):
+        # Фильтр диспетчера: находит маршрут, состояние читается только при необходимости
+        routes = self.resolve(callback_query.data or '')
+        if not routes:
+            return False
+
+        state = None
+        if any(ANY_STATE not in route.states for route in routes):
+            state = await self._get_state(callback_query)
+
+        for route in routes:
+            if route.matches_state(state):
+                return {'route': route}
+        return False
+
+    async def _get_state(self, callback_query):
+        # Состояние, уже прочитанное фильтрами aiogram для этого обновления, не читается повторно
+        try:
+            return StateFilter.ctx_state.get()
+        except LookupError:
+            pass
+
+        chat_id = callback_query.message.chat.id if callback_query.message else None
+        state = await self.dp.storage.get_state(chat=chat_id, user=callback_query.from_user.id)
+        StateFilter.ctx_state.set(state)
+        return state
+
+    async def _handle(self, callback_query, state, route):
+        kwargs = {}
+        if route.accepts_state:
+            kwargs['state'] = state
+        if route.accepts_payload:
+            kwargs['payload'] = callback_query.data[len(route.prefix):] if route.prefix else callback_query.data
+        return await route.handler(callback_query, **kwargs)
+
+    def stats(self):
+        """Получить количество зарегистрированных маршрутов."""
+        return {
+            'routes': self._count,
+            'exact': len(self._exact),
+            'prefixes': len(self._prefixes)
+        }
+
+
+def get_callback_router(dp):
+    """Получить маршрутизатор кнопок диспетчера (создается и регистрируется при первом вызове)."""
+    router = dp.get(ROUTER_KEY)
+    if router is None:
+        router = CallbackRouter()
+        router.setup(dp)
+        dp[ROUTER_KEY] = router
+    return router
@@ -0,0 +1,179 @@
+"""
+Сравнение стоимости выбора обработчика нажатия кнопки: прежняя регистрация
+каждого обработчика в диспетчере с lambda-фильтром против CallbackRouter.
+
+Оба варианта собираются из одной таблицы маршрутов, повторяющей
+регистрацию в handlers/__init__.register_all_handlers, с пустыми
+обработчиками, поэтому измеряется только выбор обработчика диспетчером.
+Для каждого варианта выводится время обработки одного нажатия; перед
+замером проверяется, что оба варианта выбирают одни и те же обработчики.
+
+Запуск:
+    python -m handlers.router_benchmark [--repeats 200]
+"""
+import time
+import asyncio
+import argparse
+
+from aiogram import Bot, Dispatcher, types
+from aiogram.contrib.fsm_storage.memory import MemoryStorage
+
+from handlers.router import get_callback_router
+from handlers.cart import PaymentStates
+from handlers.cabinet import OrderHistoryStates
+from handlers.orders import OrderStates
+
+# Маршруты в порядке регистрации: (точные значения, префикс, состояние)
+ROUTES = [
+    (("main_menu",), None, "*"),
+    (("back",), None, "*"),
+    (("new_order",), None, None),
+    ((), "quantity_", OrderStates.waiting_for_quantity),
+    ((), "size_", OrderStates.waiting_for_size),
+    ((), "color_", OrderStates.waiting_for_color),
+    (("back", "main_menu"), None, OrderStates.all_states),
+    (("delivery",), None, None),
+    (("show_address",), None, None),
+    (("cart",), None, None),
+    (("my_orders",), None, None),
+    (("delete_order",), None, None),
+    ((), "remove_order_", None),
+    ((), "confirm_remove_cart_item_", None),
+    (("pay_orders",), None, None),
+    (("pay_mir", "pay_visa_mc"), None, PaymentStates.waiting_for_payment_method),
+    ((), "paid_order_", None),
+    (("cancel_action",), None, None),
+    (("remove_all_orders",), None, None),
+    (("confirm_remove_all_cart_items_0",), None, None),
+    (("cabinet",), None, None),
+    (("order_history",), None, None),
+    (("prev_page", "next_page"), None, OrderHistoryStates.viewing_history),
+    (("profile",), None, None),
+    (("settings",), None, None),
+    ((), "pay_order_", None),
+]
+
+# Нажатия для замера: (callback_data, состояние пользователя)
+CALLBACKS = [
+    ("main_menu", None),
+    ("back", OrderStates.waiting_for_size.state),
+    ("new_order", None),
+    ("quantity_2", OrderStates.waiting_for_quantity.state),
+    ("size_XL", OrderStates.waiting_for_size.state),
+    ("color_none", OrderStates.waiting_for_color.state),
+    ("cart", None),
+    ("remove_order_15", None),
+    ("confirm_remove_cart_item_15", None),
+    ("pay_visa_mc", PaymentStates.waiting_for_payment_method.state),
+    ("paid_order_42", None),
+    ("next_page", OrderHistoryStates.viewing_history.state),
+    ("settings", None),
+    ("pay_order_42", None),
+    ("unknown_button", None),
+]
+
+
+def make_handler(name, calls):
+    async def handler(callback_query):
+        calls.append(name)
+    return handler
+
+
+def make_filter(values, prefix):
+    """Фильтр в виде прежней регистрации."""
+    if prefix:
+        return lambda c: c.data.startswith(prefix)
+    if len(values) == 1:
+        value = values[0]
+        return lambda c: c.data == value
+    return lambda c: c.data in list(values)
+
+
+def create_dispatcher(use_router, calls):
+    bot = Bot(token='123456:benchmark')
+    dp = Dispatcher(bot, storage=MemoryStorage())
+
+    for index, (values, prefix, state) in enumerate(ROUTES):
+        handler = make_handler(index, calls)
+        if use_router:
+            get_callback_router(dp).register(handler, *values, prefix=prefix, state=state)
+        else:
+            dp.register_callback_query_handler(handler, make_filter(values, prefix), state=state)
+    return dp
+
+
+async def prepare_states(dp):
+    for user_id, (data, state) in enumerate(CALLBACKS, start=1):
+        await dp.storage.set_state(chat=user_id, user=user_id, state=state)
+
+
+def make_updates():
+    updates = []
+    for user_id, (data, state) in enumerate(CALLBACKS, start=1):
+        updates.append(types.Update.to_object({
+            'update_id': user_id,
+            'callback_query': {
+                'id': str(user_id),
+                'from': {'id': user_id, 'is_bot': False, 'first_name': 'user'},
+                'message': {'message_id': 1, 'date': 0, 'chat': {'id': user_id, 'type': 'private'}},
+                'chat_instance': 'benchmark',
+                'data': data
+            }
+        }))
+    return updates
+
+
+async def dispatch(dp, update):
+    # Каждое обновление обрабатывается в отдельной задаче, как при получении обновлений,
+    # чтобы состояние, прочитанное фильтрами, не переходило к следующему нажатию
+    await asyncio.create_task(dp.process_update(update))
+
+
+async def measure(name, use_router, repeats):
+    calls = []
+    dp = create_dispatcher(use_router, calls)
+    Dispatcher.set_current(dp)
+    await prepare_states(dp)
+    updates = make_updates()
+
+    # Выбранные обработчики для проверки совпадения вариантов
+    for update in updates:
+        await dispatch(dp, update)
+    chosen = list(calls)
+
+    started = time.perf_counter()
+    for _ in range(repeats):
+        for update in updates:
+            await dispatch(dp, update)
+    elapsed = time.perf_counter() - started
+
+    count = repeats * len(updates)
+    print(f"{name:<10} {count:>8} {elapsed:>10.3f} {elapsed / count * 1e6:>14.1f}")
+
+    session = await dp.bot.get_session()
+    if session is not None:
+        await session.close()
+    return chosen
+
+
+async def run(repeats):
+    print(f"Маршрутов: {len(ROUTES)}, вариантов нажатий: {len(CALLBACKS)}")
+    print(f"{'Вариант':<10} {'Нажатий':>8} {'Время, с':>10} {'мкс/нажатие':>14}")
+    chosen_lambda = await measure('lambda', False, repeats)
+    chosen_router = await measure('router', True, repeats)
+
+    if chosen_lambda != chosen_router:
+        print(f"Варианты выбирают разные обработчики: {chosen_lambda} != {chosen_router}")
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeats', type=int, default=200, help="Количество повторов набора нажатий")
+    args = parser.parse_args()
+    return 0 if asyncio.run(run(args.repeats)) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,16 +1,16 @@
 from aiogram import types
 from aiogram.dispatcher import FSMContext
 from aiogram.utils.exceptions import MessageNotModified
-import time
 
 from keyboards.keyboards import (
     get_main_menu, get_cabinet_menu, get_delivery_menu, 
     get_cart_menu, get_payment_methods, get_back_menu
 )
+from keyboards.navigation_history import NavigationHistory
 
-# Словарь для хранения предыдущих состояний пользователя
-# Структура: {user_id: {'prev_screen': 'main', 'prev_data': {...}}}
-user_navigation_history = {}
+# История экранов пользователей: не больше NAVIGATION_HISTORY_SIZE последних экранов
+# на пользователя, неактивные пользователи вытесняются
+navigation_history = NavigationHistory()
 
 # Словарь соответствия разделов и функций для возврата к этим разделам
 menu_generators = {
@@ -48,24 +48,11 @@ async def save_navigation_state(user_id: int, screen: str, state_data=None):
         screen: Идентификатор экрана (например, 'main', 'cabinet', 'profile')
         state_data: Дополнительные данные состояния (для экранов с параметрами)
     """
-    if user_id not in user_navigation_history:
-        user_navigation_history[user_id] = []
-    
     # Добавляем новый экран в историю
     # Даже если предыдущий экран такой же, мы всё равно сохраняем,
-    # чтобы корректно обрабатывать случаи повторного просмотра одного экрана
-    user_navigation_history[user_id].append({
-        'screen': screen,
-        'state_data': state_data or {},
-        'timestamp': int(time.time())  # Добавляем временную метку для дополнительного контроля
-    })
-    
-    # Ограничиваем историю до 10 записей
-    if len(user_navigation_history[user_id]) > 10:
-        user_navigation_history[user_id].pop(0)
-    
-    # Для отладки - выводим в лог текущую историю навигации
-    # print(f"Navigation history for user {user_id}: {[item['screen'] for item in user_navigation_history[user_id]]}")
+    # чтобы корректно обрабатывать случаи повторного просмотра одного экрана.
+    # История ограничена по размеру: самая старая запись вытесняется автоматически
+    await navigation_history.push(user_id, screen, state_data)
 
 async def get_previous_screen(user_id: int):
     """
@@ -77,27 +64,13 @@ async def get_previous_screen(user_id: int):
     Returns:
         tuple: (screen, state_data) или ('main', {}) если истории нет
     """
-    # Проверяем, что у пользователя есть история навигации
-    if user_id not in user_navigation_history:
-        # print(f"No navigation history for user {user_id}")
-        return 'main', {}
-    
-    # Проверяем, что в истории есть хотя бы два элемента
-    # (текущий экран и предыдущий)
-    if len(user_navigation_history[user_id]) < 2:
-        # print(f"Not enough history for user {user_id}, only {len(user_navigation_history[user_id])} items")
+    # Удаляем текущий экран и получаем предыдущий
+    # (если в истории меньше двух экранов, возвращаемся в главное меню)
+    prev_screen = await navigation_history.back(user_id)
+    if prev_screen is None:
         return 'main', {}
     
-    # Удаляем текущий экран
-    current_screen = user_navigation_history[user_id].pop()
-    
-    # Получаем предыдущий экран
-    prev_screen = user_navigation_history[user_id][-1]
-    
-    # Для отладки - выводим информацию о переходе
-    # print(f"User {user_id} navigating back from '{current_screen['screen']}' to '{prev_screen['screen']}'")
-    
-    return prev_screen['screen'], prev_screen['state_data']
+    return prev_screen.screen, prev_screen.state_data or {}
 
 async def process_fallback(callback_query: types.CallbackQuery, state: FSMContext):
     """
@@ -199,11 +172,9 @@ def register_fallback_handlers(dp):
         dp: Диспетчер бота
     """
     # Обработчик для кнопки "Назад"
-    dp.register_callback_query_handler(
-        process_fallback,
-        lambda c: c.data == "back",
-        state="*"
-    ) 
+    from handlers.router import get_callback_router
+    get_callback_router(dp).register(process_fallback, "back", state="*")
+
 
 def reset_navigation_history(user_id: int):
     """
@@ -212,11 +183,7 @@ def reset_navigation_history(user_id: int):
     Args:
         user_id: ID пользователя
     """
-    if user_id in user_navigation_history:
-        # print(f"Resetting navigation history for user {user_id}")
-        user_navigation_history[user_id] = []
-        return True
-    return False
+    return navigation_history.reset(user_id)
 
 # Обновляем список экспортируемых функций
 __all__ = [
@@ -0,0 +1,295 @@
+"""
+Хранилище истории навигации пользователей для кнопки "Назад".
+
+История каждого пользователя — кольцевой буфер (deque) фиксированного
+размера из компактных записей с __slots__. Количество пользователей в
+памяти ограничено: дольше всех не пользовавшиеся ботом вытесняются
+(LRU), а истории старше срока жизни удаляются при очередном обращении к
+хранилищу.
+
+Если задан NAVIGATION_HISTORY_PATH, истории дополнительно сохраняются в
+локальный файл SQLite и переживают перезапуск бота: вытесненная из
+памяти история загружается из файла при следующем обращении
+пользователя. Операции с файлом выполняются по очереди в отдельном
+потоке, чтобы не блокировать цикл событий и не менять порядок записей.
+Записи сохраняются в JSON; история, которую не удается прочитать из
+файла, считается отсутствующей.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import sqlite3
+import asyncio
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+# Загрузка переменных окружения
+load_dotenv()
+
+# Количество экранов в истории одного пользователя
+NAVIGATION_HISTORY_SIZE = int(os.getenv('NAVIGATION_HISTORY_SIZE', '10'))
+# Максимальное количество пользователей, история которых хранится в памяти
+NAVIGATION_MAX_USERS = int(os.getenv('NAVIGATION_MAX_USERS', '10000'))
+# Срок жизни истории после последнего обращения
+NAVIGATION_HISTORY_TTL = float(os.getenv('NAVIGATION_HISTORY_TTL', '86400'))  # секунды
+# Файл для сохранения историй (пусто - только в памяти)
+NAVIGATION_HISTORY_PATH = os.getenv('NAVIGATION_HISTORY_PATH', '')
+
+# Интервал удаления просроченных историй из файла
+CLEANUP_INTERVAL = 300  # секунды
+
+
+class NavigationEntry:
+    """Экран в истории навигации."""
+
+    __slots__ = ('screen', 'state_data', 'timestamp')
+
+    def __init__(self, screen, state_data=None, timestamp=None):
+        self.screen = screen
+        # Пустые данные не храним, чтобы не держать в памяти лишние словари
+        self.state_data = state_data or None
+        self.timestamp = timestamp if timestamp is not None else int(time.time())
+
+    def to_tuple(self):
+        return self.screen, self.state_data, self.timestamp
+
+
+class UserHistory:
+    """История навигации одного пользователя."""
+
+    __slots__ = ('entries', 'last_access')
+
+    def __init__(self, entries, last_access):
+        self.entries = entries
+        self.last_access = last_access
+
+
+class SQLiteNavigationBackend:
+    """Сохранение историй навигации в локальном файле SQLite."""
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = None
+        self._last_cleanup = 0.0
+
+    def _get_connection(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS navigation_history ("
+                "user_id INTEGER PRIMARY KEY, "
+                "entries TEXT NOT NULL, "
+                "updated_at REAL NOT NULL)"
+            )
+            self._connection.commit()
+        return self._connection
+
+    def load(self, user_id, ttl):
+        """Загрузить записи истории пользователя (None, если истории нет или она просрочена)."""
+        row = self._get_connection().execute(
+            "SELECT entries, updated_at FROM navigation_history WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None or row[1] <= time.time() - ttl:
+            return None
+        try:
+            # Записи хранятся в JSON списками: (экран, данные состояния, время)
+            entries = [tuple(entry) for entry in json.loads(row[0])]
+            if any(len(entry) != 3 for entry in entries):
+                raise ValueError("ожидались записи из трех полей")
+            return entries
+        except (ValueError, TypeError) as e:
+            # Поврежденная запись удаляется, история начинается заново
+            logger.warning("Не удалось прочитать историю навигации пользователя %s: %s", user_id, e)
+            self.delete(user_id)
+            return None
+
+    def save(self, user_id, entries, ttl):
+        """Сохранить записи истории пользователя."""
+        connection = self._get_connection()
+        with connection:
+            connection.execute(
+                "INSERT INTO navigation_history (user_id, entries, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET entries = excluded.entries, updated_at = excluded.updated_at",
+                (user_id, json.dumps(entries, ensure_ascii=False, separators=(',', ':')), time.time())
+            )
+            if time.monotonic() - self._last_cleanup >= CLEANUP_INTERVAL:
+                self._last_cleanup = time.monotonic()
+                connection.execute("DELETE FROM navigation_history WHERE updated_at <= ?", (time.time() - ttl,))
+
+    def delete(self, user_id):
+        """Удалить историю пользователя."""
+        connection = self._get_connection()
+        with connection:
+            connection.execute("DELETE FROM navigation_history WHERE user_id = ?", (user_id,))
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class NavigationHistory:
+    """Ограниченное хранилище историй навигации с вытеснением неактивных пользователей."""
+
+    def __init__(self, size=NAVIGATION_HISTORY_SIZE, max_users=NAVIGATION_MAX_USERS,
+                 ttl=NAVIGATION_HISTORY_TTL, path=NAVIGATION_HISTORY_PATH):
+        """
+        Args:
+            size: Количество экранов в истории одного пользователя
+            max_users: Максимальное количество пользователей в памяти
+            ttl: Срок жизни истории после последнего обращения в секундах
+            path: Файл SQLite для сохранения историй (None или пустая строка - только в памяти)
+        """
+        self.size = size
+        self.max_users = max_users
+        self.ttl = ttl
+
+        # Структура: {user_id: UserHistory}, от давно неактивных к недавним
+        self._users = OrderedDict()
+
+        self._backend = SQLiteNavigationBackend(path) if path else None
+        # Один поток сохраняет операции с файлом в порядке вызова
+        self._executor = ThreadPoolExecutor(max_workers=1) if self._backend else None
+
+        # Счетчики
+        self.evicted = 0
+        self.expired = 0
+        self.loaded = 0
+
+    async def push(self, user_id, screen, state_data=None):
+        """Добавить экран в историю пользователя (самый старый вытесняется при переполнении)."""
+        history = await self._get_history(user_id, create=True)
+        history.entries.append(NavigationEntry(screen, state_data))
+        await self._save(user_id, history)
+
+    async def back(self, user_id):
+        """
+        Удалить текущий экран и вернуть предыдущий.
+
+        Returns:
+            NavigationEntry или None, если в истории меньше двух экранов
+        """
+        history = await self._get_history(user_id)
+        if history is None or len(history.entries) < 2:
+            return None
+
+        history.entries.pop()
+        await self._save(user_id, history)
+        return history.entries[-1]
+
+    def reset(self, user_id):
+        """
+        Очистить историю пользователя.
+
+        Returns:
+            bool: True, если история пользователя была в памяти
+        """
+        history = self._users.get(user_id)
+        if history is not None:
+            history.entries.clear()
+            history.last_access = time.monotonic()
+            self._users.move_to_end(user_id)
+        elif self._backend:
+            # Пустая история в памяти не дает загрузить из файла устаревшую
+            self._users[user_id] = UserHistory(deque(maxlen=self.size), time.monotonic())
+            self._evict()
+
+        if self._backend:
+            self._submit(self._backend.delete, user_id)
+        return history is not None
+
+    def __contains__(self, user_id):
+        return user_id in self._users
+
+    async def _get_history(self, user_id, create=False):
+        now = time.monotonic()
+        self._expire(now)
+
+        history = self._users.get(user_id)
+        if history is None:
+            entries = None
+            if self._backend:
+                entries = await self._run(self._backend.load, user_id, self.ttl)
+                # История могла появиться в памяти, пока шло чтение из файла
+                history = self._users.get(user_id)
+            if history is None:
+                if entries is None and not create:
+                    return None
+                history = UserHistory(deque(maxlen=self.size), now)
+                if entries:
+                    self.loaded += 1
+                    history.entries.extend(NavigationEntry(*entry) for entry in entries)
+                self._users[user_id] = history
+                self._evict()
+
+        history.last_access = now
+        self._users.move_to_end(user_id)
+        return history
+
+    def _expire(self, now):
+        # Пользователи упорядочены по последнему обращению, поэтому просроченные - в начале
+        while self._users:
+            user_id, history = next(iter(self._users.items()))
+            if now - history.last_access < self.ttl:
+                break
+            del self._users[user_id]
+            self.expired += 1
+
+    def _evict(self):
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+            self.evicted += 1
+
+    async def _save(self, user_id, history):
+        if self._backend:
+            entries = [entry.to_tuple() for entry in history.entries]
+            await self._run(self._backend.save, user_id, entries, self.ttl)
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _submit(self, func, *args):
+        future = self._executor.submit(func, *args)
+        future.add_done_callback(self._report_error)
+
+    @staticmethod
+    def _report_error(future):
+        if future.exception() is not None:
+            logger.error("Ошибка при сохранении истории навигации: %s", future.exception())
+
+    def memory_usage(self):
+        """Оценить память, занятую историями, в байтах (без учета данных состояний)."""
+        total = sys.getsizeof(self._users)
+        for history in self._users.values():
+            total += sys.getsizeof(history) + sys.getsizeof(history.entries)
+            for entry in history.entries:
+                total += sys.getsizeof(entry)
+                if entry.state_data is not None:
+                    total += sys.getsizeof(entry.state_data)
+        return total
+
+    def stats(self):
+        """Получить статистику хранилища."""
+        return {
+            'users': len(self._users),
+            'entries': sum(len(history.entries) for history in self._users.values()),
+            'memory_bytes': self.memory_usage(),
+            'evicted': self.evicted,
+            'expired': self.expired,
+            'loaded': self.loaded
+        }
+
+    def close(self):
+        """Дождаться сохранения историй и закрыть файл."""
+        if self._backend:
+            self._executor.submit(self._backend.close)
+            self._executor.shutdown(wait=True)
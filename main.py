@@ -1,13 +1,22 @@
 import logging
 import asyncio
 from aiogram import Bot, Dispatcher
-from aiogram.contrib.fsm_storage.memory import MemoryStorage
 from aiogram.types import BotCommand
 from aiohttp import ClientTimeout
 
 from config import BOT_TOKEN
-from database import init_db
+from config.config import (
+    BOT_MODE, WEBHOOK_URL, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_HEALTH_PATH,
+    WEBHOOK_SECRET_TOKEN, WEBHOOK_MAX_CONCURRENT_UPDATES
+)
+from database import init_db, close_db
 from handlers import register_all_handlers
+from parser.http_client import close_client
+from parser.parse_pool import parse_pool
+from utils.parse_queue import parse_queue
+from utils.fsm_storage import create_storage
+from utils.webhook import WebhookServer
+from keyboards.fallback import navigation_history
 
 # Настройка логирования
 logging.basicConfig(
@@ -16,17 +25,54 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def run_polling(dp):
+    """Получать обновления через long polling, перезапуская его после ошибок."""
+    # Telegram не отдает обновления через getUpdates, пока установлен вебхук
+    await dp.bot.delete_webhook()
+    
+    logger.info("Бот запущен (polling)")
+    while True:
+        try:
+            await dp.start_polling()
+        except asyncio.TimeoutError:
+            logger.warning("Произошел таймаут при получении обновлений. Перезапуск через 3 секунды...")
+            await asyncio.sleep(3)
+        except Exception as e:
+            logger.error(f"Произошла ошибка: {e}. Перезапуск через 3 секунды...")
+            await asyncio.sleep(3)
+
+async def run_webhook(dp):
+    """Получать обновления через вебхук до остановки бота."""
+    server = WebhookServer(
+        dp,
+        url=WEBHOOK_URL,
+        host=WEBHOOK_HOST,
+        port=WEBHOOK_PORT,
+        path=WEBHOOK_PATH,
+        health_path=WEBHOOK_HEALTH_PATH,
+        secret_token=WEBHOOK_SECRET_TOKEN,
+        max_concurrent=WEBHOOK_MAX_CONCURRENT_UPDATES
+    )
+    await server.start()
+    logger.info("Бот запущен (webhook)")
+    try:
+        # Сервер работает в фоне, ждем остановки бота
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
 async def main():
     """Основная функция."""
     # Инициализируем базу данных
-    init_db()
+    await init_db()
     
     # Настраиваем таймаут для клиентской сессии
     timeout = ClientTimeout(total=60)  # 60 секунд для общего таймаута
     
     # Инициализируем бота и диспетчер
     bot = Bot(token=BOT_TOKEN, timeout=timeout)
-    storage = MemoryStorage()
+    # Хранилище состояний (по умолчанию SQLite, чтобы сценарии переживали перезапуск)
+    storage = create_storage()
     dp = Dispatcher(bot, storage=storage)
     
     # Устанавливаем команды для меню бота
@@ -41,21 +87,26 @@ async def main():
     # Регистрируем все обработчики
     register_all_handlers(dp)
     
-    # Запускаем бота в цикле с обработкой ошибок
+    # Заранее запускаем процессы для разбора страниц маркетплейсов
+    await parse_pool.start()
+    
+    # Запускаем обработчики очереди парсинга (в том числе задачи, не завершенные до перезапуска)
+    await parse_queue.start()
+    
+    # Запускаем бота в выбранном режиме получения обновлений
     try:
-        logger.info("Бот запущен")
-        while True:
-            try:
-                await dp.start_polling()
-            except asyncio.TimeoutError:
-                logger.warning("Произошел таймаут при получении обновлений. Перезапуск через 3 секунды...")
-                await asyncio.sleep(3)
-            except Exception as e:
-                logger.error(f"Произошла ошибка: {e}. Перезапуск через 3 секунды...")
-                await asyncio.sleep(3)
+        if BOT_MODE == 'webhook':
+            await run_webhook(dp)
+        else:
+            await run_polling(dp)
     finally:
+        await parse_queue.stop()
         await dp.storage.close()
         await dp.storage.wait_closed()
+        navigation_history.close()
+        await close_client()
+        await close_db()
+        parse_pool.shutdown()
         session = await bot.get_session()
         await session.close()
 
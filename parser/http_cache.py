@@ -0,0 +1,230 @@
+"""
+Постоянный кэш HTTP-ответов маркетплейсов в SQLite.
+
+Ответы Card API Wildberries и страницы Яндекс.Маркета сохраняются на диск
+с отдельным временем жизни для каждого хоста, поэтому после перезапуска
+бота повторные запросы не уходят в сеть. Суммарный размер кэша ограничен:
+при превышении лимита сначала удаляются устаревшие, затем давно
+неиспользуемые записи. В автономном режиме (HTTP_CACHE_OFFLINE) ответы
+отдаются из кэша независимо от срока жизни, а сеть не используется.
+"""
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import threading
+from urllib.parse import urlparse
+
+from dotenv import load_dotenv
+
+# Загрузка переменных окружения
+load_dotenv()
+
+HTTP_CACHE_ENABLED = os.getenv('HTTP_CACHE_ENABLED', '1') == '1'
+HTTP_CACHE_PATH = os.getenv('HTTP_CACHE_PATH', 'http_cache.db')
+HTTP_CACHE_MAX_BYTES = int(os.getenv('HTTP_CACHE_MAX_BYTES', str(200 * 1024 * 1024)))
+HTTP_CACHE_OFFLINE = os.getenv('HTTP_CACHE_OFFLINE', '0') == '1'
+
+# Время жизни ответов по хостам в секундах.
+# Формат переменной окружения: "card.wb.ru=600,market.yandex.ru=1800"
+DEFAULT_HOST_TTLS = {
+    'card.wb.ru': 600,
+    'market.yandex.ru': 1800,
+}
+
+
+def parse_host_ttls(value):
+    """Разобрать строку вида "host=ttl,host=ttl" в словарь."""
+    host_ttls = {}
+    for item in value.split(','):
+        if '=' not in item:
+            continue
+        host, ttl = item.split('=', 1)
+        host_ttls[host.strip()] = int(ttl)
+    return host_ttls
+
+
+HTTP_CACHE_TTLS = dict(DEFAULT_HOST_TTLS, **parse_host_ttls(os.getenv('HTTP_CACHE_TTLS', '')))
+
+
+class CachedResponse:
+    """Сохраненный в кэше ответ."""
+
+    __slots__ = ('url', 'status_code', 'headers', 'content', 'expires_at')
+
+    def __init__(self, url, status_code, headers, content, expires_at):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.expires_at = expires_at
+
+    @property
+    def is_fresh(self):
+        return self.expires_at > time.time()
+
+
+class HttpResponseCache:
+    """Кэш HTTP-ответов в файле SQLite с TTL по хостам и ограничением размера."""
+
+    def __init__(self, path=HTTP_CACHE_PATH, host_ttls=None, max_bytes=HTTP_CACHE_MAX_BYTES, offline=HTTP_CACHE_OFFLINE):
+        self.path = path
+        self.host_ttls = host_ttls if host_ttls is not None else HTTP_CACHE_TTLS
+        self.max_bytes = max_bytes
+        self.offline = offline
+
+        self._connection = None
+        self._lock = threading.Lock()
+
+        # Счетчики
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def get_ttl(self, url):
+        """Время жизни ответов для хоста URL (None - хост не кэшируется)."""
+        return self.host_ttls.get(urlparse(url).hostname)
+
+    def is_cacheable(self, url):
+        """Проверить, кэшируются ли ответы для URL."""
+        return self.get_ttl(url) is not None
+
+    async def get(self, url):
+        """
+        Получить ответ из кэша.
+
+        Returns:
+            CachedResponse или None. В автономном режиме возвращаются и
+            устаревшие записи.
+        """
+        cached = await self._run(self._get, url)
+        if cached is None or not (cached.is_fresh or self.offline):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return cached
+
+    async def set(self, url, status_code, headers, content):
+        """Сохранить ответ в кэше."""
+        ttl = self.get_ttl(url)
+        if ttl is None or len(content) > self.max_bytes:
+            return
+        await self._run(self._set, url, status_code, headers, content, ttl)
+        self.stores += 1
+
+    async def invalidate(self, url):
+        """Удалить ответ из кэша."""
+        await self._run(self._execute, "DELETE FROM responses WHERE url = ?", (url,))
+
+    def close(self):
+        """Закрыть соединение с файлом кэша."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def stats(self):
+        """Получить статистику кэша."""
+        entries, total_bytes = self._execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        )[0]
+        return {
+            'entries': entries,
+            'bytes': total_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'evictions': self.evictions
+        }
+
+    async def _run(self, func, *args):
+        # Работа с SQLite выполняется в пуле потоков, чтобы не блокировать цикл событий
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, *args)
+
+    def _get_connection(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "url TEXT PRIMARY KEY, "
+                "host TEXT NOT NULL, "
+                "status_code INTEGER NOT NULL, "
+                "headers TEXT NOT NULL, "
+                "content BLOB NOT NULL, "
+                "size INTEGER NOT NULL, "
+                "expires_at REAL NOT NULL, "
+                "accessed_at REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_responses_accessed_at ON responses (accessed_at)"
+            )
+            self._connection.commit()
+        return self._connection
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            connection = self._get_connection()
+            rows = connection.execute(sql, params).fetchall()
+            connection.commit()
+            return rows
+
+    def _get(self, url):
+        with self._lock:
+            connection = self._get_connection()
+            row = connection.execute(
+                "SELECT status_code, headers, content, expires_at FROM responses WHERE url = ?",
+                (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE responses SET accessed_at = ? WHERE url = ?",
+                (time.time(), url)
+            )
+            connection.commit()
+
+        status_code, headers, content, expires_at = row
+        return CachedResponse(url, status_code, json.loads(headers), content, expires_at)
+
+    def _set(self, url, status_code, headers, content, ttl):
+        now = time.time()
+        with self._lock:
+            connection = self._get_connection()
+            connection.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(url, host, status_code, headers, content, size, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, urlparse(url).hostname, status_code, json.dumps(headers), content,
+                 len(content), now + ttl, now)
+            )
+            self._evict(connection, now)
+            connection.commit()
+
+    def _evict(self, connection, now):
+        total_bytes = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        excess = total_bytes - self.max_bytes
+        if excess <= 0:
+            return
+
+        # Сначала удаляем устаревшие записи, затем давно неиспользуемые
+        rows = connection.execute(
+            "SELECT url, size FROM responses ORDER BY expires_at > ?, accessed_at",
+            (now,)
+        ).fetchall()
+        urls = []
+        for url, size in rows:
+            if excess <= 0:
+                break
+            urls.append((url,))
+            excess -= size
+
+        connection.executemany("DELETE FROM responses WHERE url = ?", urls)
+        self.evictions += len(urls)
+
+
+# Общий кэш ответов
+response_cache = HttpResponseCache() if HTTP_CACHE_ENABLED else None
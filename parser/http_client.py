@@ -0,0 +1,189 @@
+"""
+Асинхронный HTTP-клиент для парсеров маркетплейсов.
+
+Все парсеры используют один общий пул соединений, поэтому сетевые запросы
+не блокируют цикл событий бота, а паузы между повторными попытками
+выполняются через asyncio.sleep. Ответы кэшируемых хостов сохраняются
+в постоянном кэше (parser/http_cache.py), а частота запросов к хостам
+ограничивается общим для процесса ограничителем (parser/rate_limiter.py).
+"""
+import os
+import logging
+from urllib.parse import urlparse
+
+import httpx
+from dotenv import load_dotenv
+
+from parser.http_cache import response_cache
+from parser.rate_limiter import get_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+# Загрузка переменных окружения
+load_dotenv()
+
+# Настройки пула соединений
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '30'))
+HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', '20'))
+HTTP_MAX_KEEPALIVE = int(os.getenv('HTTP_MAX_KEEPALIVE', '10'))
+
+# Размер части тела ответа при потоковой загрузке
+STREAM_CHUNK_SIZE = 16 * 1024
+
+# Общий клиент, создается при первом запросе
+_client = None
+
+
+def get_client():
+    """Получить общий асинхронный HTTP-клиент (создается при первом вызове)."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE
+            ),
+            follow_redirects=True
+        )
+    return _client
+
+
+async def close_client():
+    """Закрыть общий HTTP-клиент и освободить соединения."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+    if response_cache is not None:
+        response_cache.close()
+
+
+async def acquire_rate_limit(url):
+    """Дождаться разрешения ограничителя частоты запросов для хоста URL."""
+    limiter = get_rate_limiter(urlparse(url).hostname)
+    if limiter is not None:
+        await limiter.acquire()
+
+
+async def fetch(url, headers=None, timeout=None, cache_filter=None, cache=True):
+    """
+    Выполнить GET-запрос через общий клиент.
+
+    Если для хоста настроен постоянный кэш ответов, сначала проверяется
+    кэш, а успешные ответы (код 200) сохраняются в него.
+
+    Args:
+        url: Адрес запроса
+        headers: Заголовки запроса
+        timeout: Таймаут в секундах (по умолчанию HTTP_TIMEOUT)
+        cache_filter: Функция, получающая тело ответа (bytes) и решающая,
+            можно ли сохранить его в кэш (например, чтобы не кэшировать капчу)
+        cache: False - не обращаться к кэшу (для адресов, которые почти не повторяются)
+
+    Returns:
+        httpx.Response: Ответ сервера
+
+    Raises:
+        RateLimitExceeded: Если ограничитель частоты отклонил запрос
+    """
+    use_cache = cache and response_cache is not None and response_cache.is_cacheable(url)
+
+    if use_cache:
+        cached = await response_cache.get(url)
+        if cached is not None:
+            return httpx.Response(
+                cached.status_code,
+                headers=cached.headers,
+                content=cached.content,
+                request=httpx.Request('GET', url)
+            )
+        if response_cache.offline:
+            raise httpx.ConnectError(f"Автономный режим: ответ для {url} отсутствует в кэше")
+
+    await acquire_rate_limit(url)
+    client = get_client()
+    response = await client.get(url, headers=headers, timeout=timeout or HTTP_TIMEOUT)
+
+    if use_cache and response.status_code == 200 and (cache_filter is None or cache_filter(response.content)):
+        await response_cache.set(
+            url,
+            response.status_code,
+            {'content-type': response.headers.get('content-type', '')},
+            response.content
+        )
+
+    return response
+
+
+async def fetch_stream(url, on_chunk, headers=None, max_bytes=None, timeout=None, cache_filter=None):
+    """
+    Выполнить потоковый GET-запрос, передавая тело ответа по частям.
+
+    Чтение прекращается, как только on_chunk вернет True или тело ответа
+    превысит max_bytes байт; остаток ответа не загружается. Прочитанная
+    часть тела сохраняется в постоянном кэше (кроме тела, обрезанного по
+    max_bytes; тело ровно из max_bytes байт считается полным), а при
+    попадании в кэш сохраненные данные передаются в on_chunk так же, по частям.
+
+    Args:
+        url: Адрес запроса
+        on_chunk: Функция, получающая очередную часть тела (bytes);
+            возвращает True, если дальше читать не нужно
+        headers: Заголовки запроса
+        max_bytes: Максимальное количество читаемых байт
+        timeout: Таймаут в секундах (по умолчанию HTTP_TIMEOUT)
+        cache_filter: Функция, получающая прочитанное тело (bytes) и решающая,
+            можно ли сохранить его в кэш
+
+    Returns:
+        bytes: Прочитанная часть тела ответа
+
+    Raises:
+        httpx.HTTPStatusError: Если сервер вернул код ошибки
+        RateLimitExceeded: Если ограничитель частоты отклонил запрос
+    """
+    use_cache = response_cache is not None and response_cache.is_cacheable(url)
+
+    if use_cache:
+        cached = await response_cache.get(url)
+        if cached is not None:
+            for offset in range(0, len(cached.content), STREAM_CHUNK_SIZE):
+                if on_chunk(cached.content[offset:offset + STREAM_CHUNK_SIZE]):
+                    break
+            return cached.content
+        if response_cache.offline:
+            raise httpx.ConnectError(f"Автономный режим: ответ для {url} отсутствует в кэше")
+
+    await acquire_rate_limit(url)
+    client = get_client()
+    received = bytearray()
+    truncated = False
+
+    async with client.stream('GET', url, headers=headers, timeout=timeout or HTTP_TIMEOUT) as response:
+        response.raise_for_status()
+        content_type = response.headers.get('content-type', '')
+
+        async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+            # Тело считается обрезанным, только если после лимита приходят еще данные
+            if max_bytes is not None and len(received) + len(chunk) > max_bytes:
+                chunk = chunk[:max_bytes - len(received)]
+                if chunk:
+                    received.extend(chunk)
+                    on_chunk(chunk)
+                truncated = True
+                logger.warning("Достигнут лимит %s байт при загрузке %s", max_bytes, url)
+                break
+
+            received.extend(chunk)
+            if on_chunk(chunk):
+                break
+
+    content = bytes(received)
+
+    # Тело, обрезанное по max_bytes, не кэшируется: fetch вернул бы его как полный ответ
+    if use_cache and not truncated and response.status_code == 200 and (cache_filter is None or cache_filter(content)):
+        await response_cache.set(url, response.status_code, {'content-type': content_type}, content)
+
+    return content
@@ -0,0 +1,139 @@
+"""
+Пул процессов для разбора HTML-страниц маркетплейсов.
+
+Разбор загруженных страниц - чистая работа процессора на Python, и в
+цикле событий она задерживает обработку сообщений всех пользователей.
+Поэтому разбор выполняется в отдельных процессах (ProcessPoolExecutor).
+Процессы запускаются заранее, и в них сразу импортируются lxml и
+экстракторы, поэтому первый разбор не тратит время на импорт. Число
+одновременно переданных в пул задач ограничено, остальные ожидают
+своей очереди в цикле событий, не накапливаясь в очереди пула.
+"""
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from dotenv import load_dotenv
+
+# Загрузка переменных окружения
+load_dotenv()
+
+# Количество процессов (0 - разбирать страницы в текущем процессе)
+PARSE_POOL_WORKERS = int(os.getenv('PARSE_POOL_WORKERS', str(min(4, os.cpu_count() or 1))))
+# Максимальное количество задач, одновременно переданных в пул
+PARSE_POOL_MAX_PENDING = int(os.getenv('PARSE_POOL_MAX_PENDING', str(PARSE_POOL_WORKERS * 2 or 1)))
+# Способ запуска процессов: spawn не наследует соединения и состояние бота
+PARSE_POOL_START_METHOD = os.getenv('PARSE_POOL_START_METHOD', 'spawn')
+
+
+def _warm_up():
+    """Инициализация процесса пула: импорт парсеров и компиляция селекторов."""
+    from lxml import etree  # noqa: F401
+    from parser.yandex_extractor import YandexPageExtractor
+
+    # Разбор пустой страницы создает парсер lxml и разбирает все селекторы
+    extractor = YandexPageExtractor()
+    extractor.feed(b'<html></html>')
+    extractor.close()
+
+
+def _ping():
+    return os.getpid()
+
+
+class ParsePool:
+    """Пул процессов для разбора страниц с ограничением числа ожидающих задач."""
+
+    def __init__(self, workers=PARSE_POOL_WORKERS, max_pending=PARSE_POOL_MAX_PENDING,
+                 start_method=PARSE_POOL_START_METHOD):
+        """
+        Args:
+            workers: Количество процессов (0 - выполнять задачи в текущем процессе)
+            max_pending: Максимальное количество задач, одновременно переданных в пул
+            start_method: Способ запуска процессов (spawn, forkserver, fork)
+        """
+        self.workers = workers
+        self.max_pending = max_pending
+        self.start_method = start_method
+
+        self._executor = None
+        self._semaphore = None
+
+        # Счетчики
+        self.submitted = 0
+        self.waited = 0
+        self.restarts = 0
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(self.start_method),
+                initializer=_warm_up
+            )
+        return self._executor
+
+    def _get_semaphore(self):
+        # Семафор создается в цикле событий, в котором используется пул
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_pending)
+        return self._semaphore
+
+    async def start(self):
+        """Запустить процессы пула заранее, чтобы первый разбор не ждал их запуска."""
+        if not self.enabled:
+            return
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        await asyncio.gather(*[loop.run_in_executor(executor, _ping) for _ in range(self.workers)])
+
+    async def run(self, func, *args):
+        """
+        Выполнить функцию в пуле процессов.
+
+        Функция и аргументы должны поддерживать pickle. Если пул отключен,
+        функция выполняется в текущем процессе.
+        """
+        if not self.enabled:
+            return func(*args)
+
+        semaphore = self._get_semaphore()
+        if semaphore.locked():
+            self.waited += 1
+
+        async with semaphore:
+            self.submitted += 1
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(self._get_executor(), func, *args)
+            except BrokenProcessPool:
+                # Процесс пула аварийно завершился - пересоздаем пул для следующих задач
+                self.restarts += 1
+                self.shutdown(wait=False)
+                raise
+
+    def shutdown(self, wait=True):
+        """Остановить процессы пула."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+    def stats(self):
+        """Получить статистику пула."""
+        return {
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'submitted': self.submitted,
+            'waited': self.waited,
+            'restarts': self.restarts
+        }
+
+
+# Общий пул разбора страниц
+parse_pool = ParsePool()
@@ -0,0 +1,210 @@
+"""
+Общее для процесса ограничение частоты запросов к хостам маркетплейсов.
+
+Для каждого хоста используется "ведро токенов": запросы ждут своей
+очереди в ограниченной очереди. После капчи все запросы к хосту
+приостанавливаются на время охлаждения, которое растет с каждой
+следующей капчей подряд. Если капчи повторяются, срабатывает
+предохранитель (circuit breaker), и новые запросы сразу завершаются
+ошибкой, пока хост не "остынет". Запрос ждет разрешения не дольше
+max_wait секунд: если разрешение не успеет освободиться за это время,
+запрос сразу завершается ошибкой, а не занимает очередь.
+"""
+import os
+import time
+import asyncio
+import logging
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+# Загрузка переменных окружения
+load_dotenv()
+
+# Ограничения по хостам: {хост: (запросов в секунду, размер "пачки")}
+# Формат переменной окружения: "market.yandex.ru=0.5:2,card.wb.ru=10:20"
+DEFAULT_HOST_RATE_LIMITS = {
+    'market.yandex.ru': (0.5, 2),
+}
+
+RATE_LIMIT_MAX_QUEUE = int(os.getenv('RATE_LIMIT_MAX_QUEUE', '50'))
+RATE_LIMIT_MAX_WAIT = float(os.getenv('RATE_LIMIT_MAX_WAIT', '30'))  # секунды
+CAPTCHA_BASE_COOLDOWN = float(os.getenv('CAPTCHA_BASE_COOLDOWN', '10'))  # секунды
+CAPTCHA_MAX_COOLDOWN = float(os.getenv('CAPTCHA_MAX_COOLDOWN', '300'))  # секунды
+CIRCUIT_BREAKER_THRESHOLD = int(os.getenv('CIRCUIT_BREAKER_THRESHOLD', '3'))  # капч подряд
+CIRCUIT_BREAKER_TIMEOUT = float(os.getenv('CIRCUIT_BREAKER_TIMEOUT', '120'))  # секунды
+
+
+def parse_host_rate_limits(value):
+    """Разобрать строку вида "host=rate:burst,host=rate:burst" в словарь."""
+    host_limits = {}
+    for item in value.split(','):
+        if '=' not in item:
+            continue
+        host, limit = item.split('=', 1)
+        rate, _, burst = limit.partition(':')
+        host_limits[host.strip()] = (float(rate), int(burst or 1))
+    return host_limits
+
+
+HOST_RATE_LIMITS = dict(DEFAULT_HOST_RATE_LIMITS, **parse_host_rate_limits(os.getenv('HOST_RATE_LIMITS', '')))
+
+
+class RateLimitExceeded(Exception):
+    """Запрос отклонен: очередь к хосту переполнена, сработал предохранитель или ожидание слишком долгое."""
+
+
+class HostRateLimiter:
+    """Ограничитель частоты запросов к одному хосту с адаптивным охлаждением после капчи."""
+
+    def __init__(self, host, rate, burst, max_queue=RATE_LIMIT_MAX_QUEUE, max_wait=RATE_LIMIT_MAX_WAIT,
+                 base_cooldown=CAPTCHA_BASE_COOLDOWN, max_cooldown=CAPTCHA_MAX_COOLDOWN,
+                 breaker_threshold=CIRCUIT_BREAKER_THRESHOLD, breaker_timeout=CIRCUIT_BREAKER_TIMEOUT):
+        self.host = host
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.breaker_threshold = breaker_threshold
+        self.breaker_timeout = breaker_timeout
+
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+        self._waiting = 0
+
+        self.cooldown = 0.0
+        self._cooldown_until = 0.0
+        self._consecutive_captchas = 0
+        self._circuit_open_until = 0.0
+
+        # Счетчики
+        self.granted = 0
+        self.rejected = 0
+        self.captchas = 0
+
+    @property
+    def circuit_open(self):
+        """Предохранитель сработал, и запросы к хосту отклоняются."""
+        return time.monotonic() < self._circuit_open_until
+
+    async def acquire(self, max_wait=None):
+        """
+        Дождаться разрешения на запрос к хосту.
+
+        Args:
+            max_wait: Максимальное время ожидания в секундах (по умолчанию self.max_wait)
+
+        Raises:
+            RateLimitExceeded: Если очередь переполнена, сработал предохранитель
+                или разрешение не будет получено за max_wait секунд
+        """
+        if max_wait is None:
+            max_wait = self.max_wait
+        if self.circuit_open:
+            self._reject_circuit_open()
+        if self._waiting >= self.max_queue:
+            self.rejected += 1
+            raise RateLimitExceeded(f"{self.host}: очередь запросов переполнена")
+
+        deadline = time.monotonic() + max_wait
+        self._waiting += 1
+        try:
+            # asyncio.Lock выдает доступ в порядке очереди
+            try:
+                await asyncio.wait_for(self._lock.acquire(), max_wait)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise RateLimitExceeded(f"{self.host}: очередь запросов не освободилась за {max_wait:.0f} с")
+
+            try:
+                while True:
+                    if self.circuit_open:
+                        self._reject_circuit_open()
+
+                    now = time.monotonic()
+                    if now < self._cooldown_until:
+                        # Хост "остывает" после капчи
+                        delay = self._cooldown_until - now
+                    else:
+                        self._refill(now)
+                        if self._tokens >= 1:
+                            self._tokens -= 1
+                            self.granted += 1
+                            return
+                        delay = (1 - self._tokens) / self.rate
+
+                    # Не держим очередь, если разрешение не успеет освободиться
+                    if now + delay > deadline:
+                        self.rejected += 1
+                        raise RateLimitExceeded(
+                            f"{self.host}: разрешение на запрос освободится через {delay:.0f} с"
+                        )
+                    await asyncio.sleep(delay)
+            finally:
+                self._lock.release()
+        finally:
+            self._waiting -= 1
+
+    def _reject_circuit_open(self):
+        self.rejected += 1
+        remaining = self._circuit_open_until - time.monotonic()
+        raise RateLimitExceeded(
+            f"{self.host}: запросы приостановлены после повторных капч еще на {max(remaining, 0):.0f} с"
+        )
+
+    def report_captcha(self):
+        """Сообщить о капче: все запросы к хосту приостанавливаются на время охлаждения."""
+        now = time.monotonic()
+        self.captchas += 1
+        self._consecutive_captchas += 1
+
+        # Время охлаждения удваивается с каждой капчей подряд
+        self.cooldown = min(self.max_cooldown, self.base_cooldown * 2 ** (self._consecutive_captchas - 1))
+        self._cooldown_until = max(self._cooldown_until, now + self.cooldown)
+        self._tokens = 0.0
+        self._updated_at = now
+
+        if self._consecutive_captchas >= self.breaker_threshold:
+            self._circuit_open_until = now + self.breaker_timeout
+            logger.warning("Предохранитель для %s сработал на %.0f секунд", self.host, self.breaker_timeout)
+
+    def report_success(self):
+        """Сообщить об успешном ответе: охлаждение сбрасывается."""
+        self._consecutive_captchas = 0
+        self.cooldown = 0.0
+
+    def stats(self):
+        """Получить статистику ограничителя."""
+        return {
+            'host': self.host,
+            'granted': self.granted,
+            'rejected': self.rejected,
+            'captchas': self.captchas,
+            'waiting': self._waiting,
+            'cooldown': self.cooldown,
+            'circuit_open': self.circuit_open
+        }
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+
+# Ограничители по хостам, создаются при первом обращении
+_limiters = {}
+
+
+def get_rate_limiter(host):
+    """Получить ограничитель для хоста (None, если для хоста нет ограничений)."""
+    if host not in HOST_RATE_LIMITS:
+        return None
+    limiter = _limiters.get(host)
+    if limiter is None:
+        rate, burst = HOST_RATE_LIMITS[host]
+        limiter = HostRateLimiter(host, rate, burst)
+        _limiters[host] = limiter
+    return limiter
@@ -1,13 +1,14 @@
 import os
 import re
 import json
-import requests
-import time
 import random
+import asyncio
 from dotenv import load_dotenv
 from urllib.parse import urlparse
 from fake_useragent import UserAgent
 
+from parser.http_client import fetch
+
 # Загрузка переменных из .env файла
 load_dotenv()
 
@@ -17,6 +18,17 @@ ua = UserAgent()
 # Пример URL товара Wildberries
 PRODUCT_URL = "https://www.wildberries.ru/catalog/194573148/detail.aspx?targetUrl=SG"
 
+# Адрес Card API и параметры пакетных запросов
+CARD_API_URL = "https://card.wb.ru/cards/detail"
+CARD_API_BATCH_SIZE = int(os.getenv('WB_CARD_BATCH_SIZE', '50'))  # максимум nmID в одном запросе
+CARD_API_BATCH_WINDOW = float(os.getenv('WB_CARD_BATCH_WINDOW', '0.05'))  # окно сбора пакета, секунды
+# Количество попыток запроса к Card API
+CARD_API_MAX_RETRIES = 3
+
+class CardApiError(Exception):
+    """Card API не ответил после всех попыток."""
+    pass
+
 def extract_nm_id_from_url(url):
     """
     Извлекает nmID (ID товара) из URL Wildberries
@@ -41,16 +53,20 @@ def extract_nm_id_from_url(url):
     # Возвращаем None, если не удалось извлечь ID
     return None
 
-def get_product_info_from_card_api(nm_id):
+async def get_products_info_from_card_api(nm_ids, max_retries=CARD_API_MAX_RETRIES):
     """
-    Получает информацию о товаре через официальный публичный Card API
+    Получает информацию о нескольких товарах одним запросом к Card API
     
-    nm_id: ID номенклатуры товара в системе Wildberries
+    nm_ids: список ID номенклатуры товаров (Card API принимает их через ';')
+    max_retries: количество попыток
     
-    Реализует механизм повторных запросов с новым User-Agent при каждой попытке.
+    Возвращает словарь {nm_id: данные товара}; товары, которых нет в ответе,
+    в словарь не попадают. Реализует механизм повторных запросов с новым
+    User-Agent при каждой попытке; если все попытки неудачны, вызывает
+    CardApiError.
     """
-    url = f"https://card.wb.ru/cards/detail?nm={nm_id}&appType=1&curr=rub&dest=-1257786"
-    max_retries = 3
+    nm_ids = [str(nm_id) for nm_id in nm_ids]
+    url = f"{CARD_API_URL}?nm={';'.join(nm_ids)}&appType=1&curr=rub&dest=-1257786"
     retry_count = 0
     
     while retry_count < max_retries:
@@ -65,22 +81,31 @@ def get_product_info_from_card_api(nm_id):
                 'User-Agent': current_ua,
                 'Accept': 'application/json',
                 'Origin': 'https://www.wildberries.ru',
-                'Referer': f'https://www.wildberries.ru/catalog/{nm_id}/detail.aspx'
+                'Referer': f'https://www.wildberries.ru/catalog/{nm_ids[0]}/detail.aspx'
             }
             
-            response = requests.get(url, headers=headers, timeout=30)
+            # Адрес пакетного запроса содержит весь набор nmID и почти не повторяется,
+            # поэтому в кэш ответов попадают только запросы одного товара
+            # (результаты по отдельным товарам кэширует product_cache)
+            response = await fetch(url, headers=headers, cache=len(nm_ids) == 1)
             print(f"Код ответа Card API: {response.status_code}")
             
             if response.status_code == 200:
                 data = response.json()
                 
                 if not data.get("data") or not data["data"].get("products") or not data["data"]["products"]:
-                    print(f"Информация о товаре с nmID {nm_id} не найдена в Card API")
-                    return None
+                    print(f"Информация о товарах с nmID {', '.join(nm_ids)} не найдена в Card API")
+                    return {}
+                
+                # Раскладываем товары из ответа по их nmID
+                products = {}
+                for product in data["data"]["products"]:
+                    product_id = str(product.get("id"))
+                    if product_id in nm_ids and product_id not in products:
+                        products[product_id] = product
+                        print(f"Информация о товаре получена из Card API: {product.get('name')}")
                 
-                product = data["data"]["products"][0]
-                print(f"Информация о товаре получена из Card API: {product.get('name')}")
-                return product
+                return products
             else:
                 print(f"Ошибка получения данных из Card API: {response.status_code}")
                 retry_count += 1
@@ -89,11 +114,13 @@ def get_product_info_from_card_api(nm_id):
                     # Случайная задержка перед повторной попыткой от 1 до 3 секунд
                     delay = random.uniform(1, 3)
                     print(f"Повторная попытка через {delay:.2f} секунд...")
-                    time.sleep(delay)
+                    await asyncio.sleep(delay)
                 else:
                     print("Исчерпано максимальное количество попыток")
-                    return None
+                    raise CardApiError(f"Card API ответил кодом {response.status_code}")
                 
+        except CardApiError:
+            raise
         except Exception as e:
             print(f"Ошибка при получении информации через Card API: {str(e)}")
             retry_count += 1
@@ -102,14 +129,141 @@ def get_product_info_from_card_api(nm_id):
                 # Случайная задержка перед повторной попыткой от 2 до 5 секунд
                 delay = random.uniform(2, 5)
                 print(f"Повторная попытка через {delay:.2f} секунд...")
-                time.sleep(delay)
+                await asyncio.sleep(delay)
             else:
                 print("Исчерпано максимальное количество попыток")
-                return None
+                raise CardApiError(str(e)) from e
     
-    return None
+    raise CardApiError("Исчерпано максимальное количество попыток")
+
+class CardApiBatcher:
+    """
+    Собирает одиночные запросы товаров в пакеты для Card API.
+    
+    Запросы, пришедшие в течение короткого окна, отправляются одним
+    HTTP-запросом (не более max_batch_size nmID), а каждый вызывающий
+    получает свой результат через отдельный future.
+    
+    Пакет запрашивается одной попыткой. Если она неудачна, каждый товар
+    пакета запрашивается отдельно со своими повторными попытками, поэтому
+    ошибка одного товара не достается остальным вызывающим. Если товар не
+    удалось получить, вызывающий получает None.
+    """
+    
+    def __init__(self, max_batch_size=CARD_API_BATCH_SIZE, batch_window=CARD_API_BATCH_WINDOW):
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        
+        # Структура: {nm_id: [future, ...]}
+        self._pending = {}
+        self._flush_handle = None
+        self._tasks = set()
+        
+        # Счетчики
+        self.requested = 0
+        self.batches = 0
+        self.fallbacks = 0
+    
+    async def get(self, nm_id):
+        """Получить информацию о товаре (None, если товар не найден)."""
+        nm_id = str(nm_id)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(nm_id, []).append(future)
+        self.requested += 1
+        
+        if len(self._pending) >= self.max_batch_size:
+            # Пакет заполнен - отправляем сразу
+            self._start_flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._start_flush)
+        
+        return await future
+    
+    def _start_flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        
+        if not self._pending:
+            return
+        
+        pending, self._pending = self._pending, {}
+        task = asyncio.ensure_future(self._flush(pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _flush(self, pending):
+        self.batches += 1
+        if len(pending) == 1:
+            await self._fetch_single(*pending.items())
+            return
+        
+        try:
+            products = await get_products_info_from_card_api(list(pending), max_retries=1)
+        except Exception as e:
+            # Повторяются только запросы отдельных товаров
+            print(f"Пакетный запрос к Card API не выполнен ({e}), товары запрашиваются по отдельности")
+            self.fallbacks += 1
+            await asyncio.gather(*(self._fetch_single(item) for item in pending.items()))
+            return
+        
+        for nm_id, futures in pending.items():
+            self._resolve(futures, products.get(nm_id))
+    
+    async def _fetch_single(self, item):
+        nm_id, futures = item
+        try:
+            products = await get_products_info_from_card_api([nm_id])
+        except Exception as e:
+            print(f"Не удалось получить товар {nm_id} из Card API: {e}")
+            products = {}
+        self._resolve(futures, products.get(nm_id))
+    
+    @staticmethod
+    def _resolve(futures, product):
+        for future in futures:
+            if not future.done():
+                future.set_result(product)
+    
+    def stats(self):
+        """Получить статистику пакетной обработки."""
+        return {
+            'requested': self.requested,
+            'batches': self.batches,
+            'fallbacks': self.fallbacks,
+            'pending': len(self._pending)
+        }
+
+# Общий пакетировщик запросов к Card API
+card_api_batcher = CardApiBatcher()
+
+async def get_product_info_from_card_api(nm_id):
+    """
+    Получает информацию о товаре через официальный публичный Card API
+    
+    nm_id: ID номенклатуры товара в системе Wildberries
+    
+    Запрос объединяется с другими запросами, пришедшими одновременно,
+    и отправляется пакетом через card_api_batcher.
+    """
+    return await card_api_batcher.get(nm_id)
+
+async def get_products_info(nm_ids):
+    """
+    Получает информацию о нескольких товарах (например, при обновлении цен корзины)
+    
+    nm_ids: список ID номенклатуры товаров
+    
+    Товары запрашиваются через card_api_batcher: пакетами вместе с другими
+    одновременными запросами, а ошибка одного товара не влияет на остальные.
+    Возвращает словарь {nm_id: данные товара или None}.
+    """
+    nm_ids = list(dict.fromkeys(str(nm_id) for nm_id in nm_ids))
+    products = await asyncio.gather(*(card_api_batcher.get(nm_id) for nm_id in nm_ids))
+    return dict(zip(nm_ids, products))
 
-def parse_and_display_product_info(url):
+async def parse_and_display_product_info(url):
     """Анализирует URL, получает и отображает информацию о товаре"""
     
     # Извлечение nmID товара из URL
@@ -122,7 +276,7 @@ def parse_and_display_product_info(url):
     print(f"Извлечен nmID товара: {nm_id}")
     
     # Получаем информацию из Card API
-    card_data = get_product_info_from_card_api(nm_id)
+    card_data = await get_product_info_from_card_api(nm_id)
     
     # Проверяем, удалось ли получить данные
     if not card_data:
@@ -203,4 +357,4 @@ if __name__ == "__main__":
     print("Парсер товаров Wildberries (официальный API)")
     print(f"Анализ URL: {PRODUCT_URL}")
     
-    parse_and_display_product_info(PRODUCT_URL)
\ No newline at end of file
+    asyncio.run(parse_and_display_product_info(PRODUCT_URL))
\ No newline at end of file
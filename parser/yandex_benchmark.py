@@ -0,0 +1,230 @@
+"""
+Сравнение извлечения данных со страниц Яндекс.Маркета: прежний разбор
+через BeautifulSoup и отдельные soup.select для каждого селектора против
+однопроходного извлечения parser/yandex_extractor.py.
+
+Использование:
+    python -m parser.yandex_benchmark page1.html [page2.html ...]
+
+Для каждой сохраненной страницы выводятся время CPU, пиковый прирост
+памяти процесса (RSS) и совпадение результатов. Каждый вариант
+запускается в отдельном процессе, чтобы измерения памяти не влияли
+друг на друга. Без аргументов используется синтетическая страница.
+"""
+import re
+import sys
+import json
+import time
+import resource
+import multiprocessing
+
+from bs4 import BeautifulSoup
+
+from parser.yandex_extractor import extract_product_data
+
+# Количество повторов для измерения времени
+REPEATS = 5
+
+
+def extract_product_data_soup(html_content, marketplace_name="Яндекс.Маркет"):
+    """Прежняя реализация извлечения данных (BeautifulSoup + soup.select)."""
+    soup = BeautifulSoup(html_content, 'html.parser')
+    
+    result = {
+        'title': "Название не найдено",
+        'image_url': None,
+        'price': None,
+        'description': None,
+        'marketplace': marketplace_name,
+        'captcha_detected': False
+    }
+    
+    # Извлечение названия товара
+    title_element = soup.select_one('h1')
+    if title_element:
+        result['title'] = title_element.text.strip()
+    
+    # Пытаемся найти данные в JSON-LD
+    json_ld = soup.select('script[type="application/ld+json"]')
+    for script in json_ld:
+        try:
+            data = json.loads(script.string)
+            if '@type' in data and data['@type'] == 'Product':
+                if 'name' in data:
+                    result['title'] = data['name']
+                if 'image' in data:
+                    if isinstance(data['image'], list) and data['image']:
+                        result['image_url'] = data['image'][0]
+                    else:
+                        result['image_url'] = data['image']
+                # Проверяем наличие акционной цены в JSON-LD
+                if 'offers' in data:
+                    if 'lowPrice' in data['offers']:  # Самая низкая цена в предложениях
+                        result['price'] = data['offers']['lowPrice']
+                    elif 'price' in data['offers']:  # Обычная цена
+                        result['price'] = data['offers']['price']
+                if 'description' in data:
+                    result['description'] = data['description']
+                break
+        except (json.JSONDecodeError, KeyError):
+            pass
+    
+    # Если изображение не найдено, ищем в HTML с использованием разных селекторов
+    if not result['image_url']:
+        image_selectors = [
+            '.cia-cs img', 
+            '.n-gallery__image', 
+            'img._2gUfn', 
+            'img[src*="marketpic"]',
+            'img.preview-picture',
+            'img[src*="thumbnail"]',
+            '.image img',
+            'img.logo-image',
+            'img.image',
+            'img[data-tid="bb42d11f"]'
+        ]
+        
+        for selector in image_selectors:
+            img_elements = soup.select(selector)
+            for img in img_elements:
+                if img.has_attr('src'):
+                    result['image_url'] = img['src']
+                    break
+                elif img.has_attr('data-src'):
+                    result['image_url'] = img['data-src']
+                    break
+            
+            if result['image_url']:
+                break
+    
+    # Если цена не найдена, ищем в HTML
+    if not result['price']:
+        # Сначала ищем акционную цену
+        discount_price_selectors = [
+            'span[data-auto="offer-price-value"]',
+            '.Price-root_discount',
+            'span.Price_role_discount',
+            'span._3NaXx._33ZFz',
+            'span[data-auto="price-value"].Price_discount',
+            'span[data-tid="c3eacd93"].Price_discount'
+        ]
+        
+        # Проверяем селекторы со скидочной ценой
+        for selector in discount_price_selectors:
+            price_element = soup.select_one(selector)
+            if price_element:
+                try:
+                    # Удаление всех нецифровых символов, кроме точки
+                    price_text = re.sub(r'[^\d.]', '', price_element.text.replace(',', '.'))
+                    result['price'] = float(price_text)
+                    print(f"Найдена акционная цена: {result['price']}")
+                    break
+                except (ValueError, TypeError):
+                    pass
+        
+        # Если акционная цена не найдена, ищем обычную цену
+        if not result['price']:
+            price_selectors = [
+                'span[data-auto="price-value"]',
+                '.price-value',
+                '.price_value',
+                'span._1f9xN',
+                'span._3NaXx._3kWlK',
+                'div[data-tid="c3eacd93"]',
+                'span[data-auto="mainPrice"]'
+            ]
+            
+            for selector in price_selectors:
+                price_element = soup.select_one(selector)
+                if price_element:
+                    try:
+                        # Удаление всех нецифровых символов, кроме точки
+                        price_text = re.sub(r'[^\d.]', '', price_element.text.replace(',', '.'))
+                        result['price'] = float(price_text)
+                        print(f"Найдена обычная цена: {result['price']}")
+                        break
+                    except (ValueError, TypeError):
+                        pass
+    
+    # Если описание не найдено, ищем в HTML
+    if not result['description']:
+        desc_selectors = [
+            'div[data-auto="product-description"]',
+            '.n-product-description-text',
+            'div[data-tid="eee60a47"]',
+            'div.specifications-tab'
+        ]
+        
+        for selector in desc_selectors:
+            desc_element = soup.select_one(selector)
+            if desc_element:
+                result['description'] = desc_element.text.strip()
+                break
+    
+    return result
+
+
+def make_synthetic_page(blocks=20000):
+    """Создать большую страницу без JSON-LD, где данные ищутся по селекторам."""
+    filler = ''.join(
+        f'<div class="card"><span class="label">Товар {i}</span>'
+        f'<a href="/p/{i}"><img data-src="/img/{i}.jpg"></a></div>'
+        for i in range(blocks)
+    )
+    return (
+        '<html><head><title>Товар</title></head><body>'
+        '<h1> Сковорода с крышкой </h1>'
+        f'{filler}'
+        '<div class="n-gallery__image" src="https://avatars.mds.yandex.net/marketpic/1.jpg"></div>'
+        '<span data-auto="price-value">2 499 ₽</span>'
+        '<div data-auto="product-description"> Литая сковорода <b>26 см</b> </div>'
+        '</body></html>'
+    )
+
+
+def _measure(name, html, queue):
+    extractor = extract_product_data_soup if name == 'bs4' else extract_product_data
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    cpu_started = time.process_time()
+    for _ in range(REPEATS):
+        result = extractor(html)
+    cpu_time = (time.process_time() - cpu_started) / REPEATS
+
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((cpu_time, rss_after - rss_before, result))
+
+
+def measure(name, html):
+    """Измерить вариант извлечения в отдельном процессе."""
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_measure, args=(name, html, queue))
+    process.start()
+    cpu_time, rss_delta, result = queue.get()
+    process.join()
+    return cpu_time, rss_delta, result
+
+
+def main():
+    pages = []
+    for path in sys.argv[1:]:
+        with open(path, 'rb') as f:
+            pages.append((path, f.read().decode('utf-8', errors='replace')))
+    if not pages:
+        pages.append(('synthetic', make_synthetic_page()))
+
+    for path, html in pages:
+        soup_cpu, soup_rss, soup_result = measure('bs4', html)
+        lxml_cpu, lxml_rss, lxml_result = measure('lxml', html)
+
+        print(f"\n{path} ({len(html.encode('utf-8')) / 1024:.0f} КБ)")
+        print(f"  BeautifulSoup: CPU {soup_cpu * 1000:.1f} мс, прирост RSS {soup_rss / 1024:.1f} МБ")
+        print(f"  Один проход:   CPU {lxml_cpu * 1000:.1f} мс, прирост RSS {lxml_rss / 1024:.1f} МБ")
+        print(f"  Ускорение: x{soup_cpu / lxml_cpu:.1f}" if lxml_cpu else "  Ускорение: -")
+        print(f"  Результаты совпадают: {'да' if soup_result == lxml_result else 'нет'}")
+        if soup_result != lxml_result:
+            print(json.dumps({'bs4': soup_result, 'lxml': lxml_result}, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,505 @@
+"""
+Однопроходное извлечение данных о товаре со страницы Яндекс.Маркета.
+
+Вместо построения полного дерева BeautifulSoup и отдельного обхода для
+каждого CSS-селектора документ разбирается потоковым парсером lxml
+(HTMLPullParser) за один проход: заголовок h1, блоки JSON-LD и первые
+совпадения всех селекторов изображения, цены и описания собираются
+одновременно. Уже обработанные элементы удаляются из дерева, поэтому
+память не растет вместе с размером страницы.
+"""
+import re
+import json
+
+from lxml import etree
+
+# Селекторы в порядке приоритета (как в YandexMarketParser.parse)
+IMAGE_SELECTORS = [
+    '.cia-cs img',
+    '.n-gallery__image',
+    'img._2gUfn',
+    'img[src*="marketpic"]',
+    'img.preview-picture',
+    'img[src*="thumbnail"]',
+    '.image img',
+    'img.logo-image',
+    'img.image',
+    'img[data-tid="bb42d11f"]'
+]
+
+DISCOUNT_PRICE_SELECTORS = [
+    'span[data-auto="offer-price-value"]',
+    '.Price-root_discount',
+    'span.Price_role_discount',
+    'span._3NaXx._33ZFz',
+    'span[data-auto="price-value"].Price_discount',
+    'span[data-tid="c3eacd93"].Price_discount'
+]
+
+PRICE_SELECTORS = [
+    'span[data-auto="price-value"]',
+    '.price-value',
+    '.price_value',
+    'span._1f9xN',
+    'span._3NaXx._3kWlK',
+    'div[data-tid="c3eacd93"]',
+    'span[data-auto="mainPrice"]'
+]
+
+DESCRIPTION_SELECTORS = [
+    'div[data-auto="product-description"]',
+    '.n-product-description-text',
+    'div[data-tid="eee60a47"]',
+    'div.specifications-tab'
+]
+
+# Текст страницы с капчей
+CAPTCHA_MARKER = "Подтвердите, что запросы отправляли вы"
+CAPTCHA_MARKER_BYTES = CAPTCHA_MARKER.encode('utf-8')
+
+# Размер части документа, передаваемой парсеру за один раз
+FEED_CHUNK_SIZE = 64 * 1024
+
+# Части простого CSS-селектора: тег, .класс, [атрибут="значение"], [атрибут*="значение"]
+_SELECTOR_PART_RE = re.compile(r'^[\w-]+|\.[\w-]+|\[([\w-]+)(\*?=)"([^"]*)"\]')
+
+
+# Начало блока JSON-LD в исходном HTML
+_JSON_LD_START_RE = re.compile(rb'<script[^>]*type=["\']?application/ld\+json["\']?[^>]*>', re.I)
+_SCRIPT_END_RE = re.compile(rb'</script', re.I)
+# Максимальная длина открывающего тега, который может быть разорван между частями
+_MAX_TAG_LENGTH = 512
+
+
+def parse_json_ld_product(text):
+    """
+    Разобрать блок JSON-LD.
+
+    Returns:
+        Словарь с данными о товаре (title, image_url, price, description)
+        или None, если блок не описывает товар
+    """
+    try:
+        data = json.loads(text)
+        if '@type' in data and data['@type'] == 'Product':
+            product = {}
+            if 'name' in data:
+                product['title'] = data['name']
+            if 'image' in data:
+                if isinstance(data['image'], list) and data['image']:
+                    product['image_url'] = data['image'][0]
+                else:
+                    product['image_url'] = data['image']
+            # Проверяем наличие акционной цены в JSON-LD
+            if 'offers' in data:
+                if 'lowPrice' in data['offers']:  # Самая низкая цена в предложениях
+                    product['price'] = data['offers']['lowPrice']
+                elif 'price' in data['offers']:  # Обычная цена
+                    product['price'] = data['offers']['price']
+            if 'description' in data:
+                product['description'] = data['description']
+            return product
+    except (ValueError, TypeError, KeyError):
+        pass
+    return None
+
+
+def is_complete_product(product):
+    """Блок JSON-LD содержит название, изображение, цену и описание товара."""
+    if not product:
+        return False
+    return bool(product.get('title') and product.get('image_url')
+                and product.get('price') and product.get('description'))
+
+
+class CompoundSelector:
+    """Простой селектор без комбинаторов: тег, классы и условия на атрибуты."""
+
+    __slots__ = ('tag', 'classes', 'attributes')
+
+    def __init__(self, selector):
+        self.tag = None
+        self.classes = []
+        self.attributes = []
+
+        position = 0
+        while position < len(selector):
+            match = _SELECTOR_PART_RE.match(selector, position)
+            if not match or match.end() == position:
+                raise ValueError(f"Неподдерживаемый селектор: {selector}")
+            part = match.group(0)
+            if part.startswith('.'):
+                self.classes.append(part[1:])
+            elif part.startswith('['):
+                self.attributes.append((match.group(1), match.group(2), match.group(3)))
+            else:
+                self.tag = part
+            position = match.end()
+
+    def matches(self, tag, attrib, classes):
+        if self.tag is not None and self.tag != tag:
+            return False
+        for class_name in self.classes:
+            if class_name not in classes:
+                return False
+        for name, operator, value in self.attributes:
+            attr_value = attrib.get(name)
+            if attr_value is None:
+                return False
+            if operator == '=' and attr_value != value:
+                return False
+            if operator == '*=' and value not in attr_value:
+                return False
+        return True
+
+
+class Selector:
+    """Селектор из одного простого селектора или пары "предок потомок"."""
+
+    __slots__ = ('ancestor', 'target')
+
+    def __init__(self, selector):
+        parts = selector.split()
+        if len(parts) > 2:
+            raise ValueError(f"Неподдерживаемый селектор: {selector}")
+        self.ancestor = CompoundSelector(parts[0]) if len(parts) == 2 else None
+        self.target = CompoundSelector(parts[-1])
+
+
+class YandexPageExtractor:
+    """
+    Извлекает данные о товаре из HTML за один проход.
+
+    Документ можно передавать частями через feed(); после close()
+    результат возвращает build_result().
+    """
+
+    def __init__(self):
+        self._parser = etree.HTMLPullParser(events=('start', 'end'), encoding='utf-8')
+
+        self._image_selectors = [Selector(s) for s in IMAGE_SELECTORS]
+        self._discount_selectors = [Selector(s) for s in DISCOUNT_PRICE_SELECTORS]
+        self._price_selectors = [Selector(s) for s in PRICE_SELECTORS]
+        self._description_selectors = [Selector(s) for s in DESCRIPTION_SELECTORS]
+
+        # Все селекторы, у которых есть предок, и счетчики открытых предков для них
+        self._ancestor_selectors = [
+            selector
+            for group in (self._image_selectors, self._discount_selectors,
+                          self._price_selectors, self._description_selectors)
+            for selector in group if selector.ancestor is not None
+        ]
+        self._open_ancestors = {id(selector): 0 for selector in self._ancestor_selectors}
+
+        # Стек открытых элементов: (селекторы, для которых элемент - предок,
+        # список [(группа, индекс), ...] данных, ожидающих текст элемента)
+        self._stack = []
+        # Количество открытых элементов, текст которых нужно сохранить целиком
+        self._capture_depth = 0
+
+        # Собранные данные
+        self.h1_text = None
+        self.json_ld_product = None
+        self.image_urls = [None] * len(self._image_selectors)
+        self.discount_texts = [None] * len(self._discount_selectors)
+        self.price_texts = [None] * len(self._price_selectors)
+        self.description_texts = [None] * len(self._description_selectors)
+
+        self._h1_seen = False
+        self._closed = False
+
+        # Обнаружение капчи: хвост предыдущей части нужен, если маркер
+        # разорван между частями документа
+        self.captcha_detected = False
+        self._captcha_tail = b''
+        self.bytes_received = 0
+
+    @property
+    def is_complete(self):
+        """
+        Все данные о товаре уже найдены и остаток документа не нужен.
+
+        Это так, когда найден JSON-LD блок товара с названием, изображением,
+        ценой и описанием - селекторы HTML в этом случае не используются.
+        """
+        return is_complete_product(self.json_ld_product)
+
+    def feed(self, data):
+        """Передать очередную часть документа (bytes или str)."""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        if not data:
+            return
+        self.bytes_received += len(data)
+
+        if not self.captcha_detected:
+            window = self._captcha_tail + data
+            if CAPTCHA_MARKER_BYTES in window:
+                self.captcha_detected = True
+            self._captcha_tail = window[-(len(CAPTCHA_MARKER_BYTES) - 1):]
+
+        self._parser.feed(data)
+        self._process_events()
+
+    def close(self):
+        """Завершить разбор документа."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._parser.close()
+        except etree.XMLSyntaxError:
+            # Пустой или оборванный документ
+            pass
+        self._process_events()
+
+    def _process_events(self):
+        for event, element in self._parser.read_events():
+            if not isinstance(element.tag, str):
+                # Комментарии и инструкции обработки
+                continue
+            if event == 'start':
+                self._on_start(element)
+            else:
+                self._on_end(element)
+
+    def _on_start(self, element):
+        tag = element.tag
+        attrib = element.attrib
+        classes = attrib.get('class', '').split()
+        captures = []
+
+        # Изображения: первый элемент с атрибутом src или data-src
+        for index in self._select(self._image_selectors, self.image_urls, tag, attrib, classes):
+            if 'src' in attrib:
+                self.image_urls[index] = attrib['src']
+            elif 'data-src' in attrib:
+                self.image_urls[index] = attrib['data-src']
+
+        # Элементы, текст которых будет прочитан при закрытии
+        for group, selectors, found in (
+            ('discount', self._discount_selectors, self.discount_texts),
+            ('price', self._price_selectors, self.price_texts),
+            ('description', self._description_selectors, self.description_texts),
+        ):
+            for index in self._select(selectors, found, tag, attrib, classes):
+                # Отмечаем селектор как найденный, чтобы не сработать на следующих элементах
+                found[index] = ''
+                captures.append((group, index))
+
+        if tag == 'h1' and not self._h1_seen:
+            self._h1_seen = True
+            captures.append(('h1', 0))
+
+        if tag == 'script' and attrib.get('type') == 'application/ld+json' and self.json_ld_product is None:
+            captures.append(('json_ld', 0))
+
+        # Элемент становится предком для селекторов с комбинатором потомка
+        ancestor_of = []
+        for selector in self._ancestor_selectors:
+            if selector.ancestor.matches(tag, attrib, classes):
+                self._open_ancestors[id(selector)] += 1
+                ancestor_of.append(selector)
+
+        if captures:
+            self._capture_depth += 1
+
+        self._stack.append((ancestor_of, captures))
+
+    def _select(self, selectors, found, tag, attrib, classes):
+        # Индексы селекторов, для которых элемент - первое совпадение
+        indexes = []
+        for index, selector in enumerate(selectors):
+            if found[index] is not None:
+                continue
+            if selector.ancestor is not None and not self._open_ancestors[id(selector)]:
+                continue
+            if selector.target.matches(tag, attrib, classes):
+                indexes.append(index)
+        return indexes
+
+    def _on_end(self, element):
+        if not self._stack:
+            return
+        ancestor_of, captures = self._stack.pop()
+
+        for selector in ancestor_of:
+            self._open_ancestors[id(selector)] -= 1
+
+        if captures:
+            self._capture_depth -= 1
+            self._collect_text(element, captures)
+
+        # Освобождаем память: элемент больше не нужен, если не входит в захватываемый
+        if self._capture_depth == 0:
+            element.clear(keep_tail=True)
+            parent = element.getparent()
+            if parent is not None:
+                while element.getprevious() is not None:
+                    del parent[0]
+
+    def _collect_text(self, element, captures):
+        for group, index in captures:
+            if group == 'json_ld':
+                self._collect_json_ld(element.text)
+                continue
+
+            text = ''.join(element.itertext())
+            if group == 'h1':
+                self.h1_text = text
+            elif group == 'discount':
+                self.discount_texts[index] = text
+            elif group == 'price':
+                self.price_texts[index] = text
+            elif group == 'description':
+                self.description_texts[index] = text
+
+    def _collect_json_ld(self, text):
+        if self.json_ld_product is None:
+            self.json_ld_product = parse_json_ld_product(text)
+
+    def build_result(self, marketplace_name):
+        """
+        Собрать результат в формате YandexMarketParser.parse.
+
+        Приоритеты совпадают с прежней логикой: JSON-LD, затем селекторы
+        HTML в порядке их перечисления.
+        """
+        result = {
+            'title': "Название не найдено",
+            'image_url': None,
+            'price': None,
+            'description': None,
+            'marketplace': marketplace_name,
+            'captcha_detected': self.captcha_detected
+        }
+
+        if self.h1_text is not None:
+            result['title'] = self.h1_text.strip()
+
+        if self.json_ld_product:
+            result.update(self.json_ld_product)
+
+        # Если изображение не найдено в JSON-LD, берем первое совпадение селекторов
+        if not result['image_url']:
+            for image_url in self.image_urls:
+                if image_url:
+                    result['image_url'] = image_url
+                    break
+
+        # Если цена не найдена, сначала ищем акционную, затем обычную
+        if not result['price']:
+            result['price'] = self._first_price(self.discount_texts, "Найдена акционная цена")
+        if not result['price']:
+            result['price'] = self._first_price(self.price_texts, "Найдена обычная цена")
+
+        # Если описание не найдено, берем первое совпадение селекторов
+        if not result['description']:
+            for text in self.description_texts:
+                if text is not None:
+                    result['description'] = text.strip()
+                    break
+
+        return result
+
+    @staticmethod
+    def _first_price(texts, message):
+        for text in texts:
+            if text is None:
+                continue
+            try:
+                # Удаление всех нецифровых символов, кроме точки
+                price_text = re.sub(r'[^\d.]', '', text.replace(',', '.'))
+                price = float(price_text)
+                print(f"{message}: {price}")
+                return price
+            except (ValueError, TypeError):
+                pass
+        return None
+
+
+class YandexPageProbe:
+    """
+    Быстрая проверка загружаемой страницы без построения дерева.
+
+    Используется при потоковой загрузке, когда сам разбор выполняется
+    в пуле процессов: по исходным байтам определяет, что страница - это
+    капча или что блок JSON-LD товара уже загружен целиком и остаток
+    документа не нужен.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+        self._product_found = False
+        self.captcha_detected = False
+        self.is_complete = False
+
+    def feed(self, data):
+        """
+        Передать очередную часть документа.
+
+        Returns:
+            True, если дальше читать не нужно
+        """
+        captcha_start = max(0, len(self._buffer) - len(CAPTCHA_MARKER_BYTES) + 1)
+        self._buffer.extend(data)
+
+        if not self.captcha_detected and CAPTCHA_MARKER_BYTES in self._buffer[captcha_start:]:
+            self.captcha_detected = True
+
+        if not self._product_found:
+            self._scan_json_ld()
+
+        # Просмотренная часть больше не нужна, кроме хвоста для поиска маркера капчи
+        if self._product_found:
+            self._position = len(self._buffer)
+        consumed = min(self._position, len(self._buffer) - len(CAPTCHA_MARKER_BYTES) + 1)
+        if consumed > 0:
+            del self._buffer[:consumed]
+            self._position -= consumed
+
+        return self.is_complete or self.captcha_detected
+
+    def _scan_json_ld(self):
+        # Как и экстрактор, учитываем только первый блок JSON-LD с товаром
+        while True:
+            start = _JSON_LD_START_RE.search(self._buffer, self._position)
+            if start is None:
+                # Открывающий тег может быть разорван между частями
+                self._position = max(self._position, len(self._buffer) - _MAX_TAG_LENGTH)
+                return
+            end = _SCRIPT_END_RE.search(self._buffer, start.end())
+            if end is None:
+                # Блок загружен не полностью
+                self._position = start.start()
+                return
+            self._position = end.end()
+
+            product = parse_json_ld_product(bytes(self._buffer[start.end():end.start()]))
+            if product is not None:
+                self._product_found = True
+                self.is_complete = is_complete_product(product)
+                return
+
+
+def extract_product_data(html, marketplace_name="Яндекс.Маркет"):
+    """
+    Извлечь данные о товаре из HTML страницы Яндекс.Маркета.
+
+    Args:
+        html: HTML страницы (bytes в UTF-8 или str)
+        marketplace_name: Название маркетплейса для результата
+
+    Returns:
+        Словарь в формате YandexMarketParser.parse
+    """
+    if isinstance(html, str):
+        html = html.encode('utf-8')
+
+    # Документ передается частями, чтобы парсер не строил дерево целиком
+    extractor = YandexPageExtractor()
+    for offset in range(0, len(html), FEED_CHUNK_SIZE):
+        extractor.feed(html[offset:offset + FEED_CHUNK_SIZE])
+    extractor.close()
+    return extractor.build_result(marketplace_name)
@@ -2,18 +2,28 @@
 """
 Парсер для маркетплейса Яндекс.Маркет.
 """
-import requests
-import json
-import re
+import os
 import sys
-import time
 import random
-from bs4 import BeautifulSoup
+import asyncio
+from urllib.parse import urlparse
+
+import httpx
 from fake_useragent import UserAgent
 
+from parser.http_client import fetch, fetch_stream
+from parser.parse_pool import parse_pool
+from parser.rate_limiter import get_rate_limiter, RateLimitExceeded
+from parser.yandex_extractor import YandexPageProbe, extract_product_data, CAPTCHA_MARKER_BYTES
+
 # Создание объекта UserAgent для генерации случайных User-Agent
 ua = UserAgent()
 
+# Потоковая загрузка страниц с остановкой после получения данных о товаре
+YANDEX_STREAMING = os.getenv('YANDEX_STREAMING', '1') == '1'
+# Максимальный объем загружаемой страницы в байтах
+YANDEX_MAX_PAGE_BYTES = int(os.getenv('YANDEX_MAX_PAGE_BYTES', str(5 * 1024 * 1024)))
+
 # Пример URL товара Yandex Market
 PRODUCT_URL = "https://market.yandex.ru/product--ckovoroda-s-kryshkoi-alwa-26-sm-litaia-s-antiprigarnym-pokrytiem-glubokaia-tsvet-mramor/1045734577?sku=103807672220&uniqueId=28141458&do-waremd5=pu9f7cnsQkmOoIhJeGJaTw&cpc=CDmIaXQJ2nfqqHEN8sTFNX2bmdBfHeylm-8X1f1xACbYhoy57yJOnZ2FowTk6PeBFQiuNoIJLgSAfolIKBB3nR4akx-rTbPcOcRNplPT_U8IzJOS8Rgxiq-lolCaJjqENJKhkOFDcajuzFrVALBOXecAw6mm64OCIS4rqpLx_6Yct-tDThMQKQ5es_38AL_WsdyBVBtc9BBuxS-I21xVQthuZBnLKT6ZStP-vpCU-uFtySte-K_QRg%2C%2C"
 
@@ -43,8 +53,18 @@ class YandexMarketParser:
         
         return headers
     
-    def get_page_content(self, url):
-        """Получить HTML-контент страницы."""
+    async def get_page_data(self, url):
+        """
+        Загрузить страницу товара.
+        
+        В потоковом режиме (YANDEX_STREAMING) загрузка прекращается, как
+        только получен блок JSON-LD со всеми данными о товаре или
+        обнаружена капча. Объем загружаемых данных ограничен
+        YANDEX_MAX_PAGE_BYTES.
+        
+        Returns:
+            bytes с загруженной частью страницы или None при ошибке
+        """
         max_retries = 3
         retry_count = 0
         
@@ -53,24 +73,35 @@ class YandexMarketParser:
                 # Получаем новый случайный заголовок для каждого запроса
                 headers = self.get_random_headers()
                 
-                # Выполняем запрос с увеличенным таймаутом
-                response = requests.get(url, headers=headers, timeout=30)
-                response.raise_for_status()
-                
-                # Устанавливаем кодировку
-                response.encoding = 'utf-8'
-                
-                return response.text
-            except requests.Timeout:
+                # Выполняем запрос через общий пул соединений
+                # (страницы с капчей не сохраняются в кэш ответов)
+                if YANDEX_STREAMING:
+                    probe = YandexPageProbe()
+                    return await fetch_stream(
+                        url,
+                        probe.feed,
+                        headers=headers,
+                        max_bytes=YANDEX_MAX_PAGE_BYTES,
+                        cache_filter=lambda content: CAPTCHA_MARKER_BYTES not in content
+                    )
+                else:
+                    response = await fetch(
+                        url,
+                        headers=headers,
+                        cache_filter=lambda content: CAPTCHA_MARKER_BYTES not in content
+                    )
+                    response.raise_for_status()
+                    return response.content[:YANDEX_MAX_PAGE_BYTES]
+            except httpx.TimeoutException:
                 retry_count += 1
                 if retry_count < max_retries:
                     delay = random.uniform(2, 5)
                     print(f"Произошел таймаут при запросе к {url}. Повторная попытка {retry_count}/{max_retries} через {delay:.2f} секунд...")
-                    time.sleep(delay)
+                    await asyncio.sleep(delay)
                 else:
                     print(f"Превышено максимальное количество попыток при запросе к {url}")
                     return None
-            except requests.RequestException as e:
+            except httpx.HTTPError as e:
                 print(f"Ошибка при получении страницы: {e}")
                 return None
     
@@ -78,7 +109,7 @@ class YandexMarketParser:
         """Получить название маркетплейса."""
         return "Яндекс.Маркет"
     
-    def parse(self, url=None):
+    async def parse(self, url=None):
         """
         Парсинг данных о товаре с Яндекс.Маркета.
         
@@ -99,11 +130,21 @@ class YandexMarketParser:
         if url is None:
             url = PRODUCT_URL
         
+        # Общий для всех запросов к хосту ограничитель: после капчи
+        # запросы приостанавливаются на время охлаждения
+        limiter = get_rate_limiter(urlparse(url).hostname)
+        
         # Логика повторных попыток с задержкой при обнаружении капчи
         retries = 0
         while retries < self.max_retries:
-            html_content = self.get_page_content(url)
-            if not html_content:
+            try:
+                html = await self.get_page_data(url)
+            except RateLimitExceeded as e:
+                # Хост отвечает капчей, не тратим попытки впустую
+                print(f"Запрос к Яндекс.Маркету отклонен: {e}")
+                return self.get_captcha_result()
+            
+            if not html:
                 return {
                     'title': "Ошибка при получении страницы",
                     'image_url': None,
@@ -111,160 +152,40 @@ class YandexMarketParser:
                     'error': True
                 }
                 
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
             # Проверяем наличие CAPTCHA
-            if "Подтвердите, что запросы отправляли вы" in html_content:
+            if CAPTCHA_MARKER_BYTES in html:
                 retries += 1
+                if limiter is not None:
+                    limiter.report_captcha()
                 if retries < self.max_retries:
-                    # Генерируем случайную задержку от 5 до 10 секунд
-                    delay = random.uniform(5, 10)
-                    print(f"\n❌ ОБНАРУЖЕНА CAPTCHA! Повторная попытка {retries}/{self.max_retries} через {delay:.2f} секунд...")
-                    time.sleep(delay)
+                    if limiter is not None:
+                        # Пауза выдерживается ограничителем при следующем запросе
+                        print(f"\n❌ ОБНАРУЖЕНА CAPTCHA! Повторная попытка {retries}/{self.max_retries} через {limiter.cooldown:.0f} секунд...")
+                    else:
+                        # Генерируем случайную задержку от 5 до 10 секунд
+                        delay = random.uniform(5, 10)
+                        print(f"\n❌ ОБНАРУЖЕНА CAPTCHA! Повторная попытка {retries}/{self.max_retries} через {delay:.2f} секунд...")
+                        await asyncio.sleep(delay)
                     continue
                 else:
-                    return {
-                        'title': "Подтвердите, что запросы отправляли вы, а не робот",
-                        'image_url': None,
-                        'marketplace': self.get_marketplace_name(),
-                        'captcha_detected': True
-                    }
+                    return self.get_captcha_result()
             
             # Если капча не обнаружена, продолжаем парсинг
+            if limiter is not None:
+                limiter.report_success()
             break
         
-        result = {
-            'title': "Название не найдено",
+        # Разбор страницы выполняется в пуле процессов, не занимая цикл событий
+        return await parse_pool.run(extract_product_data, html, self.get_marketplace_name())
+
+    def get_captcha_result(self):
+        """Результат парсинга при обнаружении капчи."""
+        return {
+            'title': "Подтвердите, что запросы отправляли вы, а не робот",
             'image_url': None,
-            'price': None,
-            'description': None,
             'marketplace': self.get_marketplace_name(),
-            'captcha_detected': False
+            'captcha_detected': True
         }
-        
-        # Извлечение названия товара
-        title_element = soup.select_one('h1')
-        if title_element:
-            result['title'] = title_element.text.strip()
-        
-        # Пытаемся найти данные в JSON-LD
-        json_ld = soup.select('script[type="application/ld+json"]')
-        for script in json_ld:
-            try:
-                data = json.loads(script.string)
-                if '@type' in data and data['@type'] == 'Product':
-                    if 'name' in data:
-                        result['title'] = data['name']
-                    if 'image' in data:
-                        if isinstance(data['image'], list) and data['image']:
-                            result['image_url'] = data['image'][0]
-                        else:
-                            result['image_url'] = data['image']
-                    # Проверяем наличие акционной цены в JSON-LD
-                    if 'offers' in data:
-                        if 'lowPrice' in data['offers']:  # Самая низкая цена в предложениях
-                            result['price'] = data['offers']['lowPrice']
-                        elif 'price' in data['offers']:  # Обычная цена
-                            result['price'] = data['offers']['price']
-                    if 'description' in data:
-                        result['description'] = data['description']
-                    break
-            except (json.JSONDecodeError, KeyError):
-                pass
-        
-        # Если изображение не найдено, ищем в HTML с использованием разных селекторов
-        if not result['image_url']:
-            image_selectors = [
-                '.cia-cs img', 
-                '.n-gallery__image', 
-                'img._2gUfn', 
-                'img[src*="marketpic"]',
-                'img.preview-picture',
-                'img[src*="thumbnail"]',
-                '.image img',
-                'img.logo-image',
-                'img.image',
-                'img[data-tid="bb42d11f"]'
-            ]
-            
-            for selector in image_selectors:
-                img_elements = soup.select(selector)
-                for img in img_elements:
-                    if img.has_attr('src'):
-                        result['image_url'] = img['src']
-                        break
-                    elif img.has_attr('data-src'):
-                        result['image_url'] = img['data-src']
-                        break
-                
-                if result['image_url']:
-                    break
-        
-        # Если цена не найдена, ищем в HTML
-        if not result['price']:
-            # Сначала ищем акционную цену
-            discount_price_selectors = [
-                'span[data-auto="offer-price-value"]',
-                '.Price-root_discount',
-                'span.Price_role_discount',
-                'span._3NaXx._33ZFz',
-                'span[data-auto="price-value"].Price_discount',
-                'span[data-tid="c3eacd93"].Price_discount'
-            ]
-            
-            # Проверяем селекторы со скидочной ценой
-            for selector in discount_price_selectors:
-                price_element = soup.select_one(selector)
-                if price_element:
-                    try:
-                        # Удаление всех нецифровых символов, кроме точки
-                        price_text = re.sub(r'[^\d.]', '', price_element.text.replace(',', '.'))
-                        result['price'] = float(price_text)
-                        print(f"Найдена акционная цена: {result['price']}")
-                        break
-                    except (ValueError, TypeError):
-                        pass
-            
-            # Если акционная цена не найдена, ищем обычную цену
-            if not result['price']:
-                price_selectors = [
-                    'span[data-auto="price-value"]',
-                    '.price-value',
-                    '.price_value',
-                    'span._1f9xN',
-                    'span._3NaXx._3kWlK',
-                    'div[data-tid="c3eacd93"]',
-                    'span[data-auto="mainPrice"]'
-                ]
-                
-                for selector in price_selectors:
-                    price_element = soup.select_one(selector)
-                    if price_element:
-                        try:
-                            # Удаление всех нецифровых символов, кроме точки
-                            price_text = re.sub(r'[^\d.]', '', price_element.text.replace(',', '.'))
-                            result['price'] = float(price_text)
-                            print(f"Найдена обычная цена: {result['price']}")
-                            break
-                        except (ValueError, TypeError):
-                            pass
-        
-        # Если описание не найдено, ищем в HTML
-        if not result['description']:
-            desc_selectors = [
-                'div[data-auto="product-description"]',
-                '.n-product-description-text',
-                'div[data-tid="eee60a47"]',
-                'div.specifications-tab'
-            ]
-            
-            for selector in desc_selectors:
-                desc_element = soup.select_one(selector)
-                if desc_element:
-                    result['description'] = desc_element.text.strip()
-                    break
-        
-        return result
 
     def print_result(self, result):
         """Вывести результат парсинга в консоль."""
@@ -314,7 +235,7 @@ def main():
     print(f"\n🔍 Парсим страницу: {url}")
     
     # Парсим страницу
-    result = parser.parse(url)
+    result = asyncio.run(parser.parse(url))
     
     # Выводим результат
     parser.print_result(result)
@@ -0,0 +1,14 @@
+"""
+Общие настройки тестов.
+
+Переменные окружения задаются до импорта модулей бота: база данных
+создается во временном каталоге, поэтому тесты не меняют marketplace.db.
+"""
+import os
+import tempfile
+
+TEST_DIR = tempfile.mkdtemp(prefix='marketplace_bot_tests_')
+
+os.environ.setdefault('BOT_TOKEN', '123456:test')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TEST_DIR, 'marketplace.db')}"
+os.environ['NAVIGATION_HISTORY_PATH'] = ''
@@ -0,0 +1,78 @@
+"""Хранилище состояний FSM в SQLite: сериализация в JSON и поврежденные записи."""
+import asyncio
+import pickle
+import sqlite3
+
+from utils.fsm_storage import SQLiteStorage, FORMAT_ZLIB, dump_payload, load_payload
+
+
+def count_rows(path):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("SELECT COUNT(*) FROM fsm_states").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_payload_round_trip():
+    data = {'product_info': {'title': 'Куртка', 'available_sizes': [str(size) for size in range(200)]}}
+    payload = dump_payload(data, {'hits': 1})
+
+    assert payload[:1] == FORMAT_ZLIB
+    assert load_payload(payload) == [data, {'hits': 1}]
+
+
+def test_state_survives_restart(tmp_path):
+    path = str(tmp_path / 'fsm.db')
+
+    async def scenario():
+        storage = SQLiteStorage(path, flush_interval=0.01)
+        await storage.set_state(chat=1, user=1, state='OrderStates:waiting_for_size')
+        await storage.update_data(chat=1, user=1, quantity=2, product_info={'title': 'Куртка'})
+        await storage.close()
+
+        storage = SQLiteStorage(path, flush_interval=0.01)
+        result = await storage.get_state(chat=1, user=1), await storage.get_data(chat=1, user=1)
+        await storage.close()
+        return result
+
+    state, data = asyncio.run(scenario())
+    assert state == 'OrderStates:waiting_for_size'
+    assert data == {'quantity': 2, 'product_info': {'title': 'Куртка'}}
+
+
+def test_unreadable_record_is_deleted(tmp_path):
+    path = str(tmp_path / 'fsm.db')
+
+    async def scenario():
+        storage = SQLiteStorage(path, flush_interval=0.01)
+        await storage.set_state(chat=1, user=1, state='OrderStates:waiting_for_size')
+        await storage.close()
+
+        # Запись прежнего формата (pickle) или поврежденная запись
+        connection = sqlite3.connect(path)
+        with connection:
+            connection.execute("UPDATE fsm_states SET payload = ?", (b'p' + pickle.dumps(({}, {})),))
+        connection.close()
+
+        storage = SQLiteStorage(path, flush_interval=0.01)
+        result = await storage.get_state(chat=1, user=1), await storage.get_data(chat=1, user=1)
+        await storage.close()
+        return result
+
+    assert asyncio.run(scenario()) == (None, {})
+    assert count_rows(path) == 0
+
+
+def test_non_json_data_does_not_block_other_records(tmp_path):
+    path = str(tmp_path / 'fsm.db')
+
+    async def scenario():
+        storage = SQLiteStorage(path, flush_interval=0.01)
+        await storage.update_data(chat=1, user=1, item=object())
+        await storage.update_data(chat=2, user=2, quantity=3)
+        await storage.flush()
+        await storage.close()
+
+    asyncio.run(scenario())
+    assert count_rows(path) == 1
@@ -0,0 +1,43 @@
+"""Миграции приводят базу прежней версии бота к схеме моделей."""
+import os
+import shutil
+
+from sqlalchemy import create_engine, inspect
+
+from database.migrations import run_migrations, MIGRATIONS
+from database.models import Base
+
+# База данных, созданная прежней версией бота (до миграций)
+OLD_DATABASE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'marketplace.db')
+
+
+def describe_schema(engine):
+    """Индексы и столбцы таблиц моделей."""
+    inspector = inspect(engine)
+    schema = {}
+    for table_name in Base.metadata.tables:
+        indexes = {
+            index['name']: (tuple(index['column_names']), bool(index['unique']))
+            for index in inspector.get_indexes(table_name)
+        }
+        columns = {column['name'] for column in inspector.get_columns(table_name)}
+        schema[table_name] = (indexes, columns)
+    return schema
+
+
+def test_migrated_database_matches_models(tmp_path):
+    path = str(tmp_path / 'old.db')
+    shutil.copyfile(OLD_DATABASE_PATH, path)
+
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        assert run_migrations(connection) == MIGRATIONS[-1][0]
+    migrated = describe_schema(engine)
+    engine.dispose()
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+    Base.metadata.create_all(engine)
+    created = describe_schema(engine)
+    engine.dispose()
+
+    assert migrated == created
@@ -0,0 +1,112 @@
+"""Хранилище истории навигации: размер истории, вытеснение, срок жизни и файл SQLite."""
+import asyncio
+import sqlite3
+
+from keyboards.navigation_history import NavigationHistory
+
+
+def test_history_size_is_capped():
+    history = NavigationHistory(size=3, max_users=10, ttl=60, path=None)
+
+    async def scenario():
+        for screen in ['main', 'cart', 'orders', 'cabinet', 'profile']:
+            await history.push(1, screen)
+        return [await history.back(1), await history.back(1), await history.back(1)]
+
+    previous, before_previous, missing = asyncio.run(scenario())
+    assert previous.screen == 'cabinet'
+    assert before_previous.screen == 'orders'
+    # Старые экраны вытеснены, в истории остался один экран
+    assert missing is None
+    assert history.stats()['entries'] == 1
+
+
+def test_least_recently_used_user_is_evicted():
+    history = NavigationHistory(size=5, max_users=2, ttl=60, path=None)
+
+    async def scenario():
+        await history.push(1, 'main')
+        await history.push(2, 'main')
+        # Обращение к пользователю 1 делает пользователя 2 самым давним
+        await history.push(1, 'cart')
+        await history.push(3, 'main')
+
+    asyncio.run(scenario())
+    assert 1 in history
+    assert 2 not in history
+    assert 3 in history
+    assert history.evicted == 1
+
+
+def test_expired_history_is_removed():
+    history = NavigationHistory(size=5, max_users=10, ttl=0.05, path=None)
+
+    async def scenario():
+        await history.push(1, 'main')
+        await history.push(1, 'cart')
+        await asyncio.sleep(0.1)
+        return await history.back(1)
+
+    assert asyncio.run(scenario()) is None
+    assert 1 not in history
+    assert history.expired == 1
+
+
+def test_back_with_less_than_two_entries():
+    history = NavigationHistory(size=5, max_users=10, ttl=60, path=None)
+
+    async def scenario():
+        unknown = await history.back(1)
+        await history.push(1, 'main')
+        return unknown, await history.back(1)
+
+    assert asyncio.run(scenario()) == (None, None)
+    # Единственный экран остается в истории
+    assert history.stats()['entries'] == 1
+
+
+def test_history_is_loaded_from_file(tmp_path):
+    path = str(tmp_path / 'navigation.db')
+
+    async def save():
+        history = NavigationHistory(size=5, max_users=10, ttl=60, path=path)
+        await history.push(1, 'main')
+        await history.push(1, 'cart', {'page': 2})
+        history.close()
+
+    async def back():
+        history = NavigationHistory(size=5, max_users=10, ttl=60, path=path)
+        await history.push(1, 'orders')
+        entry = await history.back(1)
+        history.close()
+        return entry
+
+    asyncio.run(save())
+    entry = asyncio.run(back())
+    assert (entry.screen, entry.state_data) == ('cart', {'page': 2})
+
+
+def test_unreadable_history_is_treated_as_missing(tmp_path):
+    path = str(tmp_path / 'navigation.db')
+
+    async def save():
+        history = NavigationHistory(size=5, max_users=10, ttl=60, path=path)
+        await history.push(1, 'main')
+        await history.push(1, 'cart')
+        history.close()
+
+    async def back():
+        history = NavigationHistory(size=5, max_users=10, ttl=60, path=path)
+        entry = await history.back(1)
+        history.close()
+        return entry
+
+    asyncio.run(save())
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.execute("UPDATE navigation_history SET entries = ?", (b'\x80\x04not json',))
+
+    assert asyncio.run(back()) is None
+    rows = connection.execute("SELECT COUNT(*) FROM navigation_history").fetchone()[0]
+    connection.close()
+    assert rows == 0
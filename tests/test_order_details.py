@@ -0,0 +1,40 @@
+"""Детали заказа не меняются после обновления карточки товара в каталоге."""
+import asyncio
+
+from database import database
+
+
+async def place_order_and_update_catalog():
+    await database.init_db()
+    await database.create_user(1001, 'buyer')
+
+    product_id = await database.upsert_product(
+        'https://www.wildberries.ru/catalog/555/detail.aspx', 'wildberries', '555', 'Куртка', 5000.0
+    )
+    await database.add_to_cart(1001, product_id, quantity=2, size='M')
+    order_id = await database.create_order(1001, 'Москва')
+
+    # Ссылку на тот же товар вставляют снова - карточка обновляется
+    assert await database.upsert_product(
+        'https://www.wildberries.ru/catalog/555/detail.aspx', 'wildberries', '555', 'Куртка зимняя', 7000.0
+    ) == product_id
+
+    details = await database.get_order_details(1001, order_id)
+    order = await database.get_order(order_id)
+    await database.close_db()
+    return details, order
+
+
+def test_order_details_keep_ordered_title_and_price():
+    details, order = asyncio.run(place_order_and_update_catalog())
+
+    assert len(details['items']) == 1
+    item = details['items'][0]
+    assert item['product']['title'] == 'Куртка'
+    assert item['product']['price'] == 5000.0
+    assert item['quantity'] == 2
+    assert item['size'] == 'M'
+
+    assert order['total_amount'] == 10000.0
+    assert order['items'][0].product.title == 'Куртка'
+    assert order['items'][0].price == 5000.0
@@ -0,0 +1,50 @@
+"""Число SQL-запросов в функциях корзины и заказа не зависит от размера корзины."""
+import asyncio
+
+from database import database
+from database.benchmark import count_statements
+
+CART_SIZES = (1, 10, 50)
+
+
+async def count_queries_for_cart(cart_size):
+    """Число запросов в get_cart_items, create_order и get_order для корзины из cart_size товаров."""
+    user_id = 2000 + cart_size
+    await database.create_user(user_id, f"user{cart_size}")
+    for index in range(cart_size):
+        product_id = await database.upsert_product(
+            f"https://www.wildberries.ru/catalog/{cart_size}{index}/detail.aspx",
+            'wildberries', f"queries-{cart_size}-{index}", f"Товар {index}", 100.0 + index
+        )
+        await database.add_to_cart(user_id, product_id)
+
+    engines = (database.engine, database.read_engine)
+    counts = {}
+    with count_statements(engines) as counter:
+        assert len(await database.get_cart_items(user_id)) == cart_size
+    counts['get_cart_items'] = counter['statements']
+
+    with count_statements(engines) as counter:
+        order_id = await database.create_order(user_id, "Адрес")
+    counts['create_order'] = counter['statements']
+
+    with count_statements(engines) as counter:
+        assert len((await database.get_order(order_id))['items']) == cart_size
+    counts['get_order'] = counter['statements']
+    return counts
+
+
+async def count_queries():
+    await database.init_db()
+    try:
+        return {size: await count_queries_for_cart(size) for size in CART_SIZES}
+    finally:
+        await database.close_db()
+
+
+def test_query_count_does_not_depend_on_cart_size():
+    results = asyncio.run(count_queries())
+
+    for name in results[CART_SIZES[0]]:
+        counts = [results[size][name] for size in CART_SIZES]
+        assert len(set(counts)) == 1, f"{name}: {dict(zip(CART_SIZES, counts))}"
@@ -1,11 +1,13 @@
 from .marketplace_parser import (
     identify_marketplace, is_valid_marketplace_url, 
     parse_wildberries_product, parse_ozon_product, 
-    parse_yandex_market_product, parse_product_from_url
+    parse_yandex_market_product, parse_product_from_url,
+    get_product_key, get_external_id, product_cache, product_flights
 )
 
 __all__ = [
     'identify_marketplace', 'is_valid_marketplace_url', 
     'parse_wildberries_product', 'parse_ozon_product', 
-    'parse_yandex_market_product', 'parse_product_from_url'
+    'parse_yandex_market_product', 'parse_product_from_url',
+    'get_product_key', 'get_external_id', 'product_cache', 'product_flights'
 ] 
\ No newline at end of file
@@ -0,0 +1,508 @@
+"""
+Хранилище состояний FSM в локальном файле SQLite.
+
+MemoryStorage теряет все незавершенные сценарии (оформление заказа,
+оплата, просмотр истории) при перезапуске бота. SQLiteStorage хранит
+состояние, данные и bucket каждой пары (чат, пользователь) одной строкой
+в SQLite, данные сериализуются в JSON и сжимаются zlib, если получаются
+большими. В состоянии хранятся только данные, представимые в JSON
+(словари, списки, строки, числа); записи, которые не удается прочитать,
+удаляются из файла, и сценарий пользователя начинается заново.
+
+Рабочая копия записей хранится в памяти: чтение состояния (оно
+выполняется фильтрами для каждого обновления) не обращается к диску.
+Изменения записываются в файл пакетами не чаще раза в flush_interval
+секунд, поэтому несколько вызовов update_data в одном обработчике дают
+одну запись. У каждой записи есть срок жизни (ttl), который продлевается
+при каждом изменении; просроченные записи считаются пустыми и удаляются
+из памяти и из файла.
+
+ExpiringMemoryStorage — MemoryStorage с удалением состояний, к которым
+давно не обращались: брошенные сценарии (ссылка на товар отправлена, а
+заказ так и не оформлен) иначе остаются в памяти навсегда. Время
+последнего обращения отмечается в колесе таймеров, и очередная проверка
+просматривает только одну ячейку колеса, а не все состояния.
+"""
+import os
+import copy
+import json
+import time
+import zlib
+import logging
+import sqlite3
+import asyncio
+import threading
+
+from dotenv import load_dotenv
+from aiogram.dispatcher.storage import BaseStorage
+from aiogram.contrib.fsm_storage.memory import MemoryStorage
+
+logger = logging.getLogger(__name__)
+
+# Загрузка переменных окружения
+load_dotenv()
+
+# Хранилище состояний: sqlite или memory
+FSM_STORAGE = os.getenv('FSM_STORAGE', 'sqlite')
+FSM_STORAGE_PATH = os.getenv('FSM_STORAGE_PATH', 'fsm_storage.db')
+# Срок жизни состояния после последнего изменения
+FSM_STATE_TTL = float(os.getenv('FSM_STATE_TTL', str(7 * 24 * 3600)))  # секунды
+# Интервал пакетной записи изменений в файл
+FSM_FLUSH_INTERVAL = float(os.getenv('FSM_FLUSH_INTERVAL', '0.5'))  # секунды
+# Интервал проверки неактивных состояний в памяти (для FSM_STORAGE=memory)
+FSM_SWEEP_INTERVAL = float(os.getenv('FSM_SWEEP_INTERVAL', '60'))  # секунды
+
+# Данные больше этого размера сжимаются
+COMPRESS_THRESHOLD = 512
+# Интервал удаления просроченных записей
+CLEANUP_INTERVAL = 300  # секунды
+
+# Первый байт сериализованных данных: формат
+FORMAT_JSON = b'j'
+FORMAT_ZLIB = b'z'
+
+
+def dump_payload(data, bucket):
+    """
+    Сериализовать данные и bucket записи.
+
+    Raises:
+        TypeError: Данные нельзя представить в JSON
+    """
+    payload = json.dumps([data, bucket], ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if len(payload) > COMPRESS_THRESHOLD:
+        return FORMAT_ZLIB + zlib.compress(payload)
+    return FORMAT_JSON + payload
+
+
+def load_payload(payload):
+    """
+    Восстановить данные и bucket записи.
+
+    Raises:
+        ValueError: Данные повреждены или записаны в неизвестном формате
+    """
+    payload = bytes(payload)
+    try:
+        if payload[:1] == FORMAT_ZLIB:
+            decoded = json.loads(zlib.decompress(payload[1:]))
+        elif payload[:1] == FORMAT_JSON:
+            decoded = json.loads(payload[1:])
+        else:
+            raise ValueError(f"неизвестный формат данных {payload[:1]!r}")
+    except zlib.error as e:
+        raise ValueError(str(e)) from e
+
+    if not (isinstance(decoded, list) and len(decoded) == 2 and all(isinstance(item, dict) for item in decoded)):
+        raise ValueError("ожидались данные и bucket записи")
+    return decoded
+
+
+class FSMRecord:
+    """Состояние, данные и bucket одной пары (чат, пользователь)."""
+
+    __slots__ = ('state', 'data', 'bucket', 'expires_at')
+
+    def __init__(self, state=None, data=None, bucket=None, expires_at=0.0):
+        self.state = state
+        self.data = data if data is not None else {}
+        self.bucket = bucket if bucket is not None else {}
+        self.expires_at = expires_at
+
+    def is_empty(self):
+        return self.state is None and not self.data and not self.bucket
+
+
+class SQLiteStorage(BaseStorage):
+    """Хранилище состояний FSM в SQLite с пакетной записью и сроком жизни записей."""
+
+    def __init__(self, path=FSM_STORAGE_PATH, ttl=FSM_STATE_TTL, flush_interval=FSM_FLUSH_INTERVAL):
+        """
+        Args:
+            path: Путь к файлу хранилища
+            ttl: Срок жизни записи после последнего изменения в секундах
+            flush_interval: Интервал пакетной записи изменений в секундах
+        """
+        self.path = path
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+
+        # Структура: {(chat, user): FSMRecord}
+        self._records = {}
+        self._dirty = set()
+        self._flush_handle = None
+        self._flush_lock = None
+        self._last_cleanup = time.monotonic()
+
+        self._connection = None
+        self._lock = threading.Lock()
+
+        # Счетчики
+        self.loads = 0
+        self.flushes = 0
+        self.written = 0
+        self.written_bytes = 0
+        self.expired = 0
+
+    # Интерфейс BaseStorage
+
+    async def get_state(self, *, chat=None, user=None, default=None):
+        record = await self._get_record(chat, user)
+        if record.state is None:
+            return self.resolve_state(default)
+        return record.state
+
+    async def get_data(self, *, chat=None, user=None, default=None):
+        record = await self._get_record(chat, user)
+        return copy.deepcopy(record.data)
+
+    async def set_state(self, *, chat=None, user=None, state=None):
+        record = await self._get_record(chat, user)
+        record.state = self.resolve_state(state)
+        self._mark_dirty(chat, user, record)
+
+    async def set_data(self, *, chat=None, user=None, data=None):
+        record = await self._get_record(chat, user)
+        record.data = copy.deepcopy(data) if data else {}
+        self._mark_dirty(chat, user, record)
+
+    async def update_data(self, *, chat=None, user=None, data=None, **kwargs):
+        record = await self._get_record(chat, user)
+        record.data.update(copy.deepcopy(data or {}), **kwargs)
+        self._mark_dirty(chat, user, record)
+
+    async def reset_state(self, *, chat=None, user=None, with_data=True):
+        record = await self._get_record(chat, user)
+        record.state = None
+        if with_data:
+            record.data = {}
+        self._mark_dirty(chat, user, record)
+
+    def has_bucket(self):
+        return True
+
+    async def get_bucket(self, *, chat=None, user=None, default=None):
+        record = await self._get_record(chat, user)
+        return copy.deepcopy(record.bucket)
+
+    async def set_bucket(self, *, chat=None, user=None, bucket=None):
+        record = await self._get_record(chat, user)
+        record.bucket = copy.deepcopy(bucket) if bucket else {}
+        self._mark_dirty(chat, user, record)
+
+    async def update_bucket(self, *, chat=None, user=None, bucket=None, **kwargs):
+        record = await self._get_record(chat, user)
+        record.bucket.update(copy.deepcopy(bucket or {}), **kwargs)
+        self._mark_dirty(chat, user, record)
+
+    async def close(self):
+        """Записать несохраненные изменения и закрыть файл."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        await self.flush()
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+        self._records.clear()
+
+    async def wait_closed(self):
+        pass
+
+    # Работа с записями
+
+    def _resolve_key(self, chat, user):
+        chat, user = self.check_address(chat=chat, user=user)
+        return str(chat), str(user)
+
+    async def _get_record(self, chat, user):
+        key = self._resolve_key(chat, user)
+        record = self._records.get(key)
+        if record is None:
+            record = await self._run(self._load, key)
+            self.loads += 1
+            # Запись могла появиться, пока шло чтение из файла
+            record = self._records.setdefault(key, record)
+
+        if record.expires_at and record.expires_at <= time.time():
+            # Просроченная запись считается пустой
+            self.expired += 1
+            record.state = None
+            record.data = {}
+            record.bucket = {}
+            record.expires_at = 0.0
+            self._dirty.add(key)
+            self._schedule_flush()
+        return record
+
+    def _mark_dirty(self, chat, user, record):
+        record.expires_at = time.time() + self.ttl
+        self._dirty.add(self._resolve_key(chat, user))
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(
+                self.flush_interval, lambda: asyncio.ensure_future(self._scheduled_flush())
+            )
+
+    async def _scheduled_flush(self):
+        self._flush_handle = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error("Ошибка при сохранении состояний FSM: %s", e)
+
+    async def flush(self):
+        """Записать накопленные изменения в файл одной транзакцией."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            dirty, self._dirty = self._dirty, set()
+            upserts = []
+            deletes = []
+            for key in dirty:
+                record = self._records.get(key)
+                if record is None or record.is_empty():
+                    deletes.append(key)
+                    # Пустые записи не держим в памяти
+                    self._records.pop(key, None)
+                else:
+                    try:
+                        payload = dump_payload(record.data, record.bucket)
+                    except (TypeError, ValueError) as e:
+                        # Запись остается только в памяти, остальные изменения сохраняются
+                        logger.error("Состояние FSM %s не сохранено: данные не представимы в JSON (%s)", key, e)
+                        continue
+                    upserts.append((*key, record.state, payload, record.expires_at))
+
+            cleanup = time.monotonic() - self._last_cleanup >= CLEANUP_INTERVAL
+            if cleanup:
+                self._last_cleanup = time.monotonic()
+                self._evict_expired()
+
+            if not upserts and not deletes and not cleanup:
+                return
+
+            try:
+                await self._run(self._write, upserts, deletes, cleanup)
+            except Exception:
+                # Изменения будут записаны при следующей попытке
+                self._dirty.update(dirty)
+                raise
+
+            self.flushes += 1
+            self.written += len(upserts) + len(deletes)
+            self.written_bytes += sum(len(row[3]) for row in upserts)
+
+    def _evict_expired(self):
+        # Просроченные и пустые записи без несохраненных изменений удаляются из памяти
+        now = time.time()
+        evicted = [
+            key for key, record in self._records.items()
+            if key not in self._dirty and (record.expires_at <= now or record.is_empty())
+        ]
+        for key in evicted:
+            del self._records[key]
+
+    def stats(self):
+        """Получить статистику хранилища."""
+        return {
+            'records': len(self._records),
+            'dirty': len(self._dirty),
+            'loads': self.loads,
+            'flushes': self.flushes,
+            'written': self.written,
+            'written_bytes': self.written_bytes,
+            'expired': self.expired
+        }
+
+    # Работа с SQLite (выполняется в пуле потоков)
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, *args)
+
+    def _get_connection(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS fsm_states ("
+                "chat TEXT NOT NULL, "
+                "user TEXT NOT NULL, "
+                "state TEXT, "
+                "payload BLOB NOT NULL, "
+                "expires_at REAL NOT NULL, "
+                "PRIMARY KEY (chat, user))"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_fsm_states_expires_at ON fsm_states (expires_at)"
+            )
+            self._connection.commit()
+        return self._connection
+
+    def _load(self, key):
+        with self._lock:
+            row = self._get_connection().execute(
+                "SELECT state, payload, expires_at FROM fsm_states WHERE chat = ? AND user = ?", key
+            ).fetchone()
+        if row is None:
+            return FSMRecord()
+
+        state, payload, expires_at = row
+        if expires_at <= time.time():
+            return FSMRecord()
+        try:
+            data, bucket = load_payload(payload)
+        except ValueError as e:
+            # Поврежденная запись или запись прежнего формата: состояние начинается заново
+            logger.warning("Не удалось прочитать состояние FSM %s, запись удалена: %s", key, e)
+            with self._lock:
+                connection = self._get_connection()
+                with connection:
+                    connection.execute("DELETE FROM fsm_states WHERE chat = ? AND user = ?", key)
+            return FSMRecord()
+        return FSMRecord(state, data, bucket, expires_at)
+
+    def _write(self, upserts, deletes, cleanup):
+        with self._lock:
+            connection = self._get_connection()
+            with connection:
+                if upserts:
+                    connection.executemany(
+                        "INSERT INTO fsm_states (chat, user, state, payload, expires_at) VALUES (?, ?, ?, ?, ?) "
+                        "ON CONFLICT (chat, user) DO UPDATE SET "
+                        "state = excluded.state, payload = excluded.payload, expires_at = excluded.expires_at",
+                        upserts
+                    )
+                if deletes:
+                    connection.executemany("DELETE FROM fsm_states WHERE chat = ? AND user = ?", deletes)
+                if cleanup:
+                    connection.execute("DELETE FROM fsm_states WHERE expires_at <= ?", (time.time(),))
+
+
+class ExpiringMemoryStorage(MemoryStorage):
+    """MemoryStorage, удаляющее состояния, к которым не обращались дольше idle_timeout секунд."""
+
+    def __init__(self, idle_timeout=FSM_STATE_TTL, sweep_interval=FSM_SWEEP_INTERVAL):
+        """
+        Args:
+            idle_timeout: Время без обращений, после которого состояние удаляется, в секундах
+            sweep_interval: Интервал проверки (шаг колеса таймеров) в секундах
+        """
+        super().__init__()
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+
+        # Колесо таймеров: ячейка с номером tick % len(self._wheel) хранит
+        # ключи, последнее обращение к которым было на шаге tick
+        self._idle_ticks = max(1, int(-(-idle_timeout // sweep_interval)))
+        self._wheel = [set() for _ in range(self._idle_ticks + 1)]
+        # Структура: {(chat, user): шаг последнего обращения}
+        self._touched = {}
+        # Последний проверенный шаг: обращений раньше создания хранилища не было
+        self._swept_tick = self._current_tick() - 1
+        self._sweeper = None
+
+        # Счетчики
+        self.evicted = 0
+        self.reclaimed_bytes = 0
+
+    def _current_tick(self):
+        return int(time.monotonic() // self.sweep_interval)
+
+    def resolve_address(self, chat, user):
+        key = super().resolve_address(chat, user)
+        self._touch(key)
+        return key
+
+    def _touch(self, key):
+        tick = self._current_tick()
+        previous = self._touched.get(key)
+        if previous == tick:
+            return
+        if previous is not None:
+            self._wheel[previous % len(self._wheel)].discard(key)
+        self._wheel[tick % len(self._wheel)].add(key)
+        self._touched[key] = tick
+
+        if self._sweeper is None:
+            self._sweeper = asyncio.ensure_future(self._sweep_loop())
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                evicted, reclaimed = self.sweep()
+                if evicted:
+                    logger.info("Удалено неактивных состояний FSM: %s, освобождено ~%s байт", evicted, reclaimed)
+            except Exception as e:
+                logger.error("Ошибка при удалении неактивных состояний FSM: %s", e)
+
+    def sweep(self):
+        """
+        Удалить состояния, к которым не обращались дольше idle_timeout.
+
+        Просматриваются только ячейки колеса, срок которых истек с прошлой проверки.
+
+        Returns:
+            tuple: (количество удаленных состояний, оценка освобожденной памяти в байтах)
+        """
+        expired_tick = self._current_tick() - self._idle_ticks
+        evicted = 0
+        reclaimed = 0
+
+        # Если проверка запаздывала больше чем на оборот колеса, хватит одного оборота
+        first_tick = max(self._swept_tick + 1, expired_tick - len(self._wheel) + 1)
+        for tick in range(first_tick, expired_tick + 1):
+            slot = self._wheel[tick % len(self._wheel)]
+            for key in [key for key in slot if self._touched[key] <= expired_tick]:
+                slot.discard(key)
+                del self._touched[key]
+
+                chat, user = key
+                chat_data = self.data.get(chat)
+                if chat_data is None or user not in chat_data:
+                    # Состояние уже сброшено обработчиком
+                    continue
+                # Размер оценивается по JSON-представлению состояния
+                reclaimed += len(json.dumps(chat_data.pop(user), ensure_ascii=False, default=str))
+                evicted += 1
+                if not chat_data:
+                    del self.data[chat]
+
+        self._swept_tick = max(self._swept_tick, expired_tick)
+        self.evicted += evicted
+        self.reclaimed_bytes += reclaimed
+        return evicted, reclaimed
+
+    async def close(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        await super().close()
+        self._touched.clear()
+        for slot in self._wheel:
+            slot.clear()
+
+    def stats(self):
+        """Получить статистику хранилища."""
+        return {
+            'tracked': len(self._touched),
+            'evicted': self.evicted,
+            'reclaimed_bytes': self.reclaimed_bytes
+        }
+
+
+def create_storage(kind=FSM_STORAGE):
+    """Создать хранилище состояний FSM по настройке FSM_STORAGE (sqlite или memory)."""
+    if kind == 'memory':
+        return ExpiringMemoryStorage()
+    if kind == 'sqlite':
+        return SQLiteStorage()
+    raise ValueError(f"Неизвестное хранилище состояний FSM: {kind}")
@@ -1,9 +1,24 @@
 import re
-from config.config import MARKETPLACES
+import copy
+from urllib.parse import urlparse, parse_qs
+
+from config.config import MARKETPLACES, PRODUCT_CACHE_TTL, PRODUCT_CACHE_MAX_ENTRIES, PRODUCT_CACHE_MAX_BYTES
 
 # Импортируем классы парсеров
 from parser.wb_parser import extract_nm_id_from_url, get_product_info_from_card_api, parse_and_display_product_info
 from parser.yandex_parser import YandexMarketParser
+from utils.product_cache import ProductCache
+from utils.single_flight import SingleFlight
+
+# Кэш результатов парсинга товаров
+product_cache = ProductCache(
+    ttl=PRODUCT_CACHE_TTL,
+    max_entries=PRODUCT_CACHE_MAX_ENTRIES,
+    max_bytes=PRODUCT_CACHE_MAX_BYTES
+)
+
+# Объединение одновременных запросов одного и того же товара
+product_flights = SingleFlight()
 
 def identify_marketplace(url):
     """Определить маркетплейс по URL."""
@@ -39,7 +54,63 @@ def is_valid_marketplace_url(url):
             return bool(re.match(r'https?://market\.yandex\.ru/.*', url))
     return False
 
-def parse_wildberries_product(url):
+def get_product_key(url):
+    """
+    Получить канонический ключ товара по URL.
+    
+    Для Wildberries ключом служит nm_id, для Яндекс.Маркета - путь
+    страницы товара вместе с идентификатором SKU.
+    
+    Returns:
+        tuple: (marketplace, идентификатор) или None, если ключ не определен
+    """
+    marketplace = identify_marketplace(url)
+    
+    if marketplace == 'wildberries':
+        nm_id = extract_nm_id_from_url(url)
+        if nm_id:
+            return marketplace, nm_id
+    elif marketplace == 'yandex_market':
+        parsed_url = urlparse(url)
+        path = parsed_url.path.rstrip('/')
+        if path:
+            sku = parse_qs(parsed_url.query).get('sku')
+            if sku:
+                return marketplace, f"{path}?sku={sku[0]}"
+            return marketplace, path
+    
+    return None
+
+def get_external_id(url):
+    """
+    Получить идентификатор товара на маркетплейсе для каталога товаров.
+    
+    Для Wildberries это nm_id, для Яндекс.Маркета - SKU предложения или,
+    если SKU в ссылке нет, ID карточки товара из пути страницы.
+    
+    Returns:
+        str или None, если идентификатор не определен
+    """
+    marketplace = identify_marketplace(url)
+    
+    if marketplace == 'wildberries':
+        return extract_nm_id_from_url(url)
+    elif marketplace == 'yandex_market':
+        parsed_url = urlparse(url)
+        sku = parse_qs(parsed_url.query).get('sku')
+        if sku and sku[0].isdigit():
+            return f"sku{sku[0]}"
+        match = re.search(r'/(\d+)/?$', parsed_url.path)
+        if match:
+            return match.group(1)
+    
+    return None
+
+def is_cacheable_result(product_info):
+    """Проверить, можно ли сохранить результат парсинга в кэш."""
+    return bool(product_info) and not product_info.get('error') and bool(product_info.get('price'))
+
+async def parse_wildberries_product(url):
     """
     Парсинг товара с Wildberries.
     
@@ -63,7 +134,7 @@ def parse_wildberries_product(url):
             }
         
         # Получаем информацию о товаре через Card API
-        product_info = get_product_info_from_card_api(nm_id)
+        product_info = await get_product_info_from_card_api(nm_id)
         
         if not product_info:
             print("Не удалось получить информацию о товаре Wildberries через Card API")
@@ -156,7 +227,7 @@ def parse_ozon_product(url):
         'error': True  # Флаг ошибки для блокировки оформления
     }
 
-def parse_yandex_market_product(url):
+async def parse_yandex_market_product(url):
     """
     Парсинг товара с Яндекс Маркета.
     
@@ -167,7 +238,7 @@ def parse_yandex_market_product(url):
         parser = YandexMarketParser()
         
         # Получаем информацию о товаре
-        result = parser.parse(url)
+        result = await parser.parse(url)
         
         # Проверяем результат на ошибки
         if not result:
@@ -211,7 +282,18 @@ def get_yandex_market_fallback(url, reason="Не удалось получить
         'error': True  # Добавляем флаг ошибки
     }
 
-def parse_product_from_url(url):
+async def parse_marketplace_product(marketplace, url):
+    """Получить информацию о товаре у парсера соответствующего маркетплейса."""
+    if marketplace == 'wildberries':
+        return await parse_wildberries_product(url)
+    elif marketplace == 'ozon':
+        return parse_ozon_product(url)
+    elif marketplace == 'yandex_market':
+        return await parse_yandex_market_product(url)
+    else:
+        return None
+
+async def parse_product_from_url(url):
     """Парсинг товара по URL."""
     try:
         # Извлекаем URL из текста, если пользователь отправил его с текстом
@@ -223,14 +305,32 @@ def parse_product_from_url(url):
         if not marketplace:
             return None
         
-        if marketplace == 'wildberries':
-            return parse_wildberries_product(url)
-        elif marketplace == 'ozon':
-            return parse_ozon_product(url)
-        elif marketplace == 'yandex_market':
-            return parse_yandex_market_product(url)
-        else:
-            return None
+        product_key = get_product_key(url)
+        if not product_key:
+            return await parse_marketplace_product(marketplace, url)
+        
+        # Проверяем кэш, чтобы не обращаться к маркетплейсу повторно
+        cached_info = product_cache.get(product_key)
+        if cached_info:
+            cached_info['url'] = url
+            return cached_info
+        
+        # Одновременные запросы одного товара выполняются одним обращением к маркетплейсу
+        product_info = await product_flights.do(
+            product_key,
+            lambda: parse_marketplace_product(marketplace, url)
+        )
+        
+        # Каждый ожидающий получает собственную копию результата со своим URL
+        if product_info:
+            product_info = copy.deepcopy(product_info)
+            product_info['url'] = url
+        
+        # Сохраняем в кэш только успешные результаты
+        if is_cacheable_result(product_info):
+            product_cache.set(product_key, product_info)
+        
+        return product_info
     except Exception as e:
         print(f"Ошибка при парсинге URL {url}: {str(e)}")
         return {
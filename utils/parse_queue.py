@@ -0,0 +1,373 @@
+"""
+Очередь задач на получение информации о товарах.
+
+Ссылки, присланные пользователями, превращаются в задачи, которые
+сохраняются в локальном файле SQLite и выполняются пулом асинхронных
+обработчиков. Обработчик сообщения не ждет окончания парсинга: когда
+задача завершена, для каждого подписчика (пользователя, приславшего
+ссылку) вызывается функция on_complete. Одновременные задачи на один и тот
+же товар объединяются по ключу товара, а задачи, не завершенные к моменту
+остановки бота, выполняются после перезапуска.
+"""
+import os
+import json
+import time
+import logging
+import sqlite3
+import asyncio
+import threading
+
+from dotenv import load_dotenv
+
+from utils.marketplace_parser import parse_product_from_url, get_product_key
+
+logger = logging.getLogger(__name__)
+
+# Загрузка переменных окружения
+load_dotenv()
+
+PARSE_QUEUE_PATH = os.getenv('PARSE_QUEUE_PATH', 'parse_jobs.db')
+PARSE_QUEUE_WORKERS = int(os.getenv('PARSE_QUEUE_WORKERS', '4'))
+PARSE_JOB_TIMEOUT = float(os.getenv('PARSE_JOB_TIMEOUT', '90'))  # секунды
+# Сколько раз задача может начинаться заново после аварийной остановки бота
+PARSE_JOB_MAX_ATTEMPTS = int(os.getenv('PARSE_JOB_MAX_ATTEMPTS', '3'))
+
+# Интервал, с которым свободные обработчики проверяют очередь
+POLL_INTERVAL = 5
+
+# Статусы задач
+STATUS_PENDING = 'pending'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+
+# Причины неудачного завершения задачи
+ERROR_TIMEOUT = 'timeout'
+ERROR_FAILED = 'failed'
+
+
+class ParseJob:
+    """Задача на получение информации о товаре."""
+
+    __slots__ = ('id', 'key', 'url', 'result', 'error')
+
+    def __init__(self, id, key, url, result=None, error=None):
+        self.id = id
+        self.key = key
+        self.url = url
+        self.result = result
+        self.error = error
+
+
+class ParseJobSubscriber:
+    """Пользователь, ожидающий результата задачи."""
+
+    __slots__ = ('id', 'job_id', 'chat_id', 'user_id', 'message_id', 'url', 'recovered')
+
+    def __init__(self, id, job_id, chat_id, user_id, message_id, url, recovered=False):
+        self.id = id
+        self.job_id = job_id
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.message_id = message_id
+        self.url = url
+        # Подписка создана до последнего перезапуска бота
+        self.recovered = recovered
+
+
+def get_job_key(url):
+    """Ключ для объединения задач: ключ товара или сама ссылка."""
+    key = get_product_key(url)
+    if key is None:
+        return url
+    return ':'.join(key)
+
+
+class ParseQueue:
+    """Очередь задач парсинга в SQLite с пулом асинхронных обработчиков."""
+
+    def __init__(self, handler=parse_product_from_url, path=PARSE_QUEUE_PATH, workers=PARSE_QUEUE_WORKERS,
+                 job_timeout=PARSE_JOB_TIMEOUT, max_attempts=PARSE_JOB_MAX_ATTEMPTS):
+        """
+        Args:
+            handler: Корутина, получающая ссылку и возвращающая product_info
+            path: Путь к файлу очереди
+            workers: Количество одновременно выполняемых задач
+            job_timeout: Максимальное время выполнения задачи в секундах
+            max_attempts: Сколько раз задача может начинаться заново
+        """
+        self.handler = handler
+        self.path = path
+        self.workers = workers
+        self.job_timeout = job_timeout
+        self.max_attempts = max_attempts
+
+        # Вызывается для каждого подписчика: on_complete(job, subscriber)
+        self.on_complete = None
+
+        self._connection = None
+        self._lock = threading.Lock()
+        self._wakeup = None
+        self._tasks = []
+        self._started_at = None
+
+        # Счетчики
+        self.enqueued = 0
+        self.coalesced = 0
+        self.completed = 0
+        self.failed = 0
+
+    async def start(self):
+        """Восстановить незавершенные задачи и запустить обработчики."""
+        self._started_at = time.time()
+        self._wakeup = asyncio.Event()
+
+        # Задачи, прерванные остановкой бота, выполняются заново;
+        # по завершенным задачам заново уведомляются оставшиеся подписчики
+        done_jobs = await self._run(self._recover)
+
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        for job in done_jobs:
+            self._tasks.append(asyncio.create_task(self._notify(job)))
+
+    async def stop(self):
+        """Остановить обработчики. Незавершенные задачи останутся в очереди."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.close()
+
+    async def enqueue(self, url, chat_id, user_id, message_id):
+        """
+        Поставить задачу на получение информации о товаре.
+
+        Если задача на тот же товар уже ожидает или выполняется,
+        пользователь подписывается на нее.
+
+        Args:
+            url: Ссылка на товар
+            chat_id: ID чата, в который отправляется результат
+            user_id: Telegram ID пользователя
+            message_id: ID сообщения об ожидании, которое будет изменено
+
+        Returns:
+            ID подписки
+        """
+        subscriber_id, created = await self._run(
+            self._enqueue, get_job_key(url), url, chat_id, user_id, message_id
+        )
+        if created:
+            self.enqueued += 1
+            if self._wakeup is not None:
+                self._wakeup.set()
+        else:
+            self.coalesced += 1
+        return subscriber_id
+
+    def close(self):
+        """Закрыть соединение с файлом очереди."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def stats(self):
+        """Получить статистику очереди."""
+        counts = dict(self._execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+        return {
+            'pending': counts.get(STATUS_PENDING, 0),
+            'running': counts.get(STATUS_RUNNING, 0),
+            'workers': self.workers,
+            'enqueued': self.enqueued,
+            'coalesced': self.coalesced,
+            'completed': self.completed,
+            'failed': self.failed
+        }
+
+    async def _worker(self):
+        while True:
+            # Событие сбрасывается до проверки очереди, чтобы не пропустить новую задачу
+            self._wakeup.clear()
+            job = await self._run(self._claim)
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._process(job)
+
+    async def _process(self, job):
+        try:
+            job.result = await asyncio.wait_for(self.handler(job.url), self.job_timeout)
+            self.completed += 1
+        except asyncio.TimeoutError:
+            logger.warning("Превышено время ожидания при парсинге товара: %s", job.url)
+            job.error = ERROR_TIMEOUT
+            self.failed += 1
+        except Exception as e:
+            logger.error("Ошибка при парсинге товара %s: %s", job.url, e)
+            job.error = ERROR_FAILED
+            self.failed += 1
+
+        await self._run(self._complete, job)
+        await self._notify(job)
+
+    async def _notify(self, job):
+        subscribers = await self._run(self._get_subscribers, job.id)
+        for subscriber in subscribers:
+            try:
+                if self.on_complete is not None:
+                    await self.on_complete(job, subscriber)
+            except Exception as e:
+                logger.error("Ошибка при отправке результата парсинга пользователю %s: %s", subscriber.user_id, e)
+            finally:
+                await self._run(self._remove_subscriber, subscriber.id)
+        await self._run(self._remove_job, job.id)
+
+    async def _run(self, func, *args):
+        # Работа с SQLite выполняется в пуле потоков, чтобы не блокировать цикл событий
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, *args)
+
+    def _get_connection(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "key TEXT NOT NULL, "
+                "url TEXT NOT NULL, "
+                "status TEXT NOT NULL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, "
+                "result TEXT, "
+                "error TEXT, "
+                "created_at REAL NOT NULL, "
+                "updated_at REAL NOT NULL)"
+            )
+            # Не более одной ожидающей или выполняющейся задачи на товар
+            self._connection.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ix_jobs_active_key ON jobs (key) "
+                "WHERE status IN ('pending', 'running')"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs (status, id)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS subscribers ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "job_id INTEGER NOT NULL, "
+                "chat_id INTEGER NOT NULL, "
+                "user_id INTEGER NOT NULL, "
+                "message_id INTEGER NOT NULL, "
+                "url TEXT NOT NULL, "
+                "created_at REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_subscribers_job_id ON subscribers (job_id)"
+            )
+            self._connection.commit()
+        return self._connection
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            connection = self._get_connection()
+            rows = connection.execute(sql, params).fetchall()
+            connection.commit()
+            return rows
+
+    def _enqueue(self, key, url, chat_id, user_id, message_id):
+        now = time.time()
+        with self._lock:
+            connection = self._get_connection()
+            row = connection.execute(
+                "SELECT id FROM jobs WHERE key = ? AND status IN (?, ?)",
+                (key, STATUS_PENDING, STATUS_RUNNING)
+            ).fetchone()
+            created = row is None
+            if created:
+                job_id = connection.execute(
+                    "INSERT INTO jobs (key, url, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, url, STATUS_PENDING, now, now)
+                ).lastrowid
+            else:
+                job_id = row[0]
+            subscriber_id = connection.execute(
+                "INSERT INTO subscribers (job_id, chat_id, user_id, message_id, url, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, chat_id, user_id, message_id, url, now)
+            ).lastrowid
+            connection.commit()
+        return subscriber_id, created
+
+    def _claim(self):
+        with self._lock:
+            connection = self._get_connection()
+            row = connection.execute(
+                "SELECT id, key, url FROM jobs WHERE status = ? ORDER BY id LIMIT 1",
+                (STATUS_PENDING,)
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (STATUS_RUNNING, time.time(), row[0])
+            )
+            connection.commit()
+        return ParseJob(*row)
+
+    def _complete(self, job):
+        result = json.dumps(job.result, ensure_ascii=False, default=str) if job.result is not None else None
+        self._execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+            (STATUS_DONE, result, job.error, time.time(), job.id)
+        )
+
+    def _get_subscribers(self, job_id):
+        rows = self._execute(
+            "SELECT id, job_id, chat_id, user_id, message_id, url, created_at FROM subscribers "
+            "WHERE job_id = ? ORDER BY id",
+            (job_id,)
+        )
+        return [
+            ParseJobSubscriber(*row[:6], recovered=row[6] < self._started_at)
+            for row in rows
+        ]
+
+    def _remove_subscriber(self, subscriber_id):
+        self._execute("DELETE FROM subscribers WHERE id = ?", (subscriber_id,))
+
+    def _remove_job(self, job_id):
+        self._execute(
+            "DELETE FROM jobs WHERE id = ? AND NOT EXISTS (SELECT 1 FROM subscribers WHERE job_id = ?)",
+            (job_id, job_id)
+        )
+
+    def _recover(self):
+        now = time.time()
+        with self._lock:
+            connection = self._get_connection()
+            # Задачи, которые уже несколько раз прерывались, считаем неудавшимися
+            connection.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE status = ? AND attempts >= ?",
+                (STATUS_DONE, ERROR_FAILED, now, STATUS_RUNNING, self.max_attempts)
+            )
+            connection.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ?",
+                (STATUS_PENDING, now, STATUS_RUNNING)
+            )
+            rows = connection.execute(
+                "SELECT id, key, url, result, error FROM jobs WHERE status = ?",
+                (STATUS_DONE,)
+            ).fetchall()
+            connection.commit()
+
+        return [
+            ParseJob(job_id, key, url, json.loads(result) if result is not None else None, error)
+            for job_id, key, url, result, error in rows
+        ]
+
+
+# Общая очередь задач парсинга
+parse_queue = ParseQueue()
@@ -0,0 +1,101 @@
+"""
+Кэш результатов парсинга товаров.
+
+Хранит нормализованные словари product_info в памяти процесса, чтобы
+повторные ссылки на один и тот же товар не приводили к запросам в сеть.
+"""
+import copy
+import json
+import time
+from collections import OrderedDict
+
+
+class ProductCache:
+    """Ограниченный по размеру кэш с TTL и вытеснением давно неиспользуемых записей (LRU)."""
+
+    def __init__(self, ttl=600, max_entries=1000, max_bytes=8 * 1024 * 1024):
+        """
+        Args:
+            ttl: Время жизни записи в секундах
+            max_entries: Максимальное количество записей
+            max_bytes: Максимальный суммарный размер записей в байтах
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        # Структура: {key: (expires_at, size, product_info)}
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+
+        # Счетчики
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Получить копию сохраненного product_info.
+
+        Returns:
+            dict или None, если записи нет или срок ее жизни истек
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, size, product_info = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        # Отмечаем запись как недавно использованную
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return copy.deepcopy(product_info)
+
+    def set(self, key, product_info):
+        """Сохранить product_info в кэше."""
+        size = len(json.dumps(product_info, ensure_ascii=False, default=str).encode('utf-8'))
+
+        # Слишком большие записи не кэшируем
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = (time.monotonic() + self.ttl, size, copy.deepcopy(product_info))
+        self._total_bytes += size
+
+        # Вытесняем самые старые записи при превышении лимитов
+        while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def invalidate(self, key):
+        """Удалить запись из кэша."""
+        if key in self._entries:
+            self._remove(key)
+
+    def clear(self):
+        """Очистить кэш."""
+        self._entries.clear()
+        self._total_bytes = 0
+
+    def stats(self):
+        """Получить статистику работы кэша."""
+        return {
+            'entries': len(self._entries),
+            'bytes': self._total_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._total_bytes -= size
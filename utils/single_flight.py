@@ -0,0 +1,70 @@
+"""
+Объединение одновременных одинаковых запросов (single-flight).
+
+Если несколько пользователей одновременно запрашивают один и тот же товар,
+запрос к маркетплейсу выполняется один раз, а все ожидающие получают
+общий результат или общую ошибку.
+"""
+import asyncio
+
+
+class SingleFlight:
+    """Группа запросов, в которой на каждый ключ выполняется не более одного вызова одновременно."""
+
+    def __init__(self):
+        # Структура: {key: asyncio.Future}
+        self._in_flight = {}
+
+        # Счетчики
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key, coro_factory):
+        """
+        Выполнить корутину для ключа или присоединиться к уже выполняющейся.
+
+        Корутина выполняется в отдельной задаче: отмена любого из ожидающих
+        (в том числе того, кто запустил запрос) прекращает ожидание только
+        для него, а остальные получают результат.
+
+        Args:
+            key: Ключ запроса (например, ключ товара)
+            coro_factory: Функция без аргументов, возвращающая корутину
+
+        Returns:
+            Результат корутины (общий для всех ожидающих)
+        """
+        self.calls += 1
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.create_task(coro_factory())
+            self._in_flight[key] = task
+            self.executions += 1
+            task.add_done_callback(lambda done: self._finish(key, done))
+
+        # shield - отмена одного ожидающего не должна отменять общий запрос
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Если все ожидающие отменены, исключение никто не получит; помечаем его как полученное
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self):
+        """Количество выполняющихся в данный момент запросов."""
+        return len(self._in_flight)
+
+    def stats(self):
+        """Получить статистику объединения запросов."""
+        return {
+            'calls': self.calls,
+            'executions': self.executions,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._in_flight)
+        }
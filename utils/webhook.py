@@ -0,0 +1,148 @@
+"""
+Получение обновлений Telegram через вебхук.
+
+Telegram отправляет обновления POST-запросами на адрес WEBHOOK_URL +
+WEBHOOK_PATH, который обслуживает HTTP-сервер aiohttp. Запрос принимается,
+только если заголовок X-Telegram-Bot-Api-Secret-Token совпадает с
+секретом, переданным Telegram при установке вебхука. Обработка
+обновлений идет в фоне, и одновременно обрабатывается не больше
+max_concurrent обновлений: когда лимит исчерпан, сервер не отвечает
+Telegram до освобождения места, и новые обновления ждут на стороне
+Telegram. По адресу WEBHOOK_HEALTH_PATH сервер отвечает на проверки
+работоспособности.
+"""
+import hmac
+import asyncio
+import logging
+import secrets
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher, types
+
+logger = logging.getLogger(__name__)
+
+# Заголовок, в котором Telegram передает секрет вебхука
+SECRET_TOKEN_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookServer:
+    """HTTP-сервер для приема обновлений Telegram с ограничением одновременной обработки."""
+
+    def __init__(self, dp, url, host, port, path, health_path, secret_token=None, max_concurrent=32):
+        """
+        Args:
+            dp: Диспетчер aiogram
+            url: Внешний адрес сервера (https://example.com), по которому его видит Telegram
+            host: Адрес, на котором слушает сервер
+            port: Порт сервера
+            path: Путь для обновлений
+            health_path: Путь для проверки работоспособности
+            secret_token: Секрет вебхука (если не задан, создается случайный при запуске)
+            max_concurrent: Максимальное количество одновременно обрабатываемых обновлений
+        """
+        self.dp = dp
+        self.url = url.rstrip('/')
+        self.host = host
+        self.port = port
+        self.path = path
+        self.health_path = health_path
+        self.secret_token = secret_token or secrets.token_urlsafe(32)
+        self.max_concurrent = max_concurrent
+
+        self._semaphore = None
+        self._runner = None
+        self._tasks = set()
+
+        # Счетчики
+        self.received = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    @property
+    def webhook_url(self):
+        return self.url + self.path
+
+    def create_app(self):
+        """Создать приложение aiohttp с маршрутами вебхука и проверки работоспособности."""
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.router.add_get(self.health_path, self.handle_health)
+        return app
+
+    async def start(self):
+        """Запустить HTTP-сервер и зарегистрировать вебхук в Telegram."""
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        self._runner = web.AppRunner(self.create_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+
+        await self.dp.bot.set_webhook(
+            self.webhook_url,
+            secret_token=self.secret_token,
+            # Telegram допускает от 1 до 100 одновременных соединений
+            max_connections=max(1, min(self.max_concurrent, 100))
+        )
+        logger.info(f"Вебхук установлен: {self.webhook_url}, сервер слушает {self.host}:{self.port}")
+
+    async def stop(self, timeout=10):
+        """Остановить прием обновлений и дождаться обработки уже принятых."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+        if self._tasks:
+            done, pending = await asyncio.wait(self._tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+
+    async def handle_update(self, request):
+        """Принять обновление от Telegram."""
+        token = request.headers.get(SECRET_TOKEN_HEADER, '')
+        if not hmac.compare_digest(token, self.secret_token):
+            self.rejected += 1
+            return web.Response(status=401)
+
+        try:
+            update = types.Update(**await request.json())
+        except Exception:
+            self.rejected += 1
+            return web.Response(status=400)
+
+        self.received += 1
+
+        # Когда обрабатывается max_concurrent обновлений, ответ Telegram задерживается
+        await self._semaphore.acquire()
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process(self, update):
+        Bot.set_current(self.dp.bot)
+        Dispatcher.set_current(self.dp)
+        try:
+            await self.dp.process_update(update)
+            self.processed += 1
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Ошибка при обработке обновления {update.update_id}: {e}")
+        finally:
+            self._semaphore.release()
+
+    async def handle_health(self, request):
+        """Проверка работоспособности: сервер запущен и статистика обработки."""
+        return web.json_response({'status': 'ok', **self.stats()})
+
+    def stats(self):
+        """Получить статистику обработки обновлений."""
+        return {
+            'processing': len(self._tasks),
+            'max_concurrent': self.max_concurrent,
+            'received': self.received,
+            'processed': self.processed,
+            'failed': self.failed,
+            'rejected': self.rejected
+        }